@@ -0,0 +1,81 @@
+import re
+from array import array
+
+import cache
+from corpus import language_sources
+
+NORMALIZED_CACHE = 'arabic-normalized.bin'
+NORMALIZED_VERSION = 1
+
+# Harakat, superscript alef, tatweel and the Quranic annotation marks are
+# dropped; hamza carriers, alef forms and final letters fold together.
+DROPPED = set(
+    [chr(c) for c in range(0x064B, 0x0660)]
+    + ['\u0670', '\u0640']
+    + [chr(c) for c in range(0x06D6, 0x06EE)]
+    + [chr(c) for c in range(0x08D3, 0x0900)]
+)
+FOLDED = {
+    'آ': 'ا', 'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا',
+    'ٲ': 'ا', 'ٳ': 'ا', 'ؤ': 'و', 'ئ': 'ي',
+    'ى': 'ي', 'ة': 'ه',
+}
+
+ARABIC_LETTER = re.compile('[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]')
+
+def is_arabic(text):
+    return ARABIC_LETTER.search(text) is not None
+
+def normalize(text):
+    # Returns the normalized text and, for every character in it, the
+    # position of the character it came from in the original.
+    chars = []
+    origins = []
+    for position, char in enumerate(text):
+        if char in DROPPED:
+            continue
+        chars.append(FOLDED.get(char, char))
+        origins.append(position)
+    return ''.join(chars), origins
+
+def build_normalized_payload(corpus):
+    verses = []
+    offsets = array('I', [0])
+    origins = array('H')
+    for index in range(len(corpus)):
+        normalized, verse_origins = normalize(corpus.text('arabic', index))
+        verses.append(normalized)
+        origins.extend(verse_origins)
+        origins.append(0)  # keeps origins aligned with the '\n' separator
+        offsets.append(offsets[-1] + len(normalized) + 1)
+    return {
+        'buffer': '\n'.join(verses) + '\n',
+        'offsets': offsets.tobytes(),
+        'origins': origins.tobytes(),
+    }
+
+class NormalizedText:
+    __slots__ = ('buffer', 'offsets', 'origins')
+
+    def __init__(self, payload):
+        self.buffer = payload['buffer']
+        self.offsets = array('I')
+        self.offsets.frombytes(payload['offsets'])
+        self.origins = array('H')
+        self.origins.frombytes(payload['origins'])
+
+    def text(self, index):
+        return self.buffer[self.offsets[index]:self.offsets[index + 1] - 1]
+
+    def original_span(self, index, start, end, original_length):
+        # A match ending on a letter extends over the marks that follow it,
+        # up to the next character that survived normalization.
+        base = self.offsets[index]
+        length = self.offsets[index + 1] - 1 - base
+        original_start = self.origins[base + start]
+        original_end = self.origins[base + end] if end < length else original_length
+        return original_start, original_end
+
+def load_normalized_text(corpus):
+    return NormalizedText(cache.cached(NORMALIZED_CACHE, NORMALIZED_VERSION, language_sources('arabic'),
+                                       lambda: build_normalized_payload(corpus)))
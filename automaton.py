@@ -0,0 +1,127 @@
+from collections import deque
+
+def is_word(char):
+    # What \w matches in a str pattern.
+    return char.isalnum() or char == '_'
+
+def boundary(text, position):
+    # \b: a word character on exactly one side of position.
+    before = position > 0 and is_word(text[position - 1])
+    after = position < len(text) and is_word(text[position])
+    return before != after
+
+def lower(text):
+    # text.lower() with one character for each of text's. The one character
+    # that lower-cases to two ('İ') becomes the first of them, as it does
+    # for re.IGNORECASE, so keywords and texts keep their positions.
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        lowered = ''.join(char.lower()[0] for char in text)
+    return lowered
+
+class Match:
+    # Enough of re.Match for the highlighters.
+    __slots__ = ('string', 'span_start', 'span_end')
+
+    def __init__(self, string, start, end):
+        self.string = string
+        self.span_start = start
+        self.span_end = end
+
+    def start(self):
+        return self.span_start
+
+    def end(self):
+        return self.span_end
+
+    def group(self):
+        return self.string[self.span_start:self.span_end]
+
+class Automaton:
+    # Aho-Corasick over a set of keywords, matched case-insensitively and
+    # only as whole words, like \bkeyword\b. One pass over a text finds
+    # every occurrence of every keyword.
+    def __init__(self, words):
+        self.words = list(dict.fromkeys(words))
+        lowered = [lower(word) for word in self.words]
+        self.lengths = [len(word) for word in lowered]
+        goto = [{}]
+        outputs = [[]]
+        for word_id, word in enumerate(lowered):
+            node = 0
+            for char in word:
+                child = goto[node].get(char)
+                if child is None:
+                    child = len(goto)
+                    goto[node][char] = child
+                    goto.append({})
+                    outputs.append([])
+                node = child
+            outputs[node].append(word_id)
+
+        # Failure links, breadth first: the longest proper suffix of each
+        # node's path that is also a path from the root.
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                outputs[child] = outputs[child] + outputs[fail[child]]
+        self.goto = goto
+        self.fail = fail
+        self.outputs = outputs
+
+    def __len__(self):
+        return len(self.words)
+
+    def matches(self, text):
+        # (start, end, word id) for every whole-word occurrence, overlapping
+        # ones included, in order of where they end.
+        goto, fail, outputs, lengths = self.goto, self.fail, self.outputs, self.lengths
+        node = 0
+        for position, char in enumerate(lower(text)):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if outputs[node]:
+                end = position + 1
+                for word_id in outputs[node]:
+                    start = end - lengths[word_id]
+                    if boundary(text, start) and boundary(text, end):
+                        yield start, end, word_id
+
+    def occurrences(self, text):
+        # The word id of each occurrence, counted the way
+        # keyword_pattern(word).findall counts them: a keyword's occurrences
+        # do not overlap each other, but may overlap other keywords'.
+        last_end = [0] * len(self.words)
+        for start, end, word_id in self.matches(text):
+            if start >= last_end[word_id]:
+                last_end[word_id] = end
+                yield word_id
+
+    def finditer(self, text):
+        # Non-overlapping matches, leftmost first and the longest keyword
+        # at each position, which is what a longest-first alternation
+        # regex finds.
+        found = sorted(((start, -end) for start, end, _ in self.matches(text)))
+        last = 0
+        for start, negative_end in found:
+            if start >= last:
+                last = -negative_end
+                yield Match(text, start, last)
+
+    def sub(self, replace, text):
+        pieces = []
+        last = 0
+        for match in self.finditer(text):
+            pieces.append(text[last:match.start()])
+            pieces.append(replace(match))
+            last = match.end()
+        pieces.append(text[last:])
+        return ''.join(pieces)
@@ -0,0 +1,84 @@
+import io
+import shlex
+import sys
+
+class CapturedOutput(io.StringIO):
+    # Output of one query run in a worker; carries the caller's width and
+    # colour preference the same way the daemon's session stream does.
+    def __init__(self, columns, color):
+        super().__init__()
+        self.columns = columns
+        self.color = color
+
+def read_queries(lines):
+    # The arguments of every query. A line that cannot be split into
+    # arguments yields the error to report in its place, so it fails on its
+    # own and in order.
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            yield ValueError(f"Cannot parse '{line}': {e}.")
+            continue
+        if args and args[0] == 'quran':
+            args = args[1:]
+        if args:
+            yield args
+
+def execute(run, args):
+    if isinstance(args, ValueError):
+        print(f"Error: {args}")
+        return 1
+    status = 0
+    try:
+        run(args)
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        if isinstance(e.code, str):
+            print(e.code)
+    except Exception as e:
+        # A query that breaks the command fails alone; the rest still run.
+        print(f"Error: '{' '.join(args)}' failed: {e}.")
+        status = 1
+    return status
+
+def execute_captured(job):
+    run, args, columns, color = job
+    real_stdout = sys.stdout
+    sys.stdout = captured = CapturedOutput(columns, color)
+    try:
+        status = execute(run, args)
+    finally:
+        sys.stdout = real_stdout
+    return captured.getvalue(), status
+
+def fork_context():
+    import multiprocessing
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context('fork')
+
+def run_batch(run, preload, lines, jobs=1, columns=None, color=None):
+    # Runs every query and writes the results in input order. Returns 1 if
+    # any query failed, 0 otherwise.
+    preload()
+    failed = False
+
+    context = fork_context() if jobs > 1 else None
+    if context is None:
+        for args in read_queries(lines):
+            failed |= execute(run, args) != 0
+        return 1 if failed else 0
+
+    # Workers are forked after preload(), so they share the loaded corpus
+    # and indexes with this process instead of loading their own.
+    jobs_iter = ((run, args, columns, color) for args in read_queries(lines))
+    with context.Pool(jobs) as pool:
+        for output, status in pool.imap(execute_captured, jobs_iter, chunksize=16):
+            sys.stdout.write(output)
+            failed |= status != 0
+    return 1 if failed else 0
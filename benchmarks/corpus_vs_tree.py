@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Compares the array-backed Corpus with the ElementTree documents quran.py
+# used to walk: resident memory, load time and per-verse lookup latency.
+import os
+import random
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from corpus import ARABIC_FILE, ENGLISH_FILE, get_data_path, load_corpus
+
+def load_trees():
+    arabic_root = ET.parse(get_data_path(ARABIC_FILE)).getroot()
+    english_root = ET.parse(get_data_path(ENGLISH_FILE)).getroot()
+    return arabic_root, english_root
+
+def measure_load(loader):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = loader()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current, peak
+
+def load_corpus_text():
+    # Text is loaded lazily, a language at a time; touching both languages
+    # makes the load comparable with parsing both trees.
+    corpus = load_corpus()
+    corpus.text('arabic', 0)
+    corpus.text('english', 0)
+    return corpus
+
+def tree_lookup(roots, chapter_num, verse_num):
+    arabic_root, english_root = roots
+    arabic = arabic_root.find(f"./sura[@index='{chapter_num}']/aya[@index='{verse_num}']")
+    english = english_root.find(f"./sura[@index='{chapter_num}']/aya[@index='{verse_num}']")
+    return arabic.get('text'), english.get('text')
+
+def corpus_lookup(corpus, chapter_num, verse_num):
+    return corpus.verse('arabic', chapter_num, verse_num), corpus.verse('english', chapter_num, verse_num)
+
+def measure_lookups(lookup, data, references):
+    start = time.perf_counter()
+    for chapter_num, verse_num in references:
+        lookup(data, chapter_num, verse_num)
+    return (time.perf_counter() - start) / len(references)
+
+def main():
+    load_corpus_text()  # make sure the compiled caches exist before timing them
+
+    roots, tree_time, tree_mem, tree_peak = measure_load(load_trees)
+    corpus, corpus_time, corpus_mem, corpus_peak = measure_load(load_corpus_text)
+
+    rng = random.Random(114)
+    references = []
+    for _ in range(2000):
+        chapter_num = rng.randint(1, 114)
+        references.append((chapter_num, rng.randint(1, corpus.verse_count(chapter_num))))
+
+    tree_lookup_time = measure_lookups(tree_lookup, roots, references)
+    corpus_lookup_time = measure_lookups(corpus_lookup, corpus, references)
+
+    print(f"{'':22}{'ElementTree':>14}{'Corpus':>14}")
+    print(f"{'load (ms)':22}{tree_time * 1e3:14.2f}{corpus_time * 1e3:14.2f}")
+    print(f"{'resident (MiB)':22}{tree_mem / 2**20:14.2f}{corpus_mem / 2**20:14.2f}")
+    print(f"{'peak while loading':22}{tree_peak / 2**20:14.2f}{corpus_peak / 2**20:14.2f}")
+    print(f"{'verse lookup (us)':22}{tree_lookup_time * 1e6:14.2f}{corpus_lookup_time * 1e6:14.2f}")
+
+if __name__ == "__main__":
+    main()
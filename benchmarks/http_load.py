@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# Load test for `quran serve --http`: drives the JSON API from localhost
+# with many concurrent keep-alive connections and reports throughput,
+# latency percentiles and status codes. Starts its own server unless one is
+# already listening on --port.
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+QURAN = os.path.join(ROOT, 'quran.py')
+
+# A mix of hot references and queries, as a consumer would send them.
+PATHS = [
+    '/read?ref=2:255', '/read?ref=1', '/read?ref=36&lang=english', '/range?ref=2:280-3:20',
+    '/read?ref=112:1-4&lang=arabic', '/search?q=mercy', '/search?q=' + quote('merc* NEAR/3 lord'),
+    '/search?q=prayer&range=2', '/count?q=mercy', '/count?q=allah&range=1-10', '/info?range=1-114',
+    '/info?range=2',
+]
+
+async def request(reader, writer, host, path, etag=None):
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}"]
+    if etag:
+        lines.append(f"If-None-Match: {etag}")
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('etag')
+
+async def client(host, port, deadline, revalidate, latencies, statuses):
+    # One keep-alive connection sending requests back to back. With
+    # revalidate, repeated paths send the ETag they got last time.
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    rng = random.Random()
+    try:
+        while time.perf_counter() < deadline:
+            path = rng.choice(PATHS)
+            start = time.perf_counter()
+            status, etag = await request(reader, writer, host, path, etags.get(path) if revalidate else None)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+            if etag:
+                etags[path] = etag
+    finally:
+        writer.close()
+
+async def load(host, port, connections, duration, revalidate):
+    latencies = []
+    statuses = {}
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, deadline, revalidate, latencies, statuses)
+                           for _ in range(connections)))
+    return time.perf_counter() - start, latencies, statuses
+
+def server_is_up(host, port):
+    async def probe():
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            return False
+        writer.close()
+        return True
+    return asyncio.run(probe())
+
+def start_server(host, port):
+    env = dict(os.environ, QURAN_NO_DAEMON='1')
+    process = subprocess.Popen([sys.executable, QURAN, 'serve', '--http', '--host', host, '--port', str(port)],
+                               env=env, stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        if server_is_up(host, port):
+            return process
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"the server did not start on {host}:{port}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the quran.py HTTP API from localhost.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--connections', type=int, default=32, help="concurrent keep-alive connections")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds to run")
+    parser.add_argument('--revalidate', action='store_true', help="send If-None-Match with known ETags")
+    options = parser.parse_args()
+
+    process = None if server_is_up(options.host, options.port) else start_server(options.host, options.port)
+    try:
+        elapsed, latencies, statuses = asyncio.run(load(options.host, options.port, options.connections,
+                                                        options.duration, options.revalidate))
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    latencies.sort()
+    def at(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+    print(f"{len(latencies)} requests in {elapsed:.1f} s over {options.connections} connections: "
+          f"{len(latencies) / elapsed:.0f} requests/s")
+    print(f"latency ms: p50 {statistics.median(latencies):.2f}  p90 {at(0.90):.2f}  "
+          f"p99 {at(0.99):.2f}  max {latencies[-1]:.2f}")
+    print("status: " + ", ".join(f"{status} x{count}" for status, count in sorted(statuses.items())))
+    sys.exit(0 if set(statuses) <= {200, 304} else 1)
+
+if __name__ == "__main__":
+    main()
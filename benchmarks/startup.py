@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Cold-start cost of the common commands: runs each one in a fresh
+# interpreter under -X importtime and reports wall time, import time and
+# the modules it loaded. Exits with 1 when a command goes over its import
+# budget or loads a module it has no business loading, so it can guard
+# the startup path in CI.
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+QURAN = os.path.join(ROOT, 'quran.py')
+
+# Modules no command below should load once the caches are warm.
+HEAVY = {'xml.etree.ElementTree', 'difflib', 'socket', 'tempfile', 'multiprocessing', 'batch', 'daemon'}
+
+# (arguments, import budget in ms, modules that must not be imported)
+COMMANDS = [
+    (['commands'], 15, HEAVY | {'re', 'render', 'seek', 'termcolor', 'search_index', 'query'}),
+    (['2:255'], 35, HEAVY | {'termcolor', 'arabic', 'search_index', 'query', 'fuzzy', 'json', 'csv'}),
+    (['2:255-260', '-e'], 35, HEAVY | {'termcolor', 'arabic', 'search_index', 'query', 'fuzzy'}),
+    (['info', '2'], 25, HEAVY | {'render', 'seek', 'termcolor', 'search_index', 'query'}),
+    (['count', 'mercy'], 45, HEAVY | {'termcolor'}),
+    (['search', 'mercy', '2'], 50, HEAVY),
+]
+
+def parse_importtime(stderr):
+    # Returns (total import time in ms, set of module names). The total only
+    # counts top-level imports, since each one already includes its children.
+    total = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+    return total / 1000, modules
+
+def run_cold(args):
+    env = dict(os.environ, QURAN_NO_DAEMON='1')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    import_ms, modules = parse_importtime(result.stderr)
+    return elapsed, import_ms, modules
+
+def measure(args, repeat):
+    walls, imports, modules = [], [], set()
+    for _ in range(repeat):
+        wall, import_ms, modules = run_cold(args)
+        walls.append(wall)
+        imports.append(import_ms)
+    return statistics.median(walls), statistics.median(imports), modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and guard quran.py cold-start time.")
+    parser.add_argument('--repeat', type=int, default=7, help="runs per command (the median is reported)")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every import budget, for slower machines")
+    options = parser.parse_args()
+
+    # Build the caches first so the runs below time the steady state.
+    for args, _, _ in COMMANDS:
+        run_cold([QURAN] + args)
+
+    bare_wall, bare_import, bare_modules = measure(['-c', 'pass'], options.repeat)
+    print(f"{'command':24}{'wall (ms)':>12}{'imports (ms)':>14}{'budget':>9}{'modules':>9}")
+    print(f"{'(bare interpreter)':24}{bare_wall:12.1f}{bare_import:14.1f}{'':>9}{len(bare_modules):9}")
+
+    failures = []
+    for args, budget, forbidden in COMMANDS:
+        label = ' '.join(args)
+        wall, import_ms, modules = measure([QURAN] + args, options.repeat)
+        # Interpreter startup imports are not the command's fault.
+        own_import = import_ms - bare_import
+        budget *= options.scale
+        print(f"{label:24}{wall:12.1f}{own_import:14.1f}{budget:9.0f}{len(modules - bare_modules):9}")
+        if own_import > budget:
+            failures.append(f"{label}: imports took {own_import:.1f} ms, budget is {budget:.0f} ms")
+        loaded = sorted(modules & forbidden)
+        if loaded:
+            failures.append(f"{label}: imported {', '.join(loaded)}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Compares the two storage backends: the XML files through the compiled
+# caches, and the SQLite database from 'quran build-db'. Each query is timed
+# cold, as a one-shot CLI process, and warm, repeated in one process that
+# already has the backend open. Builds the database first if needed.
+import argparse
+import io
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+QURAN = os.path.join(ROOT, 'quran.py')
+sys.path.insert(0, ROOT)
+
+BACKENDS = ('xml', 'sqlite')
+
+QUERIES = {
+    'read_verse': ['2:255'],
+    'read_sura': ['2'],
+    'read_range': ['2:280-3:20'],
+    'read_juz': ['juz', '30'],
+    'search_word': ['search', 'mercy'],
+    'search_phrase': ['search', 'the day of resurrection'],
+    'search_arabic': ['search', 'الرحمن'],
+    'search_rare': ['search', 'camel'],
+    'count': ['count', 'mercy', '2'],
+}
+
+def median_ms(samples):
+    return statistics.median(samples) * 1000
+
+def run_cold(backend, args, iterations):
+    env = dict(os.environ, QURAN_NO_DAEMON='1', QURAN_STORAGE=backend)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, QURAN] + args, env=env, stdout=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - start)
+    return median_ms(samples)
+
+def run_warm(backend, args, iterations):
+    import quran
+
+    os.environ['QURAN_STORAGE'] = backend
+    quran.reload_data()
+    real_stdout = sys.stdout
+    samples = []
+    try:
+        for attempt in range(iterations + 1):
+            sys.stdout = io.StringIO()
+            start = time.perf_counter()
+            quran.run(list(args))
+            if attempt:  # the first run opens the backend
+                samples.append(time.perf_counter() - start)
+    finally:
+        sys.stdout = real_stdout
+    return median_ms(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the XML and SQLite storage backends.")
+    parser.add_argument('--iterations', type=int, default=30, help="warm runs per query")
+    parser.add_argument('--cold-iterations', type=int, default=5, help="cold processes per query")
+    parser.add_argument('--only', nargs='+', metavar='NAME', help="run just these queries")
+    options = parser.parse_args()
+
+    os.environ['QURAN_NO_DAEMON'] = '1'
+    from database import database_path
+    if not os.path.exists(database_path()):
+        subprocess.run([sys.executable, QURAN, 'build-db'], check=True)
+
+    print(f"{'':18}{'cold xml':>12}{'cold sqlite':>13}{'warm xml':>12}{'warm sqlite':>13}   (median ms)")
+    for name, args in QUERIES.items():
+        if options.only and name not in options.only:
+            continue
+        cold = [run_cold(backend, args, options.cold_iterations) for backend in BACKENDS]
+        warm = [run_warm(backend, args, options.iterations) for backend in BACKENDS]
+        print(f"{name:18}{cold[0]:12.1f}{cold[1]:13.1f}{warm[0]:12.3f}{warm[1]:13.3f}", flush=True)
+
+if __name__ == "__main__":
+    main()
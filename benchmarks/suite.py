@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# Benchmarks every command path, both warm in-process (the daemon and
+# batch case) and as a cold subprocess (the one-shot CLI case). Reports
+# latency percentiles, peak RSS and tracemalloc allocations, writes the
+# results as JSON, and with --compare fails when a run regresses against
+# an earlier results file.
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+QURAN = os.path.join(ROOT, 'quran.py')
+sys.path.insert(0, ROOT)
+
+# name -> arguments for quran.py
+SCENARIOS = {
+    'read_verse': ['2:255'],
+    'read_sura': ['2'],
+    'read_range': ['2:280-3:20'],
+    'search': ['search', 'mercy'],
+    'search_query': ['search', 'merc* NEAR/3 lord'],
+    'search_rank': ['search', '--rank', 'fight in the cause of allah', '--top', '10'],
+    'search_regex': ['search', '--regex', r'merc(y|iful) .{0,20}lord'],
+    'count': ['count', 'mercy'],
+    'count_keywords': ['count', 'mercy,lord,your lord,the,fire', '--by-sura'],
+    'info': ['info', '1-114'],
+    'search_info': ['verses', '1-114'],
+    'similar': ['similar', '2:255'],
+}
+
+# chapter_name_to_number is benchmarked directly: an exact name and a
+# misspelling that goes through the fuzzy fallback.
+CHAPTER_NAMES = {
+    'chapter_name_exact': 'al-baqara',
+    'chapter_name_fuzzy': 'baqra',
+}
+
+# Incremental search in the shell: a query typed one character at a time
+# into an empty prefix cache, i.e. the lookups behind every redraw.
+TYPED_QUERIES = {
+    'shell_typing': 'mercy of his lord',
+}
+
+# Metrics compared by --compare; all of them are better when lower.
+COMPARED = ('p50_ms', 'p90_ms', 'peak_rss_kb', 'alloc_peak_kb')
+
+def percentiles(samples):
+    samples = sorted(samples)
+    def at(fraction):
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p90_ms': round(at(0.90), 3),
+        'p99_ms': round(at(0.99), 3),
+        'min_ms': round(samples[0], 3),
+    }
+
+def maxrss_kb(maxrss):
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+def run_in_process(call, iterations):
+    real_stdout = sys.stdout
+
+    def quiet_call():
+        sys.stdout = io.StringIO()
+        call()
+
+    samples = []
+    try:
+        quiet_call()  # warm-up: loads data, indexes and caches
+        for _ in range(iterations):
+            start = time.perf_counter()
+            quiet_call()
+            samples.append((time.perf_counter() - start) * 1000)
+
+        tracemalloc.start()
+        quiet_call()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        sys.stdout = real_stdout
+
+    result = percentiles(samples)
+    result['alloc_peak_kb'] = peak // 1024
+    result['alloc_retained_kb'] = current // 1024
+    # Peak RSS of the whole benchmark process so far, i.e. the resident
+    # size of a long-running process that has served every scenario up to
+    # this one.
+    result['peak_rss_kb'] = maxrss_kb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    return result
+
+# Runs one command and prints its wall time, peak RSS and exit code. A
+# forked child's ru_maxrss starts at its parent's peak, which by the cold
+# runs is this harness with every index loaded; forked from this small
+# fresh process instead, the command's peak is its own.
+LAUNCHER = """
+import json, os, sys, time
+start = time.perf_counter()
+pid = os.fork()
+if pid == 0:
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    os.execv(sys.executable, [sys.executable] + sys.argv[1:])
+_, status, usage = os.wait4(pid, 0)
+print(json.dumps([time.perf_counter() - start, usage.ru_maxrss, os.waitstatus_to_exitcode(status)]))
+"""
+
+def run_cold(args, iterations):
+    env = dict(os.environ, QURAN_NO_DAEMON='1')
+    samples = []
+    rss = []
+    for _ in range(iterations):
+        launched = subprocess.run([sys.executable, '-S', '-c', LAUNCHER, QURAN] + args, env=env,
+                                  capture_output=True, text=True, check=True)
+        elapsed, maxrss, returncode = json.loads(launched.stdout)
+        if returncode != 0:
+            raise RuntimeError(f"quran.py {' '.join(args)} exited with {returncode}")
+        samples.append(elapsed * 1000)
+        rss.append(maxrss_kb(maxrss))
+
+    result = percentiles(samples)
+    result['peak_rss_kb'] = max(rss)
+    return result
+
+def run_suite(options):
+    import quran
+
+    def command(args):
+        return lambda: quran.run(list(args))
+
+    def chapter_lookup(name):
+        return lambda: quran.chapter_name_to_number(name)
+
+    def typing(query):
+        import shell
+
+        texts = shell.IncrementalSearch(quran.load_quran_data()).cache('english').texts
+
+        def type_query():
+            cache = shell.PrefixCache(texts)
+            for end in range(1, len(query) + 1):
+                cache.lookup(query[:end])
+        return type_query
+
+    calls = {name: command(args) for name, args in SCENARIOS.items()}
+    calls.update({name: chapter_lookup(value) for name, value in CHAPTER_NAMES.items()})
+    calls.update({name: typing(value) for name, value in TYPED_QUERIES.items()})
+    selected = [name for name in calls if not options.only or name in options.only]
+
+    results = {}
+    for name in selected:
+        results[name] = {'in_process': run_in_process(calls[name], options.iterations)}
+        if name in SCENARIOS and not options.skip_cold:
+            results[name]['cold'] = run_cold(SCENARIOS[name], options.cold_iterations)
+        print(format_row(name, results[name]), flush=True)
+    return results
+
+def format_row(name, result):
+    warm = result['in_process']
+    cold = result.get('cold')
+    row = f"{name:22}{warm['p50_ms']:10.2f}{warm['p90_ms']:10.2f}{warm['p99_ms']:10.2f}{warm['alloc_peak_kb']:12}"
+    if cold:
+        row += f"{cold['p50_ms']:10.1f}{cold['p90_ms']:10.1f}{cold['peak_rss_kb']:12}"
+    return row
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, threshold):
+    # A metric regresses when it is more than threshold (a fraction) worse
+    # than the baseline. Tiny absolute values are noisy, so differences
+    # under a millisecond or 64 KB are ignored.
+    failures = []
+    for name, modes in results.items():
+        for mode, metrics in modes.items():
+            before = baseline.get('results', {}).get(name, {}).get(mode)
+            if not before:
+                continue
+            for metric in COMPARED:
+                if metric not in metrics or metric not in before:
+                    continue
+                old, new = before[metric], metrics[metric]
+                floor = 1 if metric.endswith('_ms') else 64
+                if new > old * (1 + threshold) and new - old > floor:
+                    failures.append(f"{name} ({mode}) {metric}: {old} -> {new}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every quran.py command path.")
+    parser.add_argument('--iterations', type=int, default=50, help="timed in-process runs per scenario")
+    parser.add_argument('--cold-iterations', type=int, default=10, help="cold subprocess runs per scenario")
+    parser.add_argument('--skip-cold', action='store_true', help="only run the in-process benchmarks")
+    parser.add_argument('--only', nargs='+', metavar='NAME', help="run just these scenarios")
+    parser.add_argument('--output', metavar='FILE', help="write the results as JSON")
+    parser.add_argument('--compare', metavar='FILE', help="fail if worse than the results in FILE")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed slowdown for --compare, as a fraction (default 0.25)")
+    options = parser.parse_args()
+
+    print(f"{'':22}{'in-process (ms)':>30}{'alloc':>12}{'cold (ms)':>20}{'':12}")
+    print(f"{'scenario':22}{'p50':>10}{'p90':>10}{'p99':>10}{'peak KB':>12}{'p50':>10}{'p90':>10}{'RSS KB':>12}")
+    results = run_suite(options)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'iterations': options.iterations,
+            'cold_iterations': options.cold_iterations,
+        },
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {options.output}")
+
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        failures = compare(results, baseline, options.threshold)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"No regressions against {options.compare} (threshold {options.threshold:.0%})")
+
+if __name__ == "__main__":
+    main()
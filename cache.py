@@ -0,0 +1,84 @@
+import marshal
+import os
+
+CACHE_FORMAT = 1
+
+_cache_dir = None
+
+def get_cache_dir():
+    global _cache_dir
+    if _cache_dir is not None:
+        return _cache_dir
+
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    user_cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    candidates = [
+        os.environ.get('QURAN_CACHE_DIR'),
+        os.path.join(script_dir, 'data', 'cache'),
+        os.path.join(user_cache, 'the-terminal-quran'),
+    ]
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            os.makedirs(candidate, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(candidate, os.W_OK):
+            _cache_dir = candidate
+            return _cache_dir
+
+    # Nothing writable: caches are rebuilt in memory on every run.
+    _cache_dir = ''
+    return _cache_dir
+
+def get_cache_path(name):
+    cache_dir = get_cache_dir()
+    return os.path.join(cache_dir, name) if cache_dir else None
+
+def source_stamp(paths):
+    stamp = []
+    for path in paths:
+        st = os.stat(path)
+        stamp.append((os.path.basename(path), st.st_size, st.st_mtime_ns))
+    return tuple(stamp)
+
+def load_cache(name, version, stamp):
+    path = get_cache_path(name)
+    if not path:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            header, payload = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if header != (CACHE_FORMAT, version, stamp):
+        return None
+    return payload
+
+def save_cache(name, version, stamp, payload):
+    path = get_cache_path(name)
+    if not path:
+        return
+    data = marshal.dumps(((CACHE_FORMAT, version, stamp), payload))
+    import tempfile
+
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + name)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except OSError:
+        # A read-only install still works, it just parses the XML every time.
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+def cached(name, version, sources, build):
+    stamp = source_stamp(sources)
+    payload = load_cache(name, version, stamp)
+    if payload is None:
+        payload = build()
+        save_cache(name, version, stamp, payload)
+    return payload
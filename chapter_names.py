@@ -0,0 +1,128 @@
+import re
+from array import array
+from bisect import bisect_left
+
+import cache
+from arabic import is_arabic, normalize
+from corpus import corpus_sources
+from fuzzy import TrigramIndex, build_trigram_payload, default_distance
+
+NAMES_CACHE = 'chapter-names.bin'
+NAMES_VERSION = 1
+
+SURA_WORD = re.compile(r"^sura[ht]?[\s-]+")
+# 'Al-', and the assimilated forms 'Ash-Shams', 'Ad-Dukhaan', 'Adh-Dhaariyat'.
+ARTICLE = re.compile(r"^a(l|[a-z]{1,2})[\s-]+")
+APOSTROPHES = re.compile(r"['‘’`ʿʾ]")
+REPEATED = re.compile(r"(.)\1+")
+# The spellings transliterations disagree on: doubled letters, oo/u, ee/i
+# and a final h ('Al-Baqarah', 'Yaseen', 'Nuh').
+VARIANTS = str.maketrans({'o': 'u', 'e': 'i'})
+
+def fold(name):
+    letters = ''.join(char for char in APOSTROPHES.sub('', name) if char.isalnum())
+    folded = REPEATED.sub(r'\1', letters.translate(VARIANTS))
+    if folded.endswith('ah') and len(folded) > 3:
+        folded = folded[:-1]
+    return folded
+
+def strip_article(name):
+    if name.startswith('the '):
+        return name[4:]
+    match = ARTICLE.match(name)
+    if match and (match.group(1) == 'l' or name[match.end():].startswith(match.group(1))):
+        return name[match.end():]
+    return None
+
+def alias_keys(name):
+    # The forms a chapter name is stored and looked up under. Arabic is
+    # normalized, so harakat and alef/hamza spellings do not matter; other
+    # names are folded over punctuation and common spelling variants, with
+    # and without the article.
+    name = SURA_WORD.sub('', name.strip().lower())
+    if is_arabic(name):
+        name = ''.join(normalize(name)[0].split())
+        if name.startswith('سوره'):
+            name = name[len('سوره'):]
+        keys = {name}
+        if name.startswith('ال') and len(name) > 3:
+            keys.add(name[2:])
+        return keys - {''}
+    keys = {fold(name)}
+    stripped = strip_article(name)
+    if stripped:
+        keys.add(fold(stripped))
+    return keys - {''}
+
+def build_names_payload(suras):
+    # key -> chapter for every alias. A key two chapters share ('The Dawn'
+    # is both 89 and 113) goes to the first of them.
+    table = {}
+    for chapter_num, sura in enumerate(suras, 1):
+        for attribute in ('tname', 'ename', 'name'):
+            for key in alias_keys(sura.get(attribute) or ''):
+                table.setdefault(key, chapter_num)
+    keys = sorted(table)
+    return {'keys': keys, 'chapters': array('H', (table[key] for key in keys)).tobytes(),
+            'trigrams': build_trigram_payload(keys)}
+
+class ChapterNames:
+    # Exact aliases resolve by hash, unique prefixes by binary search over
+    # the sorted aliases, and anything else by the closest alias within a
+    # few edits, found through a trigram index.
+    __slots__ = ('keys', 'chapters', 'table', 'trigrams')
+
+    def __init__(self, payload):
+        self.keys = payload['keys']
+        self.chapters = array('H')
+        self.chapters.frombytes(payload['chapters'])
+        self.table = dict(zip(self.keys, self.chapters))
+        self.trigrams = TrigramIndex(self.keys, payload['trigrams'])
+
+    def exact(self, keys):
+        for key in keys:
+            if key in self.table:
+                return self.table[key]
+        return None
+
+    def prefix(self, keys):
+        for key in keys:
+            found = set()
+            position = bisect_left(self.keys, key)
+            while position < len(self.keys) and self.keys[position].startswith(key) and len(found) < 2:
+                found.add(self.chapters[position])
+                position += 1
+            if len(found) == 1:
+                return found.pop()
+        return None
+
+    def closest(self, keys):
+        # One edit at a time: a near miss shares enough trigrams with the
+        # alias it misspells that the index hands back only a few
+        # candidates, and only a worse one has to look at more.
+        # Short names are too close to too many others to guess at, so a
+        # key of n letters (n trigrams) allows fewer than n / 3 edits and
+        # always has a trigram left in common with its match.
+        limits = {key: min(max(default_distance(key), len(key) // 4), (len(key) - 1) // 3) for key in keys}
+        for distance in range(1, max(limits.values(), default=0) + 1):
+            matches = []
+            for key in keys:
+                if distance <= limits[key]:
+                    matches += self.trigrams.lookup(key, distance)
+            if matches:
+                return self.table[min(matches)[1]]
+        return None
+
+    def resolve(self, name, fuzzy=True):
+        # The chapter number for name, or None.
+        keys = sorted(alias_keys(name), key=len, reverse=True)
+        chapter_num = self.exact(keys) or self.prefix(keys)
+        if chapter_num is None and fuzzy:
+            chapter_num = self.closest(keys)
+        return chapter_num
+
+def load_chapter_names(load_suras):
+    # Built from the sura list once and cached against the Arabic file's
+    # stamp, so looking a name up never reads the corpus.
+    return ChapterNames(cache.cached(NAMES_CACHE, NAMES_VERSION, corpus_sources()[:1],
+                                    lambda: build_names_payload(load_suras())))
@@ -0,0 +1,78 @@
+import os
+import sys
+
+# Commands that need the caller's terminal or stdin always run in the
+# client process.
+LOCAL_COMMANDS = {"serve", "batch", "shell", "build-db"}
+
+def get_socket_path():
+    path = os.environ.get('QURAN_SOCKET')
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_dir:
+        import tempfile
+        runtime_dir = tempfile.gettempdir()
+    return os.path.join(runtime_dir, f"the-terminal-quran-{os.getuid()}.sock")
+
+def client_wants_color():
+    # Same decision termcolor makes, taken on the client's side of the socket.
+    if os.environ.get('ANSI_COLORS_DISABLED') or os.environ.get('NO_COLOR'):
+        return False
+    if os.environ.get('FORCE_COLOR'):
+        return True
+    if os.environ.get('TERM') == 'dumb':
+        return False
+    return sys.stdout.isatty()
+
+def absolute_paths(argv):
+    # The daemon runs in a directory of its own, so relative '>file'
+    # targets and '--file' inputs are resolved against the caller's.
+    resolved = []
+    for position, arg in enumerate(argv):
+        if arg.startswith('>') and len(arg) > 1:
+            arg = '>' + os.path.abspath(arg[1:])
+        elif arg.startswith('--file=') and len(arg) > len('--file='):
+            arg = '--file=' + os.path.abspath(arg[len('--file='):])
+        elif position and argv[position - 1] == '--file':
+            arg = os.path.abspath(arg)
+        resolved.append(arg)
+    return resolved
+
+def forward(argv):
+    # Runs argv in a resident daemon and returns its exit status, or None
+    # when no daemon is listening and the caller should run it in-process.
+    if not argv or argv[0] in LOCAL_COMMANDS or os.environ.get('QURAN_NO_DAEMON'):
+        return None
+    path = get_socket_path()
+    if not os.path.exists(path):
+        return None
+
+    # Only paid for when a daemon is actually listening.
+    import json
+    import shutil
+    import socket
+
+    request = {
+        'argv': absolute_paths(argv),
+        'columns': shutil.get_terminal_size().columns,
+        'color': client_wants_color(),
+    }
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(path)
+    except OSError:
+        return None
+
+    with client, client.makefile('rb') as replies:
+        client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        status = None
+        for line in replies:
+            reply = json.loads(line)
+            if 'out' in reply:
+                sys.stdout.write(reply['out'])
+            elif 'exit' in reply:
+                status = reply['exit']
+                break
+        sys.stdout.flush()
+    return 1 if status is None else status
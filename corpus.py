@@ -0,0 +1,283 @@
+import os
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_right
+
+import cache
+
+ARABIC_FILE = 'arabicquran.xml'
+ENGLISH_FILE = 'sahihinternational.xml'
+METADATA_FILE = 'quran-data.xml'
+CORPUS_CACHE = 'corpus.bin'
+CORPUS_VERSION = 5
+TEXT_VERSION = 1
+
+NAVIGATION_UNITS = ('juz', 'hizb')
+
+# First verse of every juz and every hizb (two to a juz), from Tanzil's
+# quran-data.xml.
+JUZ_STARTS = [
+    (1, 1), (2, 142), (2, 253), (3, 93), (4, 24), (4, 148), (5, 82), (6, 111),
+    (7, 88), (8, 41), (9, 93), (11, 6), (12, 53), (15, 1), (17, 1), (18, 75),
+    (21, 1), (23, 1), (25, 21), (27, 56), (29, 46), (33, 31), (36, 28), (39, 32),
+    (41, 47), (46, 1), (51, 31), (58, 1), (67, 1), (78, 1),
+]
+
+HIZB_STARTS = [
+    (1, 1), (2, 75), (2, 142), (2, 203), (2, 253), (3, 15), (3, 93), (3, 171),
+    (4, 24), (4, 88), (4, 148), (5, 27), (5, 82), (6, 36), (6, 111), (7, 1),
+    (7, 88), (7, 171), (8, 41), (9, 34), (9, 93), (10, 26), (11, 6), (11, 84),
+    (12, 53), (13, 19), (15, 1), (16, 51), (17, 1), (17, 99), (18, 75), (20, 1),
+    (21, 1), (22, 1), (23, 1), (24, 21), (25, 21), (26, 111), (27, 56), (28, 51),
+    (29, 46), (31, 22), (33, 31), (34, 24), (36, 28), (37, 145), (39, 32), (40, 41),
+    (41, 47), (43, 24), (46, 1), (48, 18), (51, 31), (55, 1), (58, 1), (62, 1),
+    (67, 1), (72, 1), (78, 1), (87, 1),
+]
+
+class DataError(Exception):
+    # A data file is missing or does not match the others; quran.run
+    # reports it and exits.
+    pass
+
+def get_data_path(filename):
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(script_dir, 'data', filename)
+
+def parse_quran_xml(path):
+    import xml.etree.ElementTree as ET
+
+    root = ET.parse(path).getroot()
+    suras = []
+    texts = []
+    for sura in root.findall('./sura'):
+        suras.append(dict(sura.attrib))
+        texts.append([aya.get('text') for aya in sura.findall('./aya')])
+    return suras, texts
+
+def pack_texts(texts):
+    # All verses of one language live in a single string, separated by
+    # newlines; offsets[i] is where verse i starts and offsets[-1] is the end.
+    verses = [text for sura in texts for text in sura]
+    offsets = array('I', [0])
+    position = 0
+    for text in verses:
+        position += len(text) + 1
+        offsets.append(position)
+    return '\n'.join(verses) + '\n', offsets.tobytes()
+
+def pack_boundaries(marks, starts):
+    boundaries = array('I', (starts[sura - 1] + aya - 1 for sura, aya in marks))
+    boundaries.append(starts[-1])
+    return boundaries.tobytes()
+
+def build_corpus_payload(arabic_path):
+    # Sura metadata and verse addressing only; the text of each language is
+    # cached on its own and loaded the first time it is used.
+    suras, arabic = parse_quran_xml(arabic_path)
+
+    starts = array('I', [0])
+    for ayas in arabic:
+        starts.append(starts[-1] + len(ayas))
+
+    marks = {'juz': JUZ_STARTS, 'hizb': HIZB_STARTS}
+
+    return {
+        'suras': suras,
+        'starts': starts.tobytes(),
+        'boundaries': {unit: pack_boundaries(marks[unit], starts) for unit in marks},
+    }
+
+class VerseTable(ABC):
+    # Sura metadata and verse addressing shared by every verse source; a
+    # source provides text().
+    __slots__ = ('suras', 'starts')
+
+    def __len__(self):
+        return self.starts[-1]
+
+    def sura(self, chapter_num):
+        if 1 <= chapter_num <= len(self.suras):
+            return self.suras[chapter_num - 1]
+        return None
+
+    def verse_count(self, chapter_num):
+        return self.starts[chapter_num] - self.starts[chapter_num - 1]
+
+    def index(self, chapter_num, verse_num):
+        if not 1 <= chapter_num <= len(self.suras):
+            return None
+        if not 1 <= verse_num <= self.verse_count(chapter_num):
+            return None
+        return self.starts[chapter_num - 1] + verse_num - 1
+
+    def locate(self, index):
+        chapter_num = bisect_right(self.starts, index)
+        return chapter_num, index - self.starts[chapter_num - 1] + 1
+
+    # Global verse ids run from 1 to 6236 in mushaf order; id - 1 is the
+    # position of the verse in the text buffers.
+    def verse_id(self, chapter_num, verse_num):
+        index = self.index(chapter_num, verse_num)
+        return None if index is None else index + 1
+
+    def reference(self, verse_id):
+        return self.locate(verse_id - 1)
+
+    def resolve_range(self, start_chap, start_verse, end_chap, end_verse):
+        # [lo, hi) for a range, or None if its chapters are out of bounds or
+        # out of order. A verse of None is the first or last of its chapter.
+        # A verse below 1, a start verse past the end of its chapter, or an
+        # end before the start raises ValueError saying which. An end verse
+        # past the end of its chapter stops at the chapter's last verse.
+        if not 1 <= start_chap <= end_chap <= len(self.suras):
+            return None
+        if start_verse is None:
+            start_verse = 1
+        if end_verse is None:
+            end_verse = self.verse_count(end_chap)
+        if start_verse < 1 or start_verse > self.verse_count(start_chap):
+            raise ValueError(f"{start_chap}:{start_verse}: Not found")
+        if end_verse < 1:
+            raise ValueError(f"{end_chap}:{end_verse}: Not found")
+        end_verse = min(end_verse, self.verse_count(end_chap))
+        lo = self.starts[start_chap - 1] + start_verse - 1
+        hi = self.starts[end_chap - 1] + end_verse
+        if hi <= lo:
+            raise ValueError(f"{start_chap}:{start_verse}-{end_chap}:{end_verse} ends before it starts")
+        return lo, hi
+
+    @abstractmethod
+    def text(self, lang, index):
+        pass
+
+    def verse(self, lang, chapter_num, verse_num):
+        index = self.index(chapter_num, verse_num)
+        if index is None:
+            return None
+        return self.text(lang, index)
+
+    def verses(self, lang, chapter_num):
+        first = self.starts[chapter_num - 1]
+        for verse_num in range(1, self.verse_count(chapter_num) + 1):
+            yield verse_num, self.text(lang, first + verse_num - 1)
+
+class Corpus(VerseTable):
+    __slots__ = ('translations', 'buffers', 'offsets', 'boundaries')
+
+    def __init__(self, payload, translations):
+        self.suras = payload['suras']
+        self.starts = array('I')
+        self.starts.frombytes(payload['starts'])
+        self.translations = translations
+        self.buffers = {}
+        self.offsets = {}
+        self.boundaries = {}
+        for unit, boundaries in payload['boundaries'].items():
+            self.boundaries[unit] = array('I')
+            self.boundaries[unit].frombytes(boundaries)
+
+    def unit_count(self, unit):
+        return len(self.boundaries[unit]) - 1
+
+    def unit_range(self, unit, number):
+        boundaries = self.boundaries[unit]
+        if not 1 <= number < len(boundaries):
+            return None
+        return boundaries[number - 1], boundaries[number]
+
+    def unit_of(self, unit, index):
+        return bisect_right(self.boundaries[unit], index)
+
+    def load_language(self, lang):
+        path = self.translations[lang]
+        buffer, packed_offsets = load_text(lang, path)
+        offsets = array('I')
+        offsets.frombytes(packed_offsets)
+        check_verse_count(path, len(offsets) - 1, len(self))
+        self.buffers[lang] = buffer
+        self.offsets[lang] = offsets
+        return offsets
+
+    def text(self, lang, index):
+        offsets = self.offsets.get(lang) or self.load_language(lang)
+        return self.buffers[lang][offsets[index]:offsets[index + 1] - 1]
+
+    def full_text_matches(self, lang, terms, lo, hi):
+        # Verse indexes in [lo, hi) that have terms as a phrase, for storage
+        # with a full-text index of its own; None sends the search to the
+        # inverted index instead.
+        return None
+
+    def nbytes(self):
+        total = sys.getsizeof(self.starts) + sys.getsizeof(self.suras)
+        total += sum(sys.getsizeof(sura) for sura in self.suras)
+        total += sum(sys.getsizeof(boundaries) for boundaries in self.boundaries.values())
+        for lang in self.buffers:
+            total += sys.getsizeof(self.buffers[lang]) + sys.getsizeof(self.offsets[lang])
+        return total
+
+def check_verse_count(path, count, expected):
+    if count != expected:
+        raise DataError(f"'{path}' has {count} verses, expected {expected}.")
+
+def translation_name(filename):
+    # Tanzil names its files '<language>.<translator>.xml'; the translator
+    # part is the short name ('en.pickthall.xml' -> 'pickthall').
+    stem = filename[:-len('.xml')]
+    return stem.split('.', 1)[-1].lower()
+
+def discover_translations():
+    # name -> path of every verse text in the data directory. The Arabic
+    # original is 'arabic' and the default translation is 'english'; any
+    # other Tanzil-format file is picked up under its own name. Only the
+    # directory is listed here, nothing is parsed.
+    translations = {'arabic': get_data_path(ARABIC_FILE), 'english': get_data_path(ENGLISH_FILE)}
+    data_dir = os.path.dirname(translations['arabic'])
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith('.xml') or filename in (ARABIC_FILE, ENGLISH_FILE, METADATA_FILE):
+            continue
+        name = translation_name(filename)
+        if name in translations:
+            name = filename[:-len('.xml')].lower()
+        translations[name] = os.path.join(data_dir, filename)
+    return translations
+
+def resolve_translation(name, translations):
+    # Returns every translation that matches name: an exact name or file
+    # name wins, otherwise any whose name or file name starts with it
+    # ('sahih' finds sahihinternational.xml, i.e. 'english').
+    name = name.lower()
+    aliases = {}
+    for key, path in translations.items():
+        stem = os.path.basename(path)[:-len('.xml')].lower()
+        for alias in (key, stem, translation_name(os.path.basename(path))):
+            aliases.setdefault(alias, set()).add(key)
+    if name in aliases:
+        return sorted(aliases[name])
+    return sorted({key for alias, keys in aliases.items() if alias.startswith(name) for key in keys})
+
+def corpus_sources():
+    arabic_path = get_data_path(ARABIC_FILE)
+    english_path = get_data_path(ENGLISH_FILE)
+    for path in (arabic_path, english_path):
+        if not os.path.exists(path):
+            raise DataError(f"Quran data file '{path}' not found.")
+
+    return [arabic_path, english_path]
+
+def language_sources(lang):
+    # The files a cache derived from one language's text depends on: the
+    # Arabic file (which fixes the verse numbering) and that language's own.
+    translations = discover_translations()
+    return sorted({translations['arabic'], translations[lang]})
+
+def load_text(lang, path):
+    return cache.cached(f'text-{lang}.bin', TEXT_VERSION, [path],
+                        lambda: pack_texts(parse_quran_xml(path)[1]))
+
+def load_corpus():
+    arabic_path = corpus_sources()[0]
+    payload = cache.cached(CORPUS_CACHE, CORPUS_VERSION, [arabic_path],
+                           lambda: build_corpus_payload(arabic_path))
+    return Corpus(payload, discover_translations())
@@ -0,0 +1,148 @@
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+
+from client import get_socket_path
+
+class SessionStream:
+    # Installed as sys.stdout in the daemon. Each request thread writes to
+    # its own client; anything else goes to the daemon's real stdout.
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self.local = threading.local()
+
+    def target(self):
+        return getattr(self.local, 'session', None) or self.fallback
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def flush(self):
+        self.target().flush()
+
+    def isatty(self):
+        session = getattr(self.local, 'session', None)
+        return session.color if session else self.fallback.isatty()
+
+    @property
+    def columns(self):
+        session = getattr(self.local, 'session', None)
+        return session.columns if session else None
+
+    @property
+    def color(self):
+        session = getattr(self.local, 'session', None)
+        return session.color if session else None
+
+class Session:
+    BUFFER_SIZE = 16384
+
+    def __init__(self, connection, columns, color):
+        self.connection = connection
+        self.columns = columns
+        self.color = color
+        self.pending = []
+        self.pending_size = 0
+
+    def send(self, message):
+        self.connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+    def write(self, text):
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if self.pending_size >= self.BUFFER_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            self.send({'out': ''.join(self.pending)})
+            self.pending = []
+            self.pending_size = 0
+
+def handle_client(connection, stream, run):
+    with connection, connection.makefile('rb') as requests:
+        line = requests.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        session = Session(connection, request.get('columns') or 80, bool(request.get('color')))
+        stream.local.session = session
+        status = 0
+        try:
+            run(list(request['argv']))
+        except SystemExit as e:
+            if isinstance(e.code, str):
+                session.write(e.code + '\n')
+                status = 1
+            else:
+                status = e.code or 0
+        except BrokenPipeError:
+            return
+        except Exception as e:
+            session.write(f"Error: {e}\n")
+            status = 1
+        finally:
+            stream.local.session = None
+        try:
+            session.flush()
+            session.send({'exit': status})
+        except OSError:
+            pass
+
+def serve(run, preload, socket_path=None, is_stale=None, reload=None):
+    import socketserver
+
+    path = socket_path or get_socket_path()
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            print(f"Error: a daemon is already listening on {path}.")
+            sys.exit(1)
+        except OSError:
+            os.unlink(path)  # left behind by a daemon that did not shut down cleanly
+        finally:
+            probe.close()
+
+    preload()
+    stream = SessionStream(sys.stdout)
+    sys.stdout = stream
+    reload_lock = threading.Lock()
+
+    def run_fresh(argv):
+        # Reloading runs as part of the request, so a data file that went
+        # bad is reported to the client like any other error.
+        if is_stale and is_stale():
+            with reload_lock:
+                if is_stale():
+                    reload()
+        run(argv)
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            handle_client(self.request, stream, run_fresh)
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    old_umask = os.umask(0o177)  # the socket is private to this user
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(old_umask)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print(f"Listening on {path}", file=stream.fallback, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        sys.stdout = stream.fallback
+        if os.path.exists(path):
+            os.unlink(path)
@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+from array import array
+
+import cache
+from corpus import Corpus, DataError, build_corpus_payload, check_verse_count, corpus_sources, discover_translations, parse_quran_xml
+
+DATABASE_FILE = 'quran.db'
+DATABASE_VERSION = 2
+
+# Verses are read from the database a page at a time, so reading a passage
+# costs one indexed BETWEEN query per page rather than one per verse.
+PAGE_VERSES = 64
+MAX_PAGES = 256
+
+# The sura attributes of the Tanzil files, in the order they appear there.
+SURA_COLUMNS = ('index', 'name', 'ayas', 'start', 'tname', 'ename', 'type', 'order', 'rukus')
+
+SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE suras (
+    "index" INTEGER PRIMARY KEY, name TEXT, ayas INTEGER, start INTEGER, tname TEXT,
+    ename TEXT, type TEXT, "order" INTEGER, rukus INTEGER, first_verse INTEGER NOT NULL
+);
+CREATE TABLE verses (
+    id INTEGER PRIMARY KEY, sura INTEGER NOT NULL REFERENCES suras, aya INTEGER NOT NULL,
+    UNIQUE (sura, aya)
+);
+CREATE TABLE languages (language TEXT PRIMARY KEY, path TEXT NOT NULL);
+CREATE TABLE texts (
+    language TEXT NOT NULL REFERENCES languages, verse INTEGER NOT NULL REFERENCES verses, text TEXT NOT NULL,
+    PRIMARY KEY (language, verse)
+) WITHOUT ROWID;
+CREATE TABLE boundaries (
+    unit TEXT NOT NULL, number INTEGER NOT NULL, first_verse INTEGER NOT NULL,
+    PRIMARY KEY (unit, number)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE verse_search USING fts5(
+    text, language UNINDEXED, verse UNINDEXED, tokenize = 'unicode61 remove_diacritics 0'
+);
+'''
+
+def quote(column):
+    return f'"{column}"'
+
+def database_path():
+    return cache.get_cache_path(DATABASE_FILE)
+
+def database_sources():
+    return sorted(set(corpus_sources()) | set(discover_translations().values()))
+
+def build_database(path):
+    # Imports every verse text in the data directory into a new database at
+    # path, replacing it only once the import is complete. Arabic is
+    # searched in its normalized form, like the search index does.
+    from arabic import normalize
+
+    sources = corpus_sources()
+    translations = discover_translations()
+    payload = build_corpus_payload(sources[0])
+    starts = array('I')
+    starts.frombytes(payload['starts'])
+
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    try:
+        with db:
+            db.executescript(SCHEMA)
+            db.execute("INSERT INTO meta VALUES ('version', ?)", (str(DATABASE_VERSION),))
+            db.execute("INSERT INTO meta VALUES ('sources', ?)", (json.dumps(cache.source_stamp(database_sources())),))
+            db.executemany('INSERT INTO suras VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           ([sura.get(column) for column in SURA_COLUMNS] + [starts[number - 1] + 1]
+                            for number, sura in enumerate(payload['suras'], 1)))
+            db.executemany('INSERT INTO verses VALUES (?, ?, ?)',
+                           ((starts[sura - 1] + aya, sura, aya)
+                            for sura in range(1, len(starts)) for aya in range(1, starts[sura] - starts[sura - 1] + 1)))
+            for unit, packed in payload['boundaries'].items():
+                boundaries = array('I')
+                boundaries.frombytes(packed)
+                db.executemany('INSERT INTO boundaries VALUES (?, ?, ?)',
+                               ((unit, number, first + 1) for number, first in enumerate(boundaries, 1)))
+            for lang, text_path in translations.items():
+                verses = [text for sura in parse_quran_xml(text_path)[1] for text in sura]
+                check_verse_count(text_path, len(verses), starts[-1])
+                db.execute('INSERT INTO languages VALUES (?, ?)', (lang, text_path))
+                db.executemany('INSERT INTO texts VALUES (?, ?, ?)',
+                               ((lang, verse_id, text) for verse_id, text in enumerate(verses, 1)))
+                db.executemany('INSERT INTO verse_search (text, language, verse) VALUES (?, ?, ?)',
+                               ((normalize(text)[0] if lang == 'arabic' else text, lang, verse_id)
+                                for verse_id, text in enumerate(verses, 1)))
+            db.execute("INSERT INTO verse_search (verse_search) VALUES ('optimize')")
+        db.execute('VACUUM')
+    finally:
+        db.close()
+    os.replace(tmp_path, path)
+
+class DatabaseCorpus(Corpus):
+    # The corpus read from the SQLite database that 'quran build-db'
+    # creates. Verse texts are fetched by indexed range queries as they are
+    # needed, until a command scans a whole language and it is loaded into
+    # the same buffers the XML-backed Corpus uses. Phrase searches go
+    # through the FTS5 table.
+    __slots__ = ('db', 'pages')
+
+    def __init__(self, db):
+        self.db = db
+        self.pages = {}
+        suras = []
+        starts = array('I', [0])
+        for row in db.execute(f'SELECT {", ".join(map(quote, SURA_COLUMNS))}, first_verse FROM suras ORDER BY "index"'):
+            suras.append({column: str(value) for column, value in zip(SURA_COLUMNS, row) if value is not None})
+            starts.append(row[-1] - 1 + int(suras[-1]['ayas']))
+        boundaries = {}
+        for unit, first_verse in db.execute('SELECT unit, first_verse FROM boundaries ORDER BY unit, number'):
+            boundaries.setdefault(unit, array('I')).append(first_verse - 1)
+        translations = dict(db.execute('SELECT language, path FROM languages'))
+        super().__init__({'suras': suras, 'starts': starts.tobytes(),
+                          'boundaries': {unit: packed.tobytes() for unit, packed in boundaries.items()}},
+                         translations)
+
+    def texts(self, lang, lo, hi):
+        # The texts of verses [lo, hi) as one indexed range query.
+        rows = self.db.execute('SELECT text FROM texts WHERE language = ? AND verse BETWEEN ? AND ? ORDER BY verse',
+                               (lang, lo + 1, hi))
+        return [text for text, in rows]
+
+    def load_language(self, lang):
+        if lang not in self.translations:
+            raise DataError(f"The database has no '{lang}' text; run 'quran build-db' again.")
+        texts = self.texts(lang, 0, len(self))
+        offsets = array('I', [0])
+        position = 0
+        for text in texts:
+            position += len(text) + 1
+            offsets.append(position)
+        self.buffers[lang] = '\n'.join(texts) + '\n'
+        self.offsets[lang] = offsets
+        return offsets
+
+    def text(self, lang, index):
+        if lang in self.offsets or lang not in self.translations:
+            return super().text(lang, index)
+        page_number = index // PAGE_VERSES
+        page = self.pages.get((lang, page_number))
+        if page is None:
+            if len(self.pages) >= MAX_PAGES:
+                self.pages.clear()
+            lo = page_number * PAGE_VERSES
+            page = self.pages[lang, page_number] = self.texts(lang, lo, min(lo + PAGE_VERSES, len(self)))
+        return page[index - page_number * PAGE_VERSES]
+
+    def full_text_matches(self, lang, terms, lo, hi):
+        phrase = '"' + ' '.join(terms) + '"'
+        rows = self.db.execute('SELECT verse FROM verse_search WHERE verse_search MATCH ? AND language = ? '
+                               'AND verse BETWEEN ? AND ? ORDER BY verse', (phrase, lang, lo + 1, hi))
+        return [verse_id - 1 for verse_id, in rows]
+
+def open_database(path):
+    # The database at path; DataError if it is missing or was built from
+    # different data files than the ones there now.
+    if not path or not os.path.exists(path):
+        raise DataError("No Quran database found; run 'quran build-db' first.")
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+    try:
+        meta = dict(db.execute('SELECT key, value FROM meta'))
+    except sqlite3.DatabaseError:
+        meta = {}
+    stamp = json.dumps(cache.source_stamp(database_sources()))
+    if meta.get('version') != str(DATABASE_VERSION) or meta.get('sources') != stamp:
+        db.close()
+        raise DataError("The Quran database is out of date; run 'quran build-db' again.")
+    return db
+
+def load_database():
+    return DatabaseCorpus(open_database(database_path()))
@@ -0,0 +1,79 @@
+from array import array
+
+def trigrams(word):
+    padded = f"${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def default_distance(word):
+    return 1 if len(word) <= 4 else 2
+
+def levenshtein(a, b, limit):
+    # Banded edit distance; gives up with limit + 1 once every cell in a
+    # row is over the limit.
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def build_trigram_payload(words):
+    grams = {}
+    for word_id, word in enumerate(words):
+        for gram in trigrams(word):
+            grams.setdefault(gram, []).append(word_id)
+    return {gram: array('I', ids).tobytes() for gram, ids in grams.items()}
+
+class TrigramIndex:
+    __slots__ = ('words', 'packed', 'decoded', 'by_length')
+
+    def __init__(self, words, payload):
+        self.words = words
+        self.packed = payload
+        self.decoded = {}
+        self.by_length = None
+
+    def word_ids(self, gram):
+        ids = self.decoded.get(gram)
+        if ids is None:
+            ids = array('I')
+            ids.frombytes(self.packed.get(gram, b''))
+            self.decoded[gram] = ids
+        return ids
+
+    def candidates(self, word, max_distance):
+        # An edit touches at most three trigrams, so a word within
+        # max_distance edits shares at least this many with the query.
+        grams = trigrams(word)
+        needed = len(grams) - 3 * max_distance
+        if needed <= 0:
+            if self.by_length is None:
+                self.by_length = {}
+                for word_id, candidate in enumerate(self.words):
+                    self.by_length.setdefault(len(candidate), []).append(word_id)
+            ids = []
+            for length in range(len(word) - max_distance, len(word) + max_distance + 1):
+                ids.extend(self.by_length.get(length, ()))
+            return ids
+
+        shared = {}
+        for gram in grams:
+            for word_id in self.word_ids(gram):
+                shared[word_id] = shared.get(word_id, 0) + 1
+        return [word_id for word_id, count in shared.items() if count >= needed]
+
+    def lookup(self, word, max_distance=None):
+        if max_distance is None:
+            max_distance = default_distance(word)
+        matches = []
+        for word_id in self.candidates(word, max_distance):
+            candidate = self.words[word_id]
+            distance = levenshtein(word, candidate, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, candidate))
+        return sorted(matches)
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import io
+import json
+import sys
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlsplit
+
+from daemon import SessionStream
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+RESPONSE_CACHE_SIZE = 1024
+MAX_HEADER_LINES = 100
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+class ResponseCache:
+    # Encoded response bodies and their ETags by request, least recently
+    # used first. Only touched from the event loop, so it needs no lock.
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+def encode(payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    return f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"', body
+
+class Capture(io.StringIO):
+    # What a handler prints, in place of a daemon client's session.
+    columns = None
+    color = False
+
+def call(stream, handler, params):
+    # Handlers share their validation with the command line, which reports
+    # problems by printing "Error: ..." and exiting; that message becomes
+    # the error of a 400 response. Handlers run on worker threads, so what
+    # they print is captured per thread rather than by swapping sys.stdout.
+    captured = stream.local.session = Capture()
+    try:
+        return 200, handler(params)
+    except (ValueError, SystemExit) as e:
+        printed = [line for line in captured.getvalue().splitlines() if line.strip()]
+        message = printed[-1] if printed else (str(e) if isinstance(e, ValueError) else 'Invalid request.')
+        return 400, {'error': message.removeprefix('Error: ')}
+    finally:
+        stream.local.session = None
+
+def evaluate(stream, handler, params):
+    # (status, etag, body) for one request, on a worker thread.
+    try:
+        status, payload = call(stream, handler, params)
+    except Exception as e:
+        status, payload = 500, {'error': str(e)}
+    return (status,) + encode(payload)
+
+class Server:
+    # Requests are parsed and answered from the cache on the event loop;
+    # handlers and reloads, which can take a while, run in its default
+    # executor so they never hold up other connections.
+    def __init__(self, handlers, stream, cache_size=RESPONSE_CACHE_SIZE, is_stale=None, reload=None):
+        self.handlers = handlers
+        self.stream = stream
+        self.cache = ResponseCache(cache_size)
+        self.is_stale = is_stale
+        self.reload = reload
+        self.reload_lock = asyncio.Lock()
+
+    async def respond(self, method, target, headers):
+        # Returns (status, etag, body).
+        if method not in ('GET', 'HEAD'):
+            return (405,) + encode({'error': f"Method {method} is not allowed."})
+        url = urlsplit(target)
+        handler = self.handlers.get(url.path.rstrip('/') or '/')
+        if handler is None:
+            return (404,) + encode({'error': f"No endpoint {url.path}.",
+                                    'endpoints': sorted(self.handlers)})
+
+        loop = asyncio.get_running_loop()
+        if self.is_stale and self.is_stale():
+            async with self.reload_lock:
+                if self.is_stale():
+                    self.cache.clear()
+                    try:
+                        await loop.run_in_executor(None, self.reload)
+                    except Exception as e:
+                        return (500,) + encode({'error': str(e)})
+
+        params = dict(parse_qsl(url.query))
+        key = (url.path, tuple(sorted(params.items())))
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = await loop.run_in_executor(None, evaluate, self.stream, handler, params)
+            if entry[0] == 200:
+                self.cache.put(key, entry)
+        status, etag, body = entry
+        if status == 200 and etag in headers.get('if-none-match', ''):
+            return 304, etag, b''
+        return status, etag, body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+                headers = {}
+                for _ in range(MAX_HEADER_LINES):
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if headers.get('content-length'):
+                    await reader.readexactly(int(headers['content-length']))
+
+                status, etag, body = await self.respond(method, target, headers)
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+                head = [f"HTTP/1.1 {status} {REASONS[status]}",
+                        "Content-Type: application/json; charset=utf-8",
+                        f"Content-Length: {len(body)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                if status in (200, 304):
+                    head += [f"ETag: {etag}", "Cache-Control: no-cache"]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+                if method != 'HEAD':
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+async def serve_forever(server, host, port):
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Listening on http://{host}:{port}", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+def serve(handlers, preload, host=DEFAULT_HOST, port=DEFAULT_PORT, is_stale=None, reload=None):
+    preload()
+    stream = SessionStream(sys.stdout)
+    sys.stdout = stream
+    server = Server(handlers, stream, is_stale=is_stale, reload=reload)
+    try:
+        asyncio.run(serve_forever(server, host, port))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error: Cannot listen on {host}:{port}: {e.strerror}.")
+        sys.exit(1)
+    finally:
+        sys.stdout = stream.fallback
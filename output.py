@@ -0,0 +1,98 @@
+import io
+import sys
+
+FORMATS = ('text', 'jsonl', 'csv', 'tsv')
+
+class Writer:
+    # Collects lines and hands them to the stream in large chunks, so a
+    # whole-sura or whole-corpus dump costs a few writes instead of one per
+    # line, while the first results still appear after the first chunk.
+    CHUNK_SIZE = 65536
+
+    def __init__(self, stream, close_stream=False, line_buffered=False):
+        self.stream = stream
+        self.close_stream = close_stream
+        self.chunk_size = 1 if line_buffered else self.CHUNK_SIZE
+        self.pending = []
+        self.pending_size = 0
+
+    def write_line(self, line):
+        self.pending.append(line)
+        self.pending.append('\n')
+        self.pending_size += len(line) + 1
+        if self.pending_size >= self.chunk_size:
+            self.flush()
+
+    def write_lines(self, lines):
+        for line in lines:
+            self.write_line(line)
+
+    def flush(self):
+        if self.pending:
+            self.stream.write(''.join(self.pending))
+            self.pending = []
+            self.pending_size = 0
+        self.stream.flush()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self.close_stream:
+                self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def output_path(output_file):
+    return output_file[1:] if output_file and output_file.startswith('>') else output_file
+
+def open_writer(output_file=None):
+    if output_file:
+        return Writer(open(output_path(output_file), 'w', encoding='utf-8'), close_stream=True)
+    # An interactive terminal should see each line as soon as it is ready.
+    interactive = sys.stdout is sys.__stdout__ and sys.stdout.isatty()
+    return Writer(sys.stdout, line_buffered=interactive)
+
+def format_records(records, fmt):
+    # Turns an iterable of dicts into jsonl, csv or tsv lines. The columns
+    # come from the first record.
+    if fmt == 'jsonl':
+        import json
+
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False)
+        return
+
+    import csv
+
+    fieldnames = None
+    buffer = io.StringIO()
+    writer = None
+    for record in records:
+        if fieldnames is None:
+            fieldnames = list(record)
+            if fmt == 'csv':
+                writer = csv.writer(buffer, lineterminator='')
+                writer.writerow(fieldnames)
+                yield pop_buffer(buffer)
+            else:
+                yield '\t'.join(fieldnames)
+        values = [record.get(name, '') for name in fieldnames]
+        if fmt == 'csv':
+            writer.writerow(values)
+            yield pop_buffer(buffer)
+        else:
+            yield '\t'.join(tsv_field(value) for value in values)
+
+def pop_buffer(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+def tsv_field(value):
+    return str(value).replace('\t', ' ').replace('\n', ' ')
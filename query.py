@@ -0,0 +1,335 @@
+import re
+
+from search_index import TOKEN, intersect, tokenize
+
+QUERY_TOKEN = re.compile(r'\(|\)|"[^"]*"?|NEAR/\d+|[^\s()"]+')
+QUERY_SYNTAX = re.compile(r'["()*]|~\d*(?:\s|$)|(?:^|\s)(?:AND|OR|NOT|NEAR/\d+)(?:\s|$)')
+FUZZY_TERM = re.compile(r'(\w+)~(\d*)')
+
+class QueryError(ValueError):
+    pass
+
+def is_query(text):
+    return QUERY_SYNTAX.search(text) is not None
+
+def merge_docs(doc_lists):
+    merged = set()
+    for docs in doc_lists:
+        merged.update(docs)
+    return sorted(merged)
+
+class Term:
+    positional = True
+
+    def __init__(self, term):
+        self.term = term
+
+    def estimate(self, index):
+        return index.doc_frequency(self.term)
+
+    def evaluate(self, index, lo, hi):
+        return list(index.docs_between(self.term, lo, hi))
+
+    def filter(self, index, candidates):
+        postings = index.postings(self.term)
+        return intersect([candidates, postings.docs]) if postings else []
+
+    def spans(self, index, doc):
+        postings = index.postings(self.term)
+        slot = postings.slot(doc) if postings else None
+        if slot is None:
+            return []
+        return [(position, position) for position in postings.positions_at(slot)]
+
+    def patterns(self):
+        return [r'\b' + re.escape(self.term) + r'\b']
+
+class Prefix:
+    positional = True
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def expand(self, index):
+        return index.terms_with_prefix(self.prefix)
+
+    def estimate(self, index):
+        return sum(index.doc_frequency(term) for term in self.expand(index))
+
+    def evaluate(self, index, lo, hi):
+        return merge_docs(index.docs_between(term, lo, hi) for term in self.expand(index))
+
+    def filter(self, index, candidates):
+        return merge_docs(Term(term).filter(index, candidates) for term in self.expand(index))
+
+    def spans(self, index, doc):
+        spans = []
+        for term in self.expand(index):
+            spans.extend(Term(term).spans(index, doc))
+        return sorted(spans)
+
+    def patterns(self):
+        return [r'\b' + re.escape(self.prefix) + r'\w*']
+
+class Fuzzy(Prefix):
+    def __init__(self, word, max_distance=None):
+        self.word = word
+        self.max_distance = max_distance
+        self.matches = None
+
+    def expand(self, index):
+        if self.matches is None:
+            self.matches = index.similar_terms(self.word, self.max_distance)
+        return [term for _, term in self.matches]
+
+    def expansions(self):
+        return [(self.word, self.matches or [])]
+
+    def patterns(self):
+        return [r'\b' + re.escape(term) + r'\b' for _, term in self.matches or []]
+
+class Phrase:
+    positional = True
+
+    def __init__(self, words):
+        self.words = words
+
+    def estimate(self, index):
+        return min(index.doc_frequency(word) for word in self.words)
+
+    def evaluate(self, index, lo, hi):
+        docs = intersect([index.docs_between(word, lo, hi) for word in set(self.words)])
+        return [doc for doc in docs if self.spans(index, doc)]
+
+    def filter(self, index, candidates):
+        for word in sorted(set(self.words), key=index.doc_frequency):
+            if not candidates:
+                break
+            candidates = Term(word).filter(index, candidates)
+        return [doc for doc in candidates if self.spans(index, doc)]
+
+    def spans(self, index, doc):
+        positions = [set(start for start, _ in Term(word).spans(index, doc)) for word in self.words]
+        last = len(self.words) - 1
+        return [(start, start + last) for start in sorted(positions[0])
+                if all(start + offset in positions[offset] for offset in range(1, last + 1))]
+
+    def patterns(self):
+        return [r'\b' + r'\W+'.join(re.escape(word) for word in self.words) + r'\b']
+
+class Near:
+    positional = True
+
+    def __init__(self, left, right, distance):
+        self.left = left
+        self.right = right
+        self.distance = distance
+
+    def estimate(self, index):
+        return min(self.left.estimate(index), self.right.estimate(index))
+
+    def evaluate(self, index, lo, hi):
+        first, second = sorted((self.left, self.right), key=lambda node: node.estimate(index))
+        docs = second.filter(index, first.evaluate(index, lo, hi))
+        return [doc for doc in docs if self.spans(index, doc)]
+
+    def filter(self, index, candidates):
+        first, second = sorted((self.left, self.right), key=lambda node: node.estimate(index))
+        docs = second.filter(index, first.filter(index, candidates))
+        return [doc for doc in docs if self.spans(index, doc)]
+
+    def spans(self, index, doc):
+        # Distance is the number of tokens between the two spans, so
+        # "a NEAR/0 b" means adjacent in either order. Spans are inclusive
+        # and only distinct, non-overlapping ones pair up: "the" NEAR/0
+        # "the" needs two occurrences, not one matched with itself.
+        spans = []
+        for left_start, left_end in self.left.spans(index, doc):
+            for right_start, right_end in self.right.spans(index, doc):
+                if left_end < right_start:
+                    gap = right_start - left_end - 1
+                elif right_end < left_start:
+                    gap = left_start - right_end - 1
+                else:
+                    continue
+                if gap <= self.distance:
+                    spans.append((min(left_start, right_start), max(left_end, right_end)))
+        return spans
+
+    def patterns(self):
+        return self.left.patterns() + self.right.patterns()
+
+class Not:
+    positional = False
+
+    def __init__(self, child):
+        self.child = child
+
+    def patterns(self):
+        return []
+
+class And:
+    positional = False
+
+    def __init__(self, children):
+        self.positives = [child for child in children if not isinstance(child, Not)]
+        self.negatives = [child.child for child in children if isinstance(child, Not)]
+
+    def estimate(self, index):
+        if not self.positives:
+            return float('inf')
+        return min(child.estimate(index) for child in self.positives)
+
+    def narrow(self, index, docs, positives):
+        # Cheapest clauses first: each one only has to test the candidates
+        # that survived the previous ones, and an empty set stops the walk.
+        for child in positives:
+            if not docs:
+                return []
+            docs = child.filter(index, docs)
+        for child in self.negatives:
+            if not docs:
+                return []
+            excluded = set(child.filter(index, docs))
+            docs = [doc for doc in docs if doc not in excluded]
+        return docs
+
+    def evaluate(self, index, lo, hi):
+        positives = sorted(self.positives, key=lambda child: child.estimate(index))
+        if positives:
+            return self.narrow(index, positives[0].evaluate(index, lo, hi), positives[1:])
+        return self.narrow(index, list(range(lo, hi)), [])
+
+    def filter(self, index, candidates):
+        positives = sorted(self.positives, key=lambda child: child.estimate(index))
+        return self.narrow(index, list(candidates), positives)
+
+    def patterns(self):
+        return [pattern for child in self.positives for pattern in child.patterns()]
+
+class Or:
+    positional = False
+
+    def __init__(self, children):
+        self.children = children
+
+    def estimate(self, index):
+        return sum(child.estimate(index) for child in self.children)
+
+    def evaluate(self, index, lo, hi):
+        return merge_docs(child.evaluate(index, lo, hi) for child in self.children)
+
+    def filter(self, index, candidates):
+        return merge_docs(child.filter(index, candidates) for child in self.children)
+
+    def patterns(self):
+        return [pattern for child in self.children for pattern in child.patterns()]
+
+class Parser:
+    def __init__(self, text):
+        self.tokens = QUERY_TOKEN.findall(text)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise QueryError("empty query")
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QueryError(f"unexpected '{self.peek()}'")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_unary()]
+        while self.peek() not in (None, 'OR', ')'):
+            if self.peek() == 'AND':
+                self.take()
+            children.append(self.parse_unary())
+        if len(children) == 1 and not isinstance(children[0], Not):
+            return children[0]
+        return And(children)
+
+    def parse_unary(self):
+        if self.peek() == 'NOT':
+            self.take()
+            return Not(self.parse_unary())
+        return self.parse_near()
+
+    def parse_near(self):
+        node = self.parse_primary()
+        while self.peek() is not None and self.peek().startswith('NEAR/'):
+            distance = int(self.take()[len('NEAR/'):])
+            right = self.parse_primary()
+            if not (node.positional and right.positional):
+                raise QueryError("NEAR only joins words, prefixes and phrases")
+            node = Near(node, right, distance)
+        return node
+
+    def parse_primary(self):
+        token = self.take()
+        if token is None:
+            raise QueryError("query ends too early")
+        if token == '(':
+            node = self.parse_or()
+            if self.take() != ')':
+                raise QueryError("missing ')'")
+            return node
+        if token in (')', 'AND', 'OR') or token.startswith('NEAR/'):
+            raise QueryError(f"unexpected '{token}'")
+        if token.startswith('"'):
+            words = tokenize(token.strip('"'))
+            if not words:
+                raise QueryError(f"empty phrase {token}")
+            return Phrase(words) if len(words) > 1 else Term(words[0])
+        fuzzy = FUZZY_TERM.fullmatch(token)
+        if fuzzy:
+            word, distance = fuzzy.groups()
+            return Fuzzy(word.lower(), int(distance) if distance else None)
+        if token.endswith('*'):
+            prefix = token.rstrip('*').lower()
+            if not TOKEN.fullmatch(prefix):
+                raise QueryError(f"invalid prefix '{token}'")
+            return Prefix(prefix)
+        words = tokenize(token)
+        if not words:
+            raise QueryError(f"'{token}' contains no searchable words")
+        return Phrase(words) if len(words) > 1 else Term(words[0])
+
+def parse_query(text):
+    return Parser(text).parse()
+
+def run_query(node, index, lo, hi):
+    return node.evaluate(index, lo, hi)
+
+def fuzzy_expansions(node):
+    # (word, [(distance, term), ...]) for every fuzzy term in the query,
+    # available once the query has been run.
+    if isinstance(node, Fuzzy):
+        return node.expansions()
+    children = []
+    for attribute in ('children', 'positives', 'negatives'):
+        children.extend(getattr(node, attribute, ()))
+    for attribute in ('child', 'left', 'right'):
+        if hasattr(node, attribute):
+            children.append(getattr(node, attribute))
+    return [expansion for child in children for expansion in fuzzy_expansions(child)]
+
+def highlight_pattern(node):
+    patterns = sorted(set(node.patterns()), key=len, reverse=True)
+    if not patterns:
+        return None
+    return re.compile('|'.join(patterns), re.IGNORECASE)
@@ -1,38 +1,77 @@
 #!/usr/bin/env python3
 import os
 import sys
-import xml.etree.ElementTree as ET
-import shutil
-import textwrap
-from termcolor import colored
-import difflib
-import re
-
-def get_data_path(filename):
-    script_dir = os.path.dirname(os.path.realpath(__file__))
-    path = os.path.join(script_dir, 'data', filename)
-    #print(f"DEBUG: Looking for file at {path}")  # Debug print
-    return path
+import itertools
 
-def load_quran_data():
-    try:
-        arabic_path = get_data_path('ar.quran.xml')
-        arabic_tree = ET.parse(arabic_path)
-    except FileNotFoundError:
-        print(f"Error: Quran data file '{arabic_path}' not found.")
-        sys.exit(1)
+import client
+from cache import source_stamp
+from corpus import NAVIGATION_UNITS, DataError, corpus_sources, discover_translations, load_corpus, resolve_translation
+from output import FORMATS, format_records, open_writer, output_path
 
-    try:
-        english_path = get_data_path('en.quran.xml')
-        english_tree = ET.parse(english_path)
-    except FileNotFoundError:
-        print(f"Error: Quran data file '{english_path}' not found.")
+# Everything else is imported by the functions that need it, so a quick
+# command like 'quran 2:255' never loads search, fuzzy matching, colouring
+# or the daemon.
+
+_corpus = None
+_corpus_stamp = None
+_seek_index = None
+_search_indexes = {}
+_term_stats = {}
+_similarity_indexes = {}
+_chapter_names = None
+_normalized = None
+
+# The languages shown for -a, -e and neither.
+LANGUAGES = {"both": ("arabic", "english"), "arabic": ("arabic",), "english": ("english",)}
+
+def open_database():
+    from database import load_database
+    return load_database()
+
+# Where the corpus is read from, chosen with QURAN_STORAGE: the XML files
+# through the compiled caches (the default), or the SQLite database that
+# 'quran build-db' imports them into.
+STORAGE_BACKENDS = {'xml': load_corpus, 'sqlite': open_database}
+
+def storage_backend():
+    backend = os.environ.get('QURAN_STORAGE', 'xml').lower()
+    if backend not in STORAGE_BACKENDS:
+        print(f"Error: Unknown storage '{backend}'; QURAN_STORAGE must be one of {', '.join(STORAGE_BACKENDS)}.")
         sys.exit(1)
+    return backend
 
-    arabic_root = arabic_tree.getroot()
-    english_root = english_tree.getroot()
+def data_sources():
+    # Every file the loaded data depends on, including translations that
+    # have not been read yet, so the daemon notices new ones.
+    sources = set(corpus_sources()) | set(discover_translations().values())
+    if storage_backend() == 'sqlite':
+        from database import database_path
+        path = database_path()
+        if path and os.path.exists(path):
+            sources.add(path)
+    return sorted(sources)
 
-    return arabic_root, english_root
+def load_quran_data():
+    global _corpus, _corpus_stamp
+    if _corpus is None:
+        _corpus_stamp = source_stamp(data_sources())
+        _corpus = STORAGE_BACKENDS[storage_backend()]()
+    return _corpus
+
+def load_verse_index():
+    # Short reads decode just the verses they need straight from the XML
+    # files; once the full corpus is resident it is always the faster path.
+    # The database reads verse ranges by itself.
+    global _seek_index
+    if _corpus is not None or storage_backend() != 'xml':
+        return load_quran_data()
+    if _seek_index is None:
+        from seek import load_seek_index
+        try:
+            _seek_index = load_seek_index()
+        except OSError:
+            return load_quran_data()
+    return _seek_index
 
 def alias_command(args):
     if args[0] == "-s":
@@ -43,38 +82,47 @@ def alias_command(args):
         return ["search", args[0][1:]] + args[1:]
     return args
 
-def highlight(text, word, no_highlight):
-    if no_highlight:
-        return text
-    regex = re.compile(r'\b' + re.escape(word) + r'\b', re.IGNORECASE)
-    return regex.sub(lambda match: colored(match.group(), 'cyan'), text)
+def emit(lines, output_file=None):
+    # Everything a command prints goes through one buffered writer, so
+    # lines are formatted and written as they are generated.
+    with open_writer(output_file) as writer:
+        writer.write_lines(lines)
+    if output_file:
+        print(f"Results written to {output_path(output_file)}")
 
-def print_wrapped_verse(chapter_num, verse_num, text):
-    width, _ = shutil.get_terminal_size()
-    indent = ' ' * (len(f"{chapter_num}:{verse_num}") + 4)
-    wrapper = textwrap.TextWrapper(width=width, initial_indent='', subsequent_indent=indent)
-    wrapped_text = wrapper.fill(f"{chapter_num}:{verse_num}    {text}")
-    print(wrapped_text)
+def load_names():
+    global _chapter_names
+    if _chapter_names is None:
+        from chapter_names import load_chapter_names
+        _chapter_names = load_chapter_names(lambda: load_verse_index().suras)
+    return _chapter_names
 
 def chapter_name_to_number(name):
-    _, english_root = load_quran_data()
-    chapters = {sura.get('ename').lower(): int(sura.get('index')) for sura in english_root.findall('./sura')}
-    chapters.update({sura.get('tname').lower(): int(sura.get('index')) for sura in english_root.findall('./sura')})
+    chapter_num = load_names().resolve(name)
+    if chapter_num is None:
+        print(f"Error: Invalid chapter name '{name}'.")
+        sys.exit(1)
+    return chapter_num
 
-    if name.lower() in chapters:
-        return chapters[name.lower()]
-    else:
-        closest_match = difflib.get_close_matches(name.lower(), chapters.keys(), n=1)
-        if closest_match:
-            return chapters[closest_match[0]]
-        else:
-            print(f"Error: Invalid chapter name '{name}'.")
-            sys.exit(1)
+def chapter_number(part, fuzzy=True):
+    # A chapter given by number or by name; without fuzzy, None unless the
+    # name is an exact alias or a unique prefix of one.
+    if part.isdigit():
+        return int(part)
+    if fuzzy:
+        return chapter_name_to_number(part)
+    return load_names().resolve(part, fuzzy=False)
 
 def parse_chapter_range(range_str):
+    import re
+
     verse_pattern = re.compile(r"(\d+):(\d+)-(\d+):(\d+)")
     single_chapter_verse_pattern = re.compile(r"(\d+):(\d+)-(\d+)")
     single_chapter_pattern = re.compile(r"(\d+):(\d+)")
+    # The same with chapter names, which may have hyphens of their own.
+    named_verse_pattern = re.compile(r"(.+?):(\d+)-(.+):(\d+)")
+    named_chapter_verse_pattern = re.compile(r"(.+?):(\d+)-(\d+)")
+    named_chapter_pattern = re.compile(r"(.+?):(\d+)")
 
     if verse_pattern.match(range_str):
         start_chap, start_verse, end_chap, end_verse = map(int, verse_pattern.match(range_str).groups())
@@ -85,172 +133,421 @@ def parse_chapter_range(range_str):
     elif single_chapter_pattern.match(range_str):
         chapter, verse = map(int, single_chapter_pattern.match(range_str).groups())
         return (chapter, verse, chapter, verse)
+    elif named_verse_pattern.fullmatch(range_str):
+        start, start_verse, end, end_verse = named_verse_pattern.fullmatch(range_str).groups()
+        return (chapter_number(start), int(start_verse), chapter_number(end), int(end_verse))
+    elif named_chapter_verse_pattern.fullmatch(range_str):
+        chapter, start_verse, end_verse = named_chapter_verse_pattern.fullmatch(range_str).groups()
+        chap = chapter_number(chapter)
+        return (chap, int(start_verse), chap, int(end_verse))
+    elif named_chapter_pattern.fullmatch(range_str):
+        chapter, verse = named_chapter_pattern.fullmatch(range_str).groups()
+        chap = chapter_number(chapter)
+        return (chap, int(verse), chap, int(verse))
     elif '-' in range_str:
+        # 'al-baqara' is one chapter and 'al-baqara-an-nisaa' two: a whole
+        # name is tried first, then every hyphen as the split, and only then
+        # the spelling correction.
+        if not re.fullmatch(r"\d+-\d+", range_str):
+            chap = chapter_number(range_str, fuzzy=False)
+            if chap:
+                return (chap, None, chap, None)
+            for position in (match.start() for match in re.finditer('-', range_str)):
+                start_chap = chapter_number(range_str[:position], fuzzy=False)
+                end_chap = chapter_number(range_str[position + 1:], fuzzy=False)
+                if start_chap and end_chap:
+                    return (start_chap, None, end_chap, None)
+            if range_str.count('-') > 1:
+                chap = chapter_number(range_str)
+                return (chap, None, chap, None)
         start, end = range_str.split('-')
-        start_chap = chapter_name_to_number(start) if not start.isdigit() else int(start)
-        end_chap = chapter_name_to_number(end) if not end.isdigit() else int(end)
-        return (start_chap, None, end_chap, None)
+        return (chapter_number(start), None, chapter_number(end), None)
     else:
-        chap = chapter_name_to_number(range_str) if not range_str.isdigit() else int(range_str)
+        chap = chapter_number(range_str)
         return (chap, None, chap, None)
 
-def read(chapter_num, verse_spec=None, lang="both", highlight_word=None, show_heading=True):
-    arabic_root, english_root = load_quran_data()
+def chapter_name(chapter, lang):
+    if lang == "arabic":
+        return chapter.get('name')
+    if lang == "english":
+        return chapter.get('ename')
+    return f"{chapter.get('ename')} ({chapter.get('tname')})"
 
-    chapter_ar = arabic_root.find(f"./sura[@index='{chapter_num}']")
-    chapter_en = english_root.find(f"./sura[@index='{chapter_num}']")
-    if chapter_ar is None or chapter_en is None:
-        print("Error: Invalid chapter number.")
+def heading_lines(chapter_num, chapter, lang):
+    if lang == "arabic":
+        yield f"Chapter {chapter_num} - {chapter.get('name')}:"
+    elif lang == "english":
+        yield f"Chapter {chapter_num} - {chapter.get('ename')}:"
+    else:
+        yield f"Chapter {chapter_num} - {chapter.get('ename')} ({chapter.get('tname')}) - {chapter.get('name')}"
+    if chapter_num not in [1, 9]:
+        yield "بِسْمِ اللَّهِ الرَّحْمَـٰنِ الرَّحِيمِ"
+
+def heading_language(languages):
+    if languages == ("arabic",):
+        return "arabic"
+    return "both" if "arabic" in languages else "english"
+
+def verse_records(corpus, entries, languages):
+    for index, chapter_num, verse_num in entries:
+        if index is None:
+            continue
+        for language in languages:
+            yield {
+                'sura': chapter_num,
+                'aya': verse_num,
+                'verse_id': index + 1,
+                'language': language,
+                'text': corpus.text(language, index),
+            }
+
+def slice_entries(corpus, lo, hi):
+    # (index, chapter, verse) for every verse in [lo, hi), in order.
+    if lo >= hi:
         return
+    chapter_num, verse_num = corpus.locate(lo)
+    verse_count = corpus.verse_count(chapter_num)
+    for index in range(lo, hi):
+        if verse_num > verse_count:
+            chapter_num += 1
+            verse_num = 1
+            verse_count = corpus.verse_count(chapter_num)
+        yield index, chapter_num, verse_num
+        verse_num += 1
 
-    if show_heading:
-        if lang == "arabic":
-            print(f"Chapter {chapter_num} - {chapter_ar.get('name')}:")
-        elif lang == "english":
-            print(f"Chapter {chapter_num} - {chapter_en.get('ename')}:")
+def verse_output(renderer, entries, show_headings=True, fmt="text"):
+    # Entries with an index of None are verses that do not exist.
+    corpus, lang = renderer.corpus, heading_language(renderer.languages)
+    if fmt != "text":
+        yield from format_records(verse_records(corpus, entries, renderer.languages), fmt)
+        return
+    current_chapter = None
+    for index, chapter_num, verse_num in entries:
+        if chapter_num != current_chapter:
+            current_chapter = chapter_num
+            if show_headings:
+                yield from heading_lines(chapter_num, corpus.sura(chapter_num), lang)
+        if index is None:
+            yield f"{chapter_num}:{verse_num}: Not found"
         else:
-            print(f"Chapter {chapter_num} - {chapter_en.get('ename')} ({chapter_en.get('tname')}) - {chapter_ar.get('name')}")
-        if chapter_num not in [1, 9]:
-            print("بِسْمِ اللَّهِ الرَّحْمَـٰنِ الرَّحِيمِ")
+            yield from renderer.verse_lines(index, chapter_num, verse_num)
+
+def read(chapter_num, verse_spec=None, lang="both", highlight_words=(), show_heading=True, fmt="text", output_file=None, translations=None):
+    from render import Renderer
+    from seek import SEEK_MAX_VERSES
+
+    corpus = load_verse_index()
+
+    chapter = corpus.sura(chapter_num)
+    if chapter is None:
+        print("Error: Invalid chapter number.")
+        return
 
     if verse_spec:
         if '-' in verse_spec:
             start, end = map(int, verse_spec.split('-'))
-            for verse_num in range(start, end + 1):
-                arabic_verse = arabic_root.find(f"./sura[@index='{chapter_num}']/aya[@index='{verse_num}']")
-                english_verse = english_root.find(f"./sura[@index='{chapter_num}']/aya[@index='{verse_num}']")
-                if arabic_verse is None or english_verse is None:
-                    print(f"{chapter_num}:{verse_num}: Not found")
-                else:
-                    if lang in ("both", "arabic"):
-                        text = arabic_verse.get('text')
-                        if highlight_word:
-                            text = highlight(text, highlight_word, False)
-                        print_wrapped_verse(chapter_num, verse_num, text)
-                    if lang in ("both", "english"):
-                        text = english_verse.get('text')
-                        if highlight_word:
-                            text = highlight(text, highlight_word, False)
-                        print_wrapped_verse(chapter_num, verse_num, text)
         else:
-            verse_num = int(verse_spec)
-            arabic_verse = arabic_root.find(f"./sura[@index='{chapter_num}']/aya[@index='{verse_num}']")
-            english_verse = english_root.find(f"./sura[@index='{chapter_num}']/aya[@index='{verse_num}']")
-            if arabic_verse is None or english_verse is None:
-                print(f"{chapter_num}:{verse_num}: Not found")
-            else:
-                if lang in ("both", "arabic"):
-                    text = arabic_verse.get('text')
-                    if highlight_word:
-                        text = highlight(text, highlight_word, False)
-                    print_wrapped_verse(chapter_num, verse_num, text)
-                if lang in ("both", "english"):
-                    text = english_verse.get('text')
-                    if highlight_word:
-                        text = highlight(text, highlight_word, False)
-                    print_wrapped_verse(chapter_num, verse_num, text)
+            start = end = int(verse_spec)
     else:
-        for aya in arabic_root.findall(f"./sura[@index='{chapter_num}']/aya"):
-            if lang in ("both", "arabic"):
-                text = aya.get('text')
-                if highlight_word:
-                    text = highlight(text, highlight_word, False)
-                print_wrapped_verse(chapter_num, aya.get('index'), text)
-            english_verse = english_root.find(f"./sura[@index='{chapter_num}']/aya[@index='{aya.get('index')}']")
-            if english_verse is not None and lang in ("both", "english"):
-                text = english_verse.get('text')
-                if highlight_word:
-                    text = highlight(text, highlight_word, False)
-                print_wrapped_verse(chapter_num, aya.get('index'), text)
-
-def read_range(range_spec, lang="both", highlight_word=None, no_chapter_headings=False):
+        start, end = 1, corpus.verse_count(chapter_num)
+
+    if end - start + 1 > SEEK_MAX_VERSES:
+        corpus = load_quran_data()
+
+    entries = ((corpus.index(chapter_num, verse_num), chapter_num, verse_num) for verse_num in range(start, end + 1))
+    renderer = Renderer(corpus, translations or LANGUAGES[lang], highlight_words, load_normalized)
+    emit(verse_output(renderer, entries, show_heading, fmt), output_file)
+
+def read_range(range_spec, lang="both", highlight_words=(), no_chapter_headings=False, fmt="text", output_file=None, translations=None):
+    from render import Renderer
+    from seek import SEEK_MAX_VERSES
+
+    corpus = load_verse_index()
     start_chap, start_verse, end_chap, end_verse = parse_chapter_range(range_spec)
 
-    current_chap = start_chap
-    first_pass = True
+    if start_chap < 1 or start_chap > 114 or end_chap < 1 or end_chap > 114:
+        print("Error: Chapter number must be between 1 and 114.")
+        return
+
+    try:
+        verse_range = corpus.resolve_range(start_chap, start_verse, end_chap, end_verse)
+    except ValueError as e:
+        print(f"Error: {e}.")
+        return
+    if verse_range is None:
+        print(f"Error: Invalid range '{range_spec}'.")
+        return
+    if verse_range[1] - verse_range[0] > SEEK_MAX_VERSES:
+        corpus = load_quran_data()
+
+    entries = slice_entries(corpus, *verse_range)
+    renderer = Renderer(corpus, translations or LANGUAGES[lang], highlight_words, load_normalized)
+    emit(verse_output(renderer, entries, not no_chapter_headings, fmt), output_file)
+
+def read_unit(unit, unit_spec, lang="both", highlight_words=(), no_chapter_headings=False, fmt="text", output_file=None, translations=None):
+    from render import Renderer
+
+    corpus = load_quran_data()
+
+    try:
+        if '-' in unit_spec:
+            first, last = map(int, unit_spec.split('-'))
+        else:
+            first = last = int(unit_spec)
+    except ValueError:
+        print(f"Usage: quran {unit} <number>[-<number>]")
+        return
+
+    start = corpus.unit_range(unit, first)
+    end = corpus.unit_range(unit, last)
+    if start is None or end is None or first > last:
+        print(f"Error: {unit.capitalize()} number must be between 1 and {corpus.unit_count(unit)}.")
+        return
+
+    lo, hi = start[0], end[1]
+    renderer = Renderer(corpus, translations or LANGUAGES[lang], highlight_words, load_normalized)
+    lines = verse_output(renderer, slice_entries(corpus, lo, hi), not no_chapter_headings, fmt)
+    if fmt == "text" and not no_chapter_headings:
+        first_ref = "{}:{}".format(*corpus.locate(lo))
+        last_ref = "{}:{}".format(*corpus.locate(hi - 1))
+        label = f"{unit.capitalize()} {unit_spec}"
+        lines = itertools.chain([f"{label} ({first_ref} - {last_ref})"], lines)
+    emit(lines, output_file)
+
+def load_normalized():
+    global _normalized
+    if _normalized is None:
+        from arabic import load_normalized_text
+        _normalized = load_normalized_text(load_quran_data())
+    return _normalized
+
+def suggest_keyword(index, keyword):
+    import re
+    from search_index import tokenize
+
+    corrected = keyword
+    for term in set(tokenize(keyword)):
+        if term in index:
+            continue
+        suggestions = index.similar_terms(term)
+        if suggestions:
+            corrected = re.sub(r'\b' + re.escape(term) + r'\b', suggestions[0][1], corrected, flags=re.IGNORECASE)
+    return corrected if corrected != keyword else None
+
+def find_keyword(corpus, keyword, lo, hi, translation="english"):
+    # Returns the language searched, the matching verse indexes, the
+    # pattern that highlights the matches in that language's searchable
+    # text and any notes about fuzzy expansions or spelling suggestions.
+    # Arabic keywords are matched against the normalized Arabic text, so
+    # harakat and hamza/alef spelling differences do not matter. Other
+    # keywords search the given translation.
+    from arabic import is_arabic, normalize
+    from query import fuzzy_expansions, highlight_pattern, is_query, parse_query, run_query
+    from render import keyword_pattern
+    from search_index import TOKEN, find_verses, searchable_text, tokenize
+
+    if is_arabic(keyword):
+        lang = 'arabic'
+        keyword = normalize(keyword)[0]
+        text_of = load_normalized().text
+    else:
+        lang = translation
+        text_of = searchable_text(corpus, lang)
+    notes = []
+
+    if is_query(keyword):
+        node = parse_query(keyword)
+        matches = run_query(node, load_index(lang), lo, hi)
+        for word, expansions in fuzzy_expansions(node):
+            terms = ", ".join(f"{term} ({distance})" for distance, term in expansions) or "nothing"
+            notes.append(f"Fuzzy matches for '{word}' (edit distance): {terms}")
+        return lang, matches, highlight_pattern(node), notes
+
+    pattern = keyword_pattern(keyword)
+    terms = tokenize(keyword)
+    # Storage with a full-text index finds the verses with every word in
+    # order; as with the inverted index, the pattern then checks anything
+    # more than a single word.
+    matches = corpus.full_text_matches(lang, terms, lo, hi) if terms else None
+    if matches is None:
+        matches = find_verses(text_of, load_index(lang), keyword, lo, hi)
+    elif not (len(terms) == 1 and TOKEN.fullmatch(keyword)):
+        matches = [i for i in matches if pattern.search(text_of(i))]
+    if not matches:
+        suggestion = suggest_keyword(load_index(lang), keyword)
+        if suggestion:
+            notes.append(f"Did you mean '{suggestion}'?")
+    return lang, matches, pattern, notes
 
-    if current_chap < 1 or current_chap > 114 or end_chap < 1 or end_chap > 115:
+def load_index(lang="english"):
+    if lang not in _search_indexes:
+        from search_index import load_search_index
+        _search_indexes[lang] = load_search_index(load_quran_data(), lang)
+    return _search_indexes[lang]
+
+def resolve_search_range(corpus, range_spec):
+    if not range_spec:
+        return 0, len(corpus)
+    start_chap, start_verse, end_chap, end_verse = parse_chapter_range(range_spec)
+    if start_chap < 1 or end_chap > 114:
         print("Error: Chapter number must be between 1 and 114.")
+        return None
+    try:
+        verse_range = corpus.resolve_range(start_chap, start_verse, end_chap, end_verse)
+    except ValueError as e:
+        print(f"Error: {e}.")
+        return None
+    if verse_range is None:
+        print(f"Error: Invalid range '{range_spec}'.")
+    return verse_range
+
+def search_lines(corpus, keyword, lang, matches, pattern, notes, no_chapter_headings, no_highlight, normalized=True):
+    from render import highlight, highlight_arabic
+
+    if not matches:
+        yield f"There are no instances of '{keyword}' in the selected range."
+        yield from notes
         return
 
-    while current_chap < end_chap or (current_chap == end_chap and (end_verse is None or start_verse <= end_verse)):
-        if start_verse and end_verse and current_chap == start_chap:
-            for verse_num in range(start_verse, end_verse + 1):
-                read(current_chap, f"{verse_num}-{verse_num}", lang=lang, highlight_word=highlight_word, show_heading=first_pass and not no_chapter_headings)
-        elif end_verse and current_chap == end_chap:
-            for verse_num in range(1, end_verse + 1):
-                read(current_chap, f"{verse_num}-{verse_num}", lang=lang, highlight_word=highlight_word, show_heading=first_pass and not no_chapter_headings)
+    yield "In the Name of Allah, The Merciful, the Gracious"
+    yield f"There were '{len(matches)}' occurrences of '{keyword}' in your selected range"
+    yield from notes
+    name_attribute = 'name' if lang == 'arabic' else 'ename'
+    current_chapter = None
+    for index in matches:
+        chapter_num, verse_num = corpus.locate(index)
+        if chapter_num != current_chapter:
+            current_chapter = chapter_num
+            if not no_chapter_headings:
+                yield f"Chapter {chapter_num} - {corpus.sura(chapter_num).get(name_attribute)}:"
+        if lang == 'arabic' and normalized:
+            verse_text = highlight_arabic(load_normalized(), index, corpus.text(lang, index), keyword, no_highlight or pattern is None, pattern)
         else:
-            read(current_chap, lang=lang, highlight_word=highlight_word, show_heading=first_pass and not no_chapter_headings)
-        
-        first_pass = False
-        current_chap += 1
+            verse_text = highlight(corpus.text(lang, index), keyword, no_highlight or pattern is None, pattern)
+        yield f"{chapter_num}:{verse_num}    {verse_text}"
 
-def search(keyword, range_spec=None, output_file=None, no_chapter_headings=False, no_highlight=False):
-    arabic_root, english_root = load_quran_data()
-    found = False
-    results = []
-    count = 0
+def search(keyword, range_spec=None, output_file=None, no_chapter_headings=False, no_highlight=False, fmt="text", translation="english"):
+    from query import QueryError
+
+    corpus = load_quran_data()
+    verse_range = resolve_search_range(corpus, range_spec)
+    if verse_range is None:
+        return
 
-    keyword_regex = re.compile(r'\b' + re.escape(keyword) + r'\b', re.IGNORECASE)
+    try:
+        lang, matches, pattern, notes = find_keyword(corpus, keyword, *verse_range, translation)
+    except QueryError as e:
+        print(f"Error: Invalid query '{keyword}': {e}.")
+        return
 
-    if range_spec:
-        start_chap, start_verse, end_chap, end_verse = parse_chapter_range(range_spec)
-        ranges = [(start_chap, start_verse, end_chap, end_verse)]
+    if fmt == "text":
+        lines = search_lines(corpus, keyword, lang, matches, pattern, notes, no_chapter_headings, no_highlight)
     else:
-        ranges = [(1, None, 115, None)]
-
-    for start_chap, start_verse, end_chap, end_verse in ranges:
-        if int(start_chap) < 1 or int(end_chap) > 115:
-            print("Error: Chapter number must be between 1 and 114.")
-            return
-
-        for chap_num in range(int(start_chap), int(end_chap) + 1):
-            sura = english_root.find(f"./sura[@index='{chap_num}']")
-            if sura is None:
-                continue
-            chapter_num = sura.get('index')
-            chapter_name = sura.get('ename')
-            chapter_results = []
-
-            for aya in sura.findall('./aya'):
-                verse_num = int(aya.get('index'))
-                if start_verse and chap_num == int(start_chap) and verse_num < int(start_verse):
-                    continue
-                if end_verse and chap_num == int(end_chap) and verse_num > int(end_verse):
-                    continue
-
-                verse_text = aya.get('text')
-                if keyword_regex.search(verse_text):
-                    verse_text = highlight(verse_text, keyword, no_highlight)
-                    count += 1
-                    if not found:
-                        results.append(f"Chapter {chapter_num} - {chapter_name}:")
-                        found = True
-                    chapter_results.append(f"{chapter_num}:{aya.get('index')}    {verse_text}")
-
-            if chapter_results:
-                if not no_chapter_headings:
-                    results.append(f"Chapter {chapter_num} - {chapter_name}:")
-                results.extend(chapter_results)
-
-    if not found:
-        results.append(f"There are no instances of '{keyword}' in the selected range.")
+        entries = ((index, *corpus.locate(index)) for index in matches)
+        lines = format_records(verse_records(corpus, entries, (lang,)), fmt)
+    emit(lines, output_file)
+
+def search_ranked(keyword, range_spec=None, output_file=None, no_chapter_headings=False, no_highlight=False, fmt="text", translation="english", top=None):
+    from arabic import is_arabic, normalize
+    from query import is_query
+    from rank import DEFAULT_TOP, rank_verses
+    from render import highlight, highlight_arabic, words_matcher
+    from search_index import tokenize
+
+    if is_query(keyword):
+        print("Error: --rank takes plain words, not query syntax.")
+        return
+    corpus = load_quran_data()
+    verse_range = resolve_search_range(corpus, range_spec)
+    if verse_range is None:
+        return
+
+    lang = translation
+    words = keyword
+    if is_arabic(keyword):
+        lang = 'arabic'
+        words = normalize(keyword)[0]
+    results = rank_verses(load_index(lang), words, *verse_range, top or DEFAULT_TOP)
+
+    if fmt != "text":
+        records = []
+        for rank, (score, index) in enumerate(results, start=1):
+            sura, aya = corpus.locate(index)
+            records.append({'rank': rank, 'sura': sura, 'aya': aya, 'verse_id': index + 1,
+                            'score': round(score, 4), 'language': lang, 'text': corpus.text(lang, index)})
+        emit(format_records(records, fmt), output_file)
+        return
+    if not results:
+        emit([f"There are no instances of '{keyword}' in the selected range."], output_file)
+        return
+
+    pattern = words_matcher(set(tokenize(words)))
+    lines = [f"The {len(results)} most relevant verses for '{keyword}' (BM25):"]
+    for score, index in results:
+        chapter_num, verse_num = corpus.locate(index)
+        if lang == 'arabic':
+            text = highlight_arabic(load_normalized(), index, corpus.text(lang, index), words, no_highlight, pattern)
+        else:
+            text = highlight(corpus.text(lang, index), words, no_highlight, pattern)
+        reference = f"{chapter_num}:{verse_num}"
+        if not no_chapter_headings:
+            reference = f"{reference} {corpus.sura(chapter_num).get('name' if lang == 'arabic' else 'ename')}"
+        lines.append(f"{reference} ({score:.2f})    {text}")
+    emit(lines, output_file)
+
+def search_regex(source, range_spec=None, output_file=None, no_chapter_headings=False, no_highlight=False, fmt="text", lang="english", max_results=None, jobs=None):
+    import re
+    from regex_search import compile_pattern, find_regex
+
+    corpus = load_quran_data()
+    verse_range = resolve_search_range(corpus, range_spec)
+    if verse_range is None:
+        return
+
+    try:
+        matches = find_regex(corpus, lang, source, *verse_range, max_results, jobs)
+    except re.error as e:
+        print(f"Error: Invalid regular expression '{source}': {e}.")
+        return
+
+    if fmt == "text":
+        notes = []
+        if max_results and len(matches) == max_results:
+            notes.append(f"Showing the first {max_results} matches (--max-results).")
+        # The pattern is matched against the text as written, so Arabic
+        # is highlighted directly rather than through its normalized form.
+        lines = search_lines(corpus, source, lang, matches, compile_pattern(source), notes,
+                             no_chapter_headings, no_highlight, normalized=False)
     else:
-        results.insert(0, f"There were '{count}' occurrences of '{keyword}' in your selected range")
-        results.insert(0, "In the Name of Allah, The Merciful, the Gracious")
+        entries = ((index, *corpus.locate(index)) for index in matches)
+        lines = format_records(verse_records(corpus, entries, (lang,)), fmt)
+    emit(lines, output_file)
 
-    output = "\n".join(results)
-    if output_file:
-        with open(output_file, 'w') as f:
-            f.write(output)
-        print(f"Results written to {output_file}")
+def sura_record(chapter_num, chapter):
+    return {
+        'sura': chapter_num,
+        'name': chapter.get('name'),
+        'tname': chapter.get('tname'),
+        'ename': chapter.get('ename'),
+        'ayas': int(chapter.get('ayas')),
+        'rukus': int(chapter.get('rukus')),
+        'start': int(chapter.get('start')),
+        'type': chapter.get('type'),
+        'order': int(chapter.get('order')),
+    }
+
+def chapters(lang="both", fmt="text", output_file=None):
+    corpus = load_quran_data()
+    if fmt == "text":
+        lines = (f"{chap_num}. {chapter_name(corpus.sura(chap_num), lang)}" for chap_num in range(1, 115))
     else:
-        for result in results:
-            print(result)
+        fields = ('sura', 'name', 'tname', 'ename')
+        records = (sura_record(chap_num, corpus.sura(chap_num)) for chap_num in range(1, 115))
+        lines = format_records(({field: record[field] for field in fields} for record in records), fmt)
+    emit(lines, output_file)
 
-def search_info(info_type, range_spec, lang="both"):
-    arabic_root, english_root = load_quran_data()
+def search_info(info_type, range_spec, lang="both", fmt="text", output_file=None):
+    corpus = load_quran_data()
     start_chap, start_verse, end_chap, end_verse = parse_chapter_range(range_spec)
 
     if start_chap < 1 or end_chap > 115:
@@ -261,105 +558,544 @@ def search_info(info_type, range_spec, lang="both"):
         print("Error: Invalid info type. Valid types are: verses, rukus, starts, type, order")
         return
 
-    results = []
-    for chap_num in range(start_chap, end_chap + 1):
-        chapter_ar = arabic_root.find(f"./sura[@index='{chap_num}']")
-        chapter_en = english_root.find(f"./sura[@index='{chap_num}']")
-        if chapter_ar is None or chapter_en is None:
-            continue
+    # The XML calls these 'ayas' and 'start'.
+    attribute = {"verses": "ayas", "starts": "start"}.get(info_type, info_type)
+    chapter_nums = [chap_num for chap_num in range(start_chap, end_chap + 1) if corpus.sura(chap_num) is not None]
 
-        if lang == "arabic":
-            chapter_name = chapter_ar.get('name')
-        elif lang == "english":
-            chapter_name = chapter_en.get('ename')
-        else:
-            chapter_name = f"{chapter_en.get('ename')} ({chapter_en.get('tname')})"
+    if fmt != "text":
+        records = ({'sura': chap_num, 'name': chapter_name(corpus.sura(chap_num), lang), info_type: corpus.sura(chap_num).get(attribute)}
+                   for chap_num in chapter_nums)
+        emit(format_records(records, fmt), output_file)
+        return
 
+    results = []
+    for chap_num in chapter_nums:
+        chapter = corpus.sura(chap_num)
         if info_type == "starts":
-            chapter_info = chapter_en.get("start")
-            results.append(f"{chap_num}. {chapter_name} - Starts at Verse: {chapter_info}")
+            results.append(f"{chap_num}. {chapter_name(chapter, lang)} - Starts at Verse: {chapter.get(attribute)}")
         else:
-            chapter_info = chapter_en.get(info_type)
-            results.append(f"{chap_num}. {chapter_name} - {info_type.capitalize()}: {chapter_info}")
+            results.append(f"{chap_num}. {chapter_name(chapter, lang)} - {info_type.capitalize()}: {chapter.get(attribute)}")
+    emit(results, output_file)
 
-    for result in results:
-        print(result)
+def keyword_counts(corpus, keywords, lo, hi, translation="english"):
+    # For each keyword, its occurrences, the verses it is in and its
+    # occurrences per sura over verses [lo, hi); plus any search notes.
+    # One keyword goes through the search index and may use the query
+    # syntax. Several keywords are literal phrases, found in one pass over
+    # the text by an Aho-Corasick automaton per language; the index only
+    # narrows the pass down to verses that have every word of some keyword.
+    from arabic import is_arabic, normalize
+    from search_index import intersect, searchable_text, tokenize
 
-def count(keyword, range_spec=None, output_file=None):
-    _, english_root = load_quran_data()
-    total_count = 0
-    results = []
+    counts = [{'keyword': keyword, 'occurrences': 0, 'verses': 0, 'suras': {}} for keyword in keywords]
+    notes = []
+    if len(keywords) == 1:
+        lang, matches, pattern, notes = find_keyword(corpus, keywords[0], lo, hi, translation)
+        text_of = searchable_text(corpus, lang)
+        scans = [(lang, [(0, None)], matches, lambda index: [0] * (len(pattern.findall(text_of(index))) if pattern else 1))]
+    else:
+        from automaton import Automaton
 
-    keyword_regex = re.compile(r'\b' + re.escape(keyword) + r'\b', re.IGNORECASE)
+        groups = {}
+        for position, keyword in enumerate(keywords):
+            if is_arabic(keyword):
+                groups.setdefault('arabic', []).append((position, normalize(keyword)[0]))
+            else:
+                groups.setdefault(translation, []).append((position, keyword))
+        scans = []
+        for lang, group in groups.items():
+            index = load_index(lang)
+            candidates = set()
+            for _, word in group:
+                terms = set(tokenize(word))
+                candidates.update(intersect([index.docs_between(term, lo, hi) for term in terms]) if terms else range(lo, hi))
+            automaton = Automaton(word for _, word in group)
+            text_of = searchable_text(corpus, lang)
+            scans.append((lang, group, sorted(candidates),
+                          lambda index, automaton=automaton, text_of=text_of: list(automaton.occurrences(text_of(index)))))
 
-    if range_spec:
-        start_chap, start_verse, end_chap, end_verse = parse_chapter_range(range_spec)
-        ranges = [(start_chap, start_verse, end_chap, end_verse)]
-    else:
-        ranges = [(1, None, 115, None)]
+    for lang, group, verses, found in scans:
+        # The automaton numbers the distinct words of the group in order.
+        positions = {}
+        for position, word in group:
+            positions.setdefault(word, []).append(position)
+        word_positions = list(positions.values())
+        for index in verses:
+            sura = corpus.locate(index)[0]
+            seen = set()
+            for word_id in found(index):
+                for position in word_positions[word_id]:
+                    record = counts[position]
+                    record['occurrences'] += 1
+                    record['suras'][sura] = record['suras'].get(sura, 0) + 1
+                    if position not in seen:
+                        seen.add(position)
+                        record['verses'] += 1
+    return counts, notes
 
-    for start_chap, start_verse, end_chap, end_verse in ranges:
-        if int(start_chap) < 1 or int(end_chap) > 115:
-            print("Error: Chapter number must be between 1 and 114.")
-            return
+def read_keyword_file(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = [line.strip() for line in f]
+    except OSError as e:
+        print(f"Error: Cannot read '{path}': {e.strerror}.")
+        sys.exit(1)
+    return [line for line in lines if line and not line.startswith('#')]
 
-        for chap_num in range(int(start_chap), int(end_chap) + 1):
-            sura = english_root.find(f"./sura[@index='{chap_num}']")
-            if sura is None:
-                continue
+def count(keywords, range_spec=None, output_file=None, fmt="text", translation="english", by_sura=False):
+    from query import QueryError
 
-            for aya in sura.findall('./aya'):
-                verse_num = int(aya.get('index'))
-                if start_verse and chap_num == int(start_chap) and verse_num < int(start_verse):
-                    continue
-                if end_verse and chap_num == int(end_chap) and verse_num > int(end_verse):
-                    continue
+    corpus = load_quran_data()
+    verse_range = resolve_search_range(corpus, range_spec)
+    if verse_range is None:
+        return
 
-                verse_text = aya.get('text')
-                if keyword_regex.search(verse_text):
-                    total_count += 1
+    try:
+        counts, notes = keyword_counts(corpus, keywords, *verse_range, translation)
+    except QueryError as e:
+        print(f"Error: Invalid query '{keywords[0]}': {e}.")
+        return
 
-    results.append(f"There were '{total_count}' occurrences of '{keyword}' in the selected range")
-    output = "\n".join(results)
+    if fmt != "text":
+        if by_sura:
+            records = ({'keyword': record['keyword'], 'sura': sura, 'occurrences': occurrences}
+                       for record in counts for sura, occurrences in sorted(record['suras'].items()))
+        else:
+            records = ({'keyword': record['keyword'], 'occurrences': record['occurrences'], 'verses': record['verses']}
+                       for record in counts)
+        emit(format_records(records, fmt), output_file)
+        return
 
-    if output_file:
-        with open(output_file, 'w') as f:
-            f.write(output)
-        print(f"Results written to {output_file}")
+    if len(counts) == 1:
+        record = counts[0]
+        lines = [f"There were '{record['occurrences']}' occurrences of '{record['keyword']}' "
+                 f"in '{record['verses']}' verses in the selected range"] + notes
     else:
-        print(output)
+        width = max(len('Keyword'), *(len(record['keyword']) for record in counts)) + 2
+        lines = [f"{'Keyword':{width}}{'Occurrences':>12}{'Verses':>8}"]
+        lines += [f"{record['keyword']:{width}}{record['occurrences']:12}{record['verses']:8}" for record in counts]
+    if by_sura:
+        for record in counts:
+            lines.append("")
+            lines.append(f"'{record['keyword']}' by sura:")
+            most = max(record['suras'].values(), default=0)
+            for sura, occurrences in sorted(record['suras'].items()):
+                bar = '#' * max(1, round(30 * occurrences / most))
+                lines.append(f"{sura:4}. {corpus.sura(sura).get('ename'):30}{occurrences:6}  {bar}")
+    emit(lines, output_file)
+
+def info_lines(corpus, chapter_nums):
+    for chap_num in chapter_nums:
+        chapter = corpus.sura(chap_num)
+        yield f"Chapter {chap_num} Info:"
+        yield f"Name (Arabic): {chapter.get('name')}"
+        yield f"Transliterated Name: {chapter.get('tname')}"
+        yield f"English Name: {chapter.get('ename')}"
+        yield f"Verses: {chapter.get('ayas')}"
+        yield f"Rukus: {chapter.get('rukus')}"
+        yield f"Starts at Verse: {chapter.get('start')}"
+        yield f"Type: {chapter.get('type')}"
+        yield f"Order: {chapter.get('order')}"
+        yield ""
 
-def info(chapter_range):
-    arabic_root, english_root = load_quran_data()
+def info(chapter_range, fmt="text", output_file=None):
+    corpus = load_quran_data()
     start_chap, start_verse, end_chap, end_verse = parse_chapter_range(chapter_range)
 
     if start_chap < 1 or end_chap > 115:
         print("Error: Chapter number must be between 1 and 114.")
         return
 
-    for chap_num in range(start_chap, end_chap + 1):
-        chapter_ar = arabic_root.find(f"./sura[@index='{chap_num}']")
-        chapter_en = english_root.find(f"./sura[@index='{chap_num}']")
-        if chapter_ar is None or chapter_en is None:
-            continue
+    chapter_nums = [chap_num for chap_num in range(start_chap, end_chap + 1) if corpus.sura(chap_num) is not None]
+    if fmt == "text":
+        emit(info_lines(corpus, chapter_nums), output_file)
+    else:
+        emit(format_records((sura_record(chap_num, corpus.sura(chap_num)) for chap_num in chapter_nums), fmt), output_file)
+
+def load_stats(lang="english"):
+    from stats import load_term_stats
+
+    if lang not in _term_stats:
+        _term_stats[lang] = load_term_stats(load_quran_data(), lang)
+    return _term_stats[lang]
+
+def per_thousand(count, total):
+    return round(1000 * count / total, 2) if total else 0.0
+
+def stats_top_terms(term_stats, range_spec, limit, include_stopwords, fmt):
+    corpus = load_quran_data()
+    verse_range = resolve_search_range(corpus, range_spec)
+    if verse_range is None:
+        return None
+    total = term_stats.token_count(*verse_range)
+    rows = term_stats.top_terms(*verse_range, limit, include_stopwords)
+    if fmt != "text":
+        return format_records(({'rank': rank, 'term': term, 'count': count, 'verses': verses,
+                                'per_1000': per_thousand(count, total)}
+                               for rank, (term, count, verses) in enumerate(rows, start=1)), fmt)
+    lines = [f"Top {len(rows)} words in {range_spec or 'the whole Quran'} ({total} words)"]
+    for rank, (term, count, verses) in enumerate(rows, start=1):
+        lines.append(f"{rank:4}. {term:20}{count:7}  in {verses} verses  ({per_thousand(count, total)} per 1000 words)")
+    return lines
+
+def stats_distribution(term_stats, term, lang, fmt):
+    corpus = load_quran_data()
+    rows = term_stats.distribution(term)
+    records = [{'sura': sura, 'name': chapter_name(corpus.sura(sura), lang), 'count': count, 'verses': verses,
+                'per_1000': per_thousand(count, term_stats.sura_token_count(sura))}
+               for sura, count, verses in rows]
+    if fmt != "text":
+        return format_records(records, fmt)
+    if not records:
+        return [f"There are no instances of '{term}'."]
+    total = sum(record['count'] for record in records)
+    verses = sum(record['verses'] for record in records)
+    lines = [f"'{term}' occurs {total} times in {verses} verses across {len(records)} suras"]
+    for record in records:
+        lines.append(f"{record['sura']:4}. {record['name']:36}{record['count']:6}  ({record['per_1000']} per 1000 words)")
+    return lines
+
+def stats_compare(term_stats, term, limit, include_stopwords, fmt):
+    corpus = load_quran_data()
+    meccan = [sura for sura in range(1, 115) if corpus.sura(sura).get('type') == 'Meccan']
+    medinan = [sura for sura in range(1, 115) if corpus.sura(sura).get('type') != 'Meccan']
+    meccan_total = sum(term_stats.sura_token_count(sura) for sura in meccan)
+    medinan_total = sum(term_stats.sura_token_count(sura) for sura in medinan)
+
+    if term:
+        counts = {'Meccan': 0, 'Medinan': 0}
+        for sura, count, _ in term_stats.distribution(term):
+            counts['Meccan' if sura in meccan else 'Medinan'] += count
+        records = [{'term': term, 'type': 'Meccan', 'count': counts['Meccan'], 'per_1000': per_thousand(counts['Meccan'], meccan_total)},
+                   {'term': term, 'type': 'Medinan', 'count': counts['Medinan'], 'per_1000': per_thousand(counts['Medinan'], medinan_total)}]
+        if fmt != "text":
+            return format_records(records, fmt)
+        return [f"'{term}' in {record['type']} suras: {record['count']} ({record['per_1000']} per 1000 words)" for record in records]
+
+    most_meccan, most_medinan = term_stats.compare(meccan, medinan, limit, include_stopwords)
+    if fmt != "text":
+        return format_records(({'term': term, 'leaning': side, 'meccan': left, 'medinan': right, 'log_ratio': round(ratio, 3)}
+                               for side, rows in (('Meccan', most_meccan), ('Medinan', most_medinan))
+                               for term, left, right, ratio in rows), fmt)
+    lines = [f"{len(meccan)} Meccan suras ({meccan_total} words), {len(medinan)} Medinan suras ({medinan_total} words)"]
+    for side, rows in (('Meccan', most_meccan), ('Medinan', most_medinan)):
+        lines.append(f"Most {side} words (Meccan count, Medinan count):")
+        for term, left, right, _ in rows:
+            lines.append(f"      {term:20}{left:7}{right:7}")
+    return lines
+
+def stats_collocations(term_stats, term, range_spec, window, limit, include_stopwords, fmt):
+    corpus = load_quran_data()
+    verse_range = resolve_search_range(corpus, range_spec)
+    if verse_range is None:
+        return None
+    rows = term_stats.collocations(term, *verse_range, window, limit, include_stopwords)
+    if fmt != "text":
+        return format_records(({'term': term, 'collocate': word, 'count': count, 'pmi': round(pmi, 3)}
+                               for word, count, pmi in rows), fmt)
+    if not rows:
+        return [f"No words occur often enough near '{term}' in the selected range."]
+    lines = [f"Words within {window} of '{term}' (count, PMI):"]
+    for word, count, pmi in rows:
+        lines.append(f"      {word:20}{count:7}{pmi:8.2f}")
+    return lines
+
+def pop_option(args, flag, has_value=True):
+    # Removes flag (and its value) from args; returns (value, args), with
+    # value True for a plain switch and None when the flag is absent.
+    if flag not in args:
+        return None, args
+    position = args.index(flag)
+    if not has_value:
+        return True, args[:position] + args[position + 1:]
+    if position + 1 >= len(args):
+        raise ValueError(flag)
+    return args[position + 1], args[:position] + args[position + 2:]
+
+def stats_command(args, lang="english", heading_lang="english", fmt="text", output_file=None):
+    usage = ("Usage: quran stats [<range>] [--top <n>] [--all] | stats --term <word> | "
+             "stats --compare [--term <word>] | stats --collocations <word> [<range>] [--window <n>]")
+    try:
+        term, args = pop_option(args, "--term")
+        collocate, args = pop_option(args, "--collocations")
+        compare, args = pop_option(args, "--compare", has_value=False)
+        include_stopwords, args = pop_option(args, "--all", has_value=False)
+        limit, args = pop_option(args, "--top")
+        window, args = pop_option(args, "--window")
+        limit = int(limit or 20)
+        window = int(window or 3)
+    except ValueError:
+        print(usage)
+        sys.exit(1)
+    range_spec = args[0] if args else None
+
+    word = term or collocate
+    if word:
+        from arabic import is_arabic, normalize
+        if is_arabic(word):
+            lang = "arabic"
+            word = normalize(word)[0]
+        word = word.lower()
+    term_stats = load_stats(lang)
+
+    if compare:
+        lines = stats_compare(term_stats, word, limit, include_stopwords, fmt)
+    elif collocate:
+        lines = stats_collocations(term_stats, word, range_spec, window, limit, include_stopwords, fmt)
+    elif term:
+        lines = stats_distribution(term_stats, word, heading_lang, fmt)
+    else:
+        lines = stats_top_terms(term_stats, range_spec, limit, include_stopwords, fmt)
+    if lines is not None:
+        emit(lines, output_file)
+
+def load_similarity(lang="english"):
+    if lang not in _similarity_indexes:
+        from similar import load_similarity_index
+        _similarity_indexes[lang] = load_similarity_index(load_quran_data(), lang)
+    return _similarity_indexes[lang]
+
+def similar(verse_ref, limit=10, lang="english", fmt="text", output_file=None):
+    corpus = load_quran_data()
+    chapter_part, _, verse_part = verse_ref.partition(':')
+    chapter_num = int(chapter_part) if chapter_part.isdigit() else chapter_name_to_number(chapter_part)
+    index = corpus.index(chapter_num, int(verse_part)) if verse_part.isdigit() else None
+    if index is None:
+        print(f"Error: Invalid verse '{verse_ref}'.")
+        return
+
+    results = load_similarity(lang).similar(index, limit)
+    if fmt != "text":
+        records = []
+        for rank, (score, match) in enumerate(results, start=1):
+            sura, aya = corpus.locate(match)
+            records.append({'rank': rank, 'sura': sura, 'aya': aya, 'verse_id': match + 1,
+                            'score': round(score, 4), 'language': lang, 'text': corpus.text(lang, match)})
+        lines = format_records(records, fmt)
+    elif not results:
+        lines = [f"No verses similar to {chapter_num}:{verse_part} were found."]
+    else:
+        lines = [f"{chapter_num}:{verse_part}    {corpus.text(lang, index)}",
+                 f"Verses most similar to {chapter_num}:{verse_part} (cosine similarity):"]
+        for score, match in results:
+            lines.append("{}:{} ({:.2f})    {}".format(*corpus.locate(match), score, corpus.text(lang, match)))
+    emit(lines, output_file)
+
+def api_range(corpus, spec, required=True):
+    # [lo, hi) for a range in the command-line grammar; ValueError if it
+    # is missing or invalid.
+    if not spec:
+        if required:
+            raise ValueError("Missing parameter 'ref'.")
+        return 0, len(corpus)
+    try:
+        verse_range = resolve_search_range(corpus, spec)
+    except ValueError:
+        verse_range = None
+    if verse_range is None:
+        raise ValueError(f"Invalid range '{spec}'.")
+    return verse_range
+
+def api_languages(params):
+    lang = params.get('lang', 'both')
+    return LANGUAGES[lang] if lang in LANGUAGES else resolve_translations(lang)
+
+def api_keyword(corpus, params):
+    from query import QueryError
+
+    keyword = params.get('q')
+    if not keyword:
+        raise ValueError("Missing parameter 'q'.")
+    verse_range = api_range(corpus, params.get('range'), required=False)
+    translation = next((name for name in api_languages(params) if name != "arabic"), "english")
+    try:
+        return keyword, find_keyword(corpus, keyword, *verse_range, translation)
+    except QueryError as e:
+        raise ValueError(f"Invalid query '{keyword}': {e}.")
+
+def api_read(params):
+    corpus = load_quran_data()
+    lo, hi = api_range(corpus, params.get('ref'))
+    languages = api_languages(params)
+    return {'ref': params['ref'], 'verses': list(verse_records(corpus, slice_entries(corpus, lo, hi), languages))}
+
+def api_search(params):
+    corpus = load_quran_data()
+    keyword, (lang, matches, _, notes) = api_keyword(corpus, params)
+    entries = ((index, *corpus.locate(index)) for index in matches)
+    return {'query': keyword, 'language': lang, 'count': len(matches), 'notes': notes,
+            'verses': list(verse_records(corpus, entries, (lang,)))}
+
+def api_count(params):
+    from query import QueryError
+
+    corpus = load_quran_data()
+    keywords = [keyword.strip() for keyword in params.get('q', '').split(",") if keyword.strip()]
+    if not keywords:
+        raise ValueError("Missing parameter 'q'.")
+    verse_range = api_range(corpus, params.get('range'), required=False)
+    translation = next((name for name in api_languages(params) if name != "arabic"), "english")
+    try:
+        counts, notes = keyword_counts(corpus, list(dict.fromkeys(keywords)), *verse_range, translation)
+    except QueryError as e:
+        raise ValueError(f"Invalid query '{keywords[0]}': {e}.")
+    return {'query': params['q'], 'keywords': counts, 'notes': notes}
+
+def api_info(params):
+    corpus = load_quran_data()
+    start_chap, _, end_chap, _ = parse_chapter_range(params.get('range') or "1-114")
+    if start_chap < 1 or end_chap > 114 or start_chap > end_chap:
+        raise ValueError("Chapter number must be between 1 and 114.")
+    return {'suras': [sura_record(chap_num, corpus.sura(chap_num)) for chap_num in range(start_chap, end_chap + 1)]}
+
+# GET endpoints of serve --http; each takes the query parameters.
+API_ENDPOINTS = {
+    '/read': api_read,
+    '/range': api_read,
+    '/search': api_search,
+    '/count': api_count,
+    '/info': api_info,
+}
+
+def preload():
+    corpus = load_quran_data()
+    load_index('english')
+    load_index('arabic')
+    load_normalized()
+    return corpus
+
+def data_is_stale():
+    return _corpus is not None and source_stamp(data_sources()) != _corpus_stamp
+
+def reload_data():
+    global _corpus, _seek_index, _normalized, _chapter_names
+    _corpus = None
+    _seek_index = None
+    _normalized = None
+    _chapter_names = None
+    _search_indexes.clear()
+    _term_stats.clear()
+    _similarity_indexes.clear()
+    from render import clear_layout_cache
+    clear_layout_cache()
+    preload()
+
+def serve_command(args):
+    usage = "Usage: quran serve [--socket <path>] | serve --http [--host <host>] [--port <port>]"
+    try:
+        http, args = pop_option(args, "--http", has_value=False)
+        host, args = pop_option(args, "--host")
+        port, args = pop_option(args, "--port")
+        socket_path, args = pop_option(args, "--socket")
+        port = int(port) if port else None
+    except ValueError:
+        print(usage)
+        sys.exit(1)
+    if http:
+        import http_api
+        http_api.serve(API_ENDPOINTS, preload, host or http_api.DEFAULT_HOST, port or http_api.DEFAULT_PORT,
+                       is_stale=data_is_stale, reload=reload_data)
+        return
+    import daemon
+    daemon.serve(run, preload, socket_path=socket_path, is_stale=data_is_stale, reload=reload_data)
+
+def build_db_command():
+    import time
+    from database import build_database, database_path
+
+    path = database_path()
+    if not path:
+        print("Error: No writable cache directory for the database; set QURAN_CACHE_DIR.")
+        sys.exit(1)
+    start = time.perf_counter()
+    build_database(path)
+    print(f"Database written to {path} in {time.perf_counter() - start:.1f} s. Set QURAN_STORAGE=sqlite to use it.")
+
+def shell_command(translation="english"):
+    import shell
+    shell.run_shell(run, preload, load_quran_data, translation, is_stale=data_is_stale, reload=reload_data)
+
+def batch_command(args):
+    import batch
+    from render import terminal_width
+
+    jobs = 1
+    if "--jobs" in args:
+        jobs_index = args.index("--jobs")
+        try:
+            jobs = int(args[jobs_index + 1])
+        except (IndexError, ValueError):
+            print("Usage: quran batch [<file>] [--jobs <n>]")
+            sys.exit(1)
+        args = args[:jobs_index] + args[jobs_index + 2:]
+
+    if args and args[0] != "-":
+        try:
+            source = open(args[0], encoding='utf-8')
+        except OSError as e:
+            print(f"Error: Cannot read '{args[0]}': {e.strerror}.")
+            sys.exit(1)
+    else:
+        source = sys.stdin
 
-        print(f"Chapter {chap_num} Info:")
-        print(f"Name (Arabic): {chapter_ar.get('name')}")
-        print(f"Transliterated Name: {chapter_ar.get('tname')}")
-        print(f"English Name: {chapter_en.get('ename')}")
-        print(f"Verses: {chapter_ar.get('ayas')}")
-        print(f"Rukus: {chapter_ar.get('rukus')}")
-        print(f"Starts at Verse: {chapter_en.get('start')}")
-        print(f"Type: {chapter_ar.get('type')}")
-        print(f"Order: {chapter_ar.get('order')}")
-        print()
+    with source:
+        status = batch.run_batch(run, load_quran_data, source, jobs=max(jobs, 1),
+                                 columns=terminal_width(), color=client.client_wants_color())
+    sys.exit(status)
 
 def main():
-    if len(sys.argv) < 2:
+    try:
+        status = client.forward(sys.argv[1:])
+        if status is not None:
+            sys.exit(status)
+        run(sys.argv[1:])
+    except BrokenPipeError:
+        # The reader (head, less, ...) went away; stop quietly.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+
+def resolve_translations(spec):
+    available = discover_translations()
+    translations = []
+    for name in filter(None, spec.split(",")):
+        matches = resolve_translation(name, available)
+        if not matches:
+            print(f"Error: Unknown translation '{name}'. Available: {', '.join(available)}.")
+            sys.exit(1)
+        if len(matches) > 1:
+            print(f"Error: '{name}' could be any of {', '.join(matches)}.")
+            sys.exit(1)
+        if matches[0] not in translations:
+            translations.append(matches[0])
+    if not translations:
+        print("Usage: quran <command> [<args>] -t <translation>[,<translation>...]")
+        sys.exit(1)
+    return tuple(translations)
+
+def list_translations(fmt="text", output_file=None):
+    available = discover_translations()
+    if fmt == "text":
+        lines = (f"{name:20}{os.path.basename(path)}" for name, path in available.items())
+    else:
+        lines = format_records(({'name': name, 'file': os.path.basename(path)} for name, path in available.items()), fmt)
+    emit(lines, output_file)
+
+def run(command_args):
+    # Problems with the data files surface as DataError from wherever they
+    # are found and end the command here.
+    try:
+        dispatch(command_args)
+    except DataError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+def dispatch(command_args):
+    if not command_args:
         print("Usage: quran <command> [<args>] [-a | -e] [-nc] [-nh]")
         sys.exit(1)
 
-    command_args = sys.argv[1:]
+    command_args = list(command_args)
     no_chapter_headings = False
     no_highlight = False
 
@@ -375,7 +1111,7 @@ def main():
     command = command_args[0]
 
     lang = "both"
-    highlight_word = None
+    highlight_words = []
 
     if "-a" in command_args:
         lang = "arabic"
@@ -383,20 +1119,59 @@ def main():
     elif "-e" in command_args:
         lang = "english"
         command_args.remove("-e")
-    if "-h" in command_args:
+    while "-h" in command_args:
         highlight_index = command_args.index("-h")
         if highlight_index + 1 < len(command_args):
-            highlight_word = command_args[highlight_index + 1]
+            highlight_words.append(command_args[highlight_index + 1])
             command_args = command_args[:highlight_index] + command_args[highlight_index + 2:]
         else:
-            print("Usage: quran <command> [<args>] [-a | -e] [-h <word>]")
+            print("Usage: quran <command> [<args>] [-a | -e] [-h <word>]...")
+            sys.exit(1)
+
+    fmt = "text"
+    if "--format" in command_args:
+        format_index = command_args.index("--format")
+        if format_index + 1 >= len(command_args) or command_args[format_index + 1] not in FORMATS:
+            print(f"Usage: quran <command> [<args>] --format {'|'.join(FORMATS)}")
+            sys.exit(1)
+        fmt = command_args[format_index + 1]
+        command_args = command_args[:format_index] + command_args[format_index + 2:]
+
+    translations = None
+    search_translation = "english"
+    if "-t" in command_args:
+        translation_index = command_args.index("-t")
+        if translation_index + 1 >= len(command_args):
+            print("Usage: quran <command> [<args>] -t <translation>[,<translation>...]")
             sys.exit(1)
+        translations = resolve_translations(command_args[translation_index + 1])
+        command_args = command_args[:translation_index] + command_args[translation_index + 2:]
+        if lang == "arabic" and "arabic" not in translations:
+            translations = ("arabic",) + translations
+        lang = heading_language(translations)
+        search_translation = next((name for name in translations if name != "arabic"), "english")
+
+    output_file = next((arg for arg in command_args[1:] if arg.startswith(">") and len(arg) > 1), None)
+    if output_file:
+        command_args.remove(output_file)
+
+    # Files and machine-readable formats never carry terminal colours.
+    if output_file or fmt != "text":
+        no_highlight = True
 
     specific_commands = {
         "chapters", "info", "rukus", "starts", "verses", "type", "order"
     }
 
-    if command == "commands":
+    if command == "serve":
+        serve_command(command_args[1:])
+    elif command == "batch":
+        batch_command(command_args[1:])
+    elif command == "shell":
+        shell_command(search_translation)
+    elif command == "build-db":
+        build_db_command()
+    elif command == "commands":
         print("Commands:")
         print("  chapters          List chapters in English")
         print("  chapters -a       List chapters in Arabic")
@@ -414,54 +1189,134 @@ def main():
         print("  <chapter>:<verse> -h <word> Highlight word in verse")
         print("  <chapter>:<start>-<end> -h <word> Highlight word in range of verses")
         print("  <chapter> <chapter>:<verse> -h <word> Highlight word in multiple chapters")
+        print("  <chapter> -h <word> -h <word> Highlight several words at once")
         print("  /<keyword>        Search keyword in entire Quran")
         print("  /<keyword> <range> Search keyword in specific range")
+        print("  /<arabic keyword> Search the Arabic text, ignoring harakat and hamza/alef variants")
+        print("  /<word>~[n]       Fuzzy search: words within n edits (default 1-2) of <word>")
+        print("  search '<query>'  Search with AND, OR, NOT, \"phrases\", NEAR/n and prefix* (e.g. 'merc* NEAR/3 lord NOT punish*')")
+        print("  search --regex '<pattern>' [<range>] [--max-results <n>] [--jobs <n>] Search with a regular expression, on all cores; -a searches the Arabic text as written")
+        print("  search --rank '<words>' [<range>] [--top <k>] The k (default 10) verses most relevant to the words, ranked by BM25")
         print("  /<keyword> <range> -nc       Search keyword in specific range without chapter headings")
         print("  /<keyword> <range> -nh       Search keyword in specific range without highlighting")
         print("  count <keyword>   Count occurrences of keyword in entire Quran")
         print("  count <keyword> <range> Count occurrences of keyword in specific range")
+        print("  count <kw>,<kw>,... [<range>] [--by-sura] Count several keywords in one pass, with per-sura counts")
+        print("  count --file <file> [<range>] [--by-sura] Count the keywords in <file>, one per line")
         print("  <info_type> <range> [-a | -e] Search specific info in range (info_type can be: verses, rukus, starts, type, order)")
+        print("  serve --http [--host <host>] [--port <port>] Serve read, range, search, count and info as a JSON API (default 127.0.0.1:8765)")
+        print("  serve [--socket <path>] Keep the Quran loaded in a background daemon; other commands use it automatically")
+        print("  batch [<file>] [--jobs <n>] Run one command per line from <file> or stdin (e.g. 2:255, /mercy 2)")
+        print("  build-db          Import the data files into a SQLite database; QURAN_STORAGE=sqlite reads from it")
+        print("  shell             Interactive shell: keeps the Quran loaded, with history, paging and search as you type")
+        print("  juz <n>[-<m>]     Read a juz (or several)")
+        print("  hizb <n>[-<m>]    Read a hizb")
+        print("  translations      List the translations found in the data directory")
+        print("  stats [<range>] [--top <n>] [--all]  Most frequent words (common words are skipped unless --all)")
+        print("  stats --term <word>                  How often a word occurs in each sura")
+        print("  stats --compare [--term <word>]      Words most typical of Meccan vs Medinan suras")
+        print("  stats --collocations <word> [<range>] [--window <n>]  Words that occur near <word>")
+        print("  similar <chapter>:<verse> [-k <n>] The <n> verses (default 10) most similar to a verse; -a compares the Arabic")
+        print("  <chapter>:<verse> -t <name>[,<name>...] Read in the given translations, side by side (e.g. -t sahih,pickthall)")
+        print("  search <keyword> -t <name> Search a translation other than the default English one")
+        print("  <command> --format jsonl|csv|tsv  Print verses, search hits, counts and info as records instead of text")
+        print("  <command> >file   Write the output of any command to file")
+    elif command == "stats":
+        stats_lang = "arabic" if lang == "arabic" and not translations else search_translation
+        stats_command(command_args[1:], stats_lang, lang, fmt=fmt, output_file=output_file)
+    elif command == "similar":
+        limit = 10
+        if "-k" in command_args:
+            limit_index = command_args.index("-k")
+            try:
+                limit = int(command_args[limit_index + 1])
+            except (IndexError, ValueError):
+                limit = 0
+            command_args = command_args[:limit_index] + command_args[limit_index + 2:]
+        if len(command_args) < 2 or limit < 1:
+            print("Usage: quran similar <chapter>:<verse> [-k <n>] [-a | -t <translation>]")
+            sys.exit(1)
+        similar_lang = "arabic" if lang == "arabic" and not translations else search_translation
+        similar(command_args[1], limit, similar_lang, fmt=fmt, output_file=output_file)
+    elif command == "translations":
+        list_translations(fmt=fmt, output_file=output_file)
     elif command == "chapters":
-        output_file = command_args[1] if len(command_args) > 1 and command_args[1].startswith(">") else None
-        chapters(lang=lang, output_file=output_file)
+        chapters(lang=lang, fmt=fmt, output_file=output_file)
     elif command == "info":
         chapter_range = command_args[1] if len(command_args) > 1 else "1-114"
-        info(chapter_range)
+        info(chapter_range, fmt=fmt, output_file=output_file)
     elif command == "search":
+        try:
+            regex, command_args = pop_option(command_args, "--regex", has_value=False)
+            max_results, command_args = pop_option(command_args, "--max-results")
+            jobs, command_args = pop_option(command_args, "--jobs")
+            ranked, command_args = pop_option(command_args, "--rank", has_value=False)
+            top, command_args = pop_option(command_args, "--top")
+            max_results = int(max_results) if max_results else None
+            jobs = int(jobs) if jobs else None
+            top = int(top) if top else None
+            if top is not None and top < 1:
+                raise ValueError(top)
+        except ValueError:
+            command_args = []
         if len(command_args) < 2:
-            print("Usage: quran search <keyword> [range] [-nh]")
+            print("Usage: quran search <keyword> [range] [-nh] | search --regex <pattern> [range] [--max-results <n>] [--jobs <n>]"
+                  " | search --rank <words> [range] [--top <k>]")
             sys.exit(1)
         keyword = command_args[1]
         range_spec = command_args[2] if len(command_args) > 2 else None
-        output_file = command_args[3] if len(command_args) > 3 and command_args[3].startswith(">") else None
-        search(keyword, range_spec, output_file, no_chapter_headings, no_highlight)
+        if ranked or top:
+            search_ranked(keyword, range_spec, output_file, no_chapter_headings, no_highlight, fmt=fmt,
+                          translation=search_translation, top=top)
+        elif regex:
+            regex_lang = "arabic" if lang == "arabic" and not translations else search_translation
+            search_regex(keyword, range_spec, output_file, no_chapter_headings, no_highlight, fmt=fmt,
+                         lang=regex_lang, max_results=max_results, jobs=jobs)
+        else:
+            search(keyword, range_spec, output_file, no_chapter_headings, no_highlight, fmt=fmt, translation=search_translation)
     elif command == "count":
-        if len(command_args) < 2:
-            print("Usage: quran count <keyword> [range]")
+        try:
+            keyword_file, command_args = pop_option(command_args, "--file")
+            by_sura, command_args = pop_option(command_args, "--by-sura", has_value=False)
+        except ValueError:
+            command_args = []
+        if keyword_file:
+            keywords = read_keyword_file(keyword_file)
+            range_args = command_args[1:]
+        else:
+            keywords = [keyword.strip() for keyword in command_args[1].split(",")] if len(command_args) > 1 else []
+            range_args = command_args[2:]
+        keywords = list(dict.fromkeys(filter(None, keywords)))
+        if not keywords:
+            print("Usage: quran count <keyword>[,<keyword>...] [range] [--by-sura] | count --file <file> [range] [--by-sura]")
             sys.exit(1)
-        range_spec = command_args[2] if len(command_args) > 2 else None
-        output_file = command_args[3] if len(command_args) > 3 and command_args[3].startswith(">") else None
-        count(command_args[1], range_spec, output_file)
+        range_spec = range_args[0] if range_args else None
+        count(keywords, range_spec, output_file, fmt=fmt, translation=search_translation, by_sura=bool(by_sura))
     elif command in specific_commands:
         if len(command_args) < 2:
             print(f"Usage: quran {command} <range> [-a | -e]")
             sys.exit(1)
         range_spec = command_args[1]
-        search_info(command, range_spec, lang=lang)
+        search_info(command, range_spec, lang=lang, fmt=fmt, output_file=output_file)
+    elif command in NAVIGATION_UNITS:
+        if len(command_args) < 2:
+            print(f"Usage: quran {command} <number>[-<number>] [-a | -e]")
+            sys.exit(1)
+        read_unit(command, command_args[1], lang=lang, highlight_words=() if no_highlight else highlight_words, no_chapter_headings=no_chapter_headings, fmt=fmt, output_file=output_file, translations=translations)
     else:
         if ":" in command and "-" in command:
-            read_range(command, lang=lang, highlight_word=None if no_highlight else highlight_word, no_chapter_headings=no_chapter_headings)
+            read_range(command, lang=lang, highlight_words=() if no_highlight else highlight_words, no_chapter_headings=no_chapter_headings, fmt=fmt, output_file=output_file, translations=translations)
         elif ":" in command:
             parts = command.split(':')
             chapter_num = parts[0]
             verse_spec = parts[1] if len(parts) > 1 else None
             chapter_num = chapter_name_to_number(chapter_num) if not chapter_num.isdigit() else int(chapter_num)
-            read(chapter_num, verse_spec, lang=lang, highlight_word=None if no_highlight else highlight_word, show_heading=not no_chapter_headings)
+            read(chapter_num, verse_spec, lang=lang, highlight_words=() if no_highlight else highlight_words, show_heading=not no_chapter_headings, fmt=fmt, output_file=output_file, translations=translations)
         elif '-' in command:
-            read_range(command, lang=lang, highlight_word=None if no_highlight else highlight_word, no_chapter_headings=no_chapter_headings)
+            read_range(command, lang=lang, highlight_words=() if no_highlight else highlight_words, no_chapter_headings=no_chapter_headings, fmt=fmt, output_file=output_file, translations=translations)
         else:
             chapter_num = chapter_name_to_number(command) if not command.isdigit() else int(command)
-            read(chapter_num, lang=lang, highlight_word=None if no_highlight else highlight_word, show_heading=not no_chapter_headings)
+            read(chapter_num, lang=lang, highlight_words=() if no_highlight else highlight_words, show_heading=not no_chapter_headings, fmt=fmt, output_file=output_file, translations=translations)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,123 @@
+import heapq
+import math
+from bisect import bisect_left
+from operator import attrgetter
+
+from search_index import bm25_weight, tokenize
+
+DEFAULT_TOP = 10
+
+# The doc of a cursor that has run out; sorts after every verse.
+END = float('inf')
+
+class Cursor:
+    # One query term's postings within [lo, hi), walked in verse order;
+    # doc is the verse it is on.
+    __slots__ = ('docs', 'offsets', 'position', 'end', 'doc', 'idf', 'bound')
+
+    def __init__(self, postings, lo, hi, idf, max_weight):
+        self.docs = postings.docs
+        self.offsets = postings.offsets
+        self.end = bisect_left(self.docs, hi)
+        self.idf = idf
+        # No verse can get more than this from the term.
+        self.bound = idf * max_weight
+        self.move(bisect_left(self.docs, lo))
+
+    def move(self, position):
+        self.position = position
+        self.doc = self.docs[position] if position < self.end else END
+
+    def tf(self):
+        return self.offsets[self.position + 1] - self.offsets[self.position]
+
+    def next(self):
+        self.move(self.position + 1)
+
+    def skip_to(self, doc):
+        self.move(bisect_left(self.docs, doc, self.position, self.end))
+
+def idf(index, term):
+    verses = len(index.lengths)
+    frequency = index.doc_frequency(term)
+    return math.log(1 + (verses - frequency + 0.5) / (frequency + 0.5))
+
+def cursors_for(index, terms, lo, hi):
+    cursors = []
+    for term in dict.fromkeys(terms):
+        postings = index.postings(term)
+        if postings is None:
+            continue
+        cursor = Cursor(postings, lo, hi, idf(index, term), index.max_weights[term])
+        if cursor.doc is not END:
+            cursors.append(cursor)
+    return cursors
+
+def rank_verses(index, keyword, lo, hi, top=DEFAULT_TOP):
+    # The top verses in [lo, hi) for the words of keyword by BM25, as
+    # (score, verse index) pairs, best first; ties go to the earlier verse.
+    #
+    # WAND: the cursors are kept in verse order, and a verse is only scored
+    # when the bounds of the terms that could be in it add up to more than
+    # the lowest score in the heap. The cursors behind it jump straight to
+    # it, skipping every verse that could not make the top k, and the search
+    # stops once no remaining verse can.
+    lengths, avg_length = index.lengths, index.avg_length
+    cursors = cursors_for(index, tokenize(keyword), lo, hi)
+    if len(cursors) < 2:
+        # Nothing to prune against: every verse with the word is scored.
+        return rank_exhaustive(index, keyword, lo, hi, top)
+    by_doc = attrgetter('doc')
+    heap = []
+    threshold = 0.0
+    while True:
+        cursors.sort(key=by_doc)
+        bound = 0.0
+        pivot = None
+        for position, cursor in enumerate(cursors):
+            bound += cursor.bound
+            if bound > threshold:
+                pivot = position
+                break
+        if pivot is None:
+            break
+        pivot_doc = cursors[pivot].doc
+        if pivot_doc is END:
+            break
+
+        if cursors[0].doc == pivot_doc:
+            # fsum is exact whatever order the terms are added in, so equal
+            # verses always tie.
+            parts = []
+            length = lengths[pivot_doc]
+            for cursor in cursors:
+                if cursor.doc != pivot_doc:
+                    break
+                parts.append(cursor.idf * bm25_weight(cursor.tf(), length, avg_length))
+                cursor.next()
+            score = math.fsum(parts)
+            if len(heap) < top:
+                heapq.heappush(heap, (score, -pivot_doc))
+            elif score > threshold:
+                heapq.heapreplace(heap, (score, -pivot_doc))
+            if len(heap) == top:
+                threshold = heap[0][0]
+        else:
+            for cursor in cursors[:pivot]:
+                cursor.skip_to(pivot_doc)
+
+    return [(score, -negative_doc) for score, negative_doc in sorted(heap, reverse=True)]
+
+def rank_exhaustive(index, keyword, lo, hi, top=DEFAULT_TOP):
+    # The same ranking by scoring every verse that has any of the words;
+    # what rank_verses saves work against.
+    lengths, avg_length = index.lengths, index.avg_length
+    parts = {}
+    for cursor in cursors_for(index, tokenize(keyword), lo, hi):
+        docs, offsets, weight = cursor.docs, cursor.offsets, cursor.idf
+        for position in range(cursor.position, cursor.end):
+            doc = docs[position]
+            tf = offsets[position + 1] - offsets[position]
+            parts.setdefault(doc, []).append(weight * bm25_weight(tf, lengths[doc], avg_length))
+    scores = [(math.fsum(doc_parts), doc) for doc, doc_parts in parts.items()]
+    return heapq.nsmallest(top, scores, key=lambda item: (-item[0], item[1]))
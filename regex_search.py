@@ -0,0 +1,75 @@
+import itertools
+import multiprocessing
+import os
+import re
+import threading
+
+# Ranges shorter than this are scanned in-process: forking the pool costs
+# more than the scan.
+PARALLEL_MIN_VERSES = 1024
+SHARDS_PER_JOB = 4
+
+# The text being scanned, in a pool worker. The pool's initializer sets it
+# in each worker as it starts; with fork the arguments are inherited rather
+# than pickled.
+_buffer = None
+_offsets = None
+
+def set_text(buffer, offsets):
+    global _buffer, _offsets
+    _buffer, _offsets = buffer, offsets
+
+def compile_pattern(source):
+    # Case-insensitive like keyword search. MULTILINE makes ^ and $ match at
+    # the start and end of every verse, since verses are newline-separated
+    # in the text buffer.
+    return re.compile(source, re.IGNORECASE | re.MULTILINE)
+
+def scan(pattern, buffer, offsets, lo, hi):
+    # Matches each verse in place (pos/endpos), without slicing it out.
+    search = pattern.search
+    for index in range(lo, hi):
+        if search(buffer, offsets[index], offsets[index + 1] - 1):
+            yield index
+
+def scan_shard(job):
+    source, lo, hi = job
+    return list(scan(compile_pattern(source), _buffer, _offsets, lo, hi))
+
+def shards(lo, hi, count):
+    size = max(1, -(-(hi - lo) // count))
+    return [(start, min(start + size, hi)) for start in range(lo, hi, size)]
+
+def find_regex(corpus, lang, source, lo, hi, max_results=None, jobs=None):
+    # Verse indexes in [lo, hi) whose text in lang matches the regular
+    # expression source, in canonical order; at most max_results of them.
+    # Raises re.error for an invalid pattern.
+    pattern = compile_pattern(source)
+    offsets = corpus.offsets.get(lang) or corpus.load_language(lang)
+    buffer = corpus.buffers[lang]
+    jobs = jobs or os.cpu_count() or 1
+
+    # Forking is only safe from a process's main thread: a daemon request
+    # runs on a thread of its own, alongside others, and a batch worker may
+    # not have children. Those scan in-process.
+    context = None
+    forkable = (threading.current_thread() is threading.main_thread()
+                and not multiprocessing.current_process().daemon)
+    if jobs > 1 and hi - lo >= PARALLEL_MIN_VERSES and forkable:
+        from batch import fork_context
+        context = fork_context()
+    if context is None:
+        return list(itertools.islice(scan(pattern, buffer, offsets, lo, hi), max_results))
+
+    # imap hands the shards back in order, so the merged list stays in
+    # canonical order and the first max_results are final as soon as they
+    # arrive; leaving the pool then terminates the shards still running.
+    matches = []
+    with context.Pool(jobs, initializer=set_text, initargs=(buffer, offsets)) as pool:
+        jobs_iter = ((source, start, end) for start, end in shards(lo, hi, jobs * SHARDS_PER_JOB))
+        for found in pool.imap(scan_shard, jobs_iter):
+            matches.extend(found)
+            if max_results and len(matches) >= max_results:
+                del matches[max_results:]
+                break
+    return matches
@@ -0,0 +1,173 @@
+import os
+import re
+import sys
+import textwrap
+import threading
+from collections import OrderedDict
+
+import client
+
+LAYOUT_CACHE_SIZE = 16384
+
+class LayoutCache:
+    # Wrapped verses shared by every command the process runs, so repeated
+    # and overlapping reads in the daemon only wrap each verse once.
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            layout = self.entries.get(key)
+            if layout is not None:
+                self.entries.move_to_end(key)
+            return layout
+
+    def put(self, key, layout):
+        with self.lock:
+            self.entries[key] = layout
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+_layouts = LayoutCache(LAYOUT_CACHE_SIZE)
+
+def clear_layout_cache():
+    _layouts.clear()
+
+def wants_color():
+    # Inside the daemon sys.stdout carries the client's colour preference.
+    color = getattr(sys.stdout, 'color', None)
+    return client.client_wants_color() if color is None else color
+
+def paint(text, color):
+    from termcolor import colored
+
+    wants = getattr(sys.stdout, 'color', None)
+    if wants is None:
+        return colored(text, color)
+    return colored(text, color, force_color=wants, no_color=not wants)
+
+def terminal_width():
+    columns = getattr(sys.stdout, 'columns', None)
+    if columns:
+        return columns
+    # What shutil.get_terminal_size() does, without importing shutil.
+    try:
+        columns = int(os.environ['COLUMNS'])
+    except (KeyError, ValueError):
+        columns = 0
+    if columns <= 0:
+        try:
+            columns = os.get_terminal_size(sys.__stdout__.fileno()).columns
+        except (AttributeError, ValueError, OSError):
+            columns = 0
+    return columns or 80
+
+def keyword_pattern(word):
+    return re.compile(r'\b' + re.escape(word) + r'\b', re.IGNORECASE)
+
+def words_pattern(words):
+    # One alternation for every word; longest first so a word never loses
+    # to a shorter word it starts with.
+    if not words:
+        return None
+    alternatives = '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+    return re.compile(r'\b(?:' + alternatives + r')\b', re.IGNORECASE)
+
+def words_matcher(words):
+    # Several words are found in one pass by an Aho-Corasick automaton,
+    # which stands in for the regex wherever a pattern is expected.
+    if len(words) > 1:
+        from automaton import Automaton
+        return Automaton(sorted(words))
+    return words_pattern(words)
+
+def highlight(text, word, no_highlight, regex=None):
+    if no_highlight:
+        return text
+    regex = regex or keyword_pattern(word)
+    return regex.sub(lambda match: paint(match.group(), 'cyan'), text)
+
+def highlight_arabic(normalized, index, text, word, no_highlight, regex=None):
+    if no_highlight:
+        return text
+    if regex is None:
+        from arabic import normalize
+        regex = keyword_pattern(normalize(word)[0])
+    return paint_normalized_matches(normalized, index, text, regex, lambda piece: paint(piece, 'cyan'))
+
+def paint_normalized_matches(normalized, index, text, regex, painter):
+    # Matches against the normalized verse, then colours the same letters
+    # (with their harakat) in the vocalized original.
+    pieces = []
+    last = 0
+    for match in regex.finditer(normalized.text(index)):
+        start, end = normalized.original_span(index, match.start(), match.end(), len(text))
+        pieces.append(text[last:start])
+        pieces.append(painter(text[start:end]))
+        last = end
+    pieces.append(text[last:])
+    return ''.join(pieces)
+
+class Renderer:
+    # Built once per command: the width, colour choice and highlight
+    # patterns are settled up front, and wrapped verses come from the
+    # shared layout cache keyed by everything that affects them.
+    def __init__(self, corpus, languages=("arabic", "english"), highlight_words=(), load_normalized=None):
+        self.corpus = corpus
+        self.languages = tuple(languages)
+        self.width = terminal_width()
+        self.color = wants_color()
+        self.highlights = frozenset(highlight_words)
+        self.load_normalized = load_normalized
+        # Arabic is matched in its normalized form; every translation shares
+        # the pattern for the other words.
+        self.patterns = {'arabic': None, 'translation': None}
+        if self.highlights:
+            # Colouring and Arabic normalization are only loaded when
+            # there is something to highlight.
+            from arabic import is_arabic, normalize
+            from termcolor import colored
+            self.colored = colored
+            self.patterns['arabic'] = words_matcher({normalize(word)[0] for word in self.highlights if is_arabic(word)})
+            self.patterns['translation'] = words_matcher({word for word in self.highlights if not is_arabic(word)})
+        self.wrappers = {}
+
+    def paint(self, text):
+        return self.colored(text, 'cyan', force_color=self.color, no_color=not self.color)
+
+    def highlighted(self, index, language):
+        text = self.corpus.text(language, index)
+        pattern = self.patterns['arabic' if language == 'arabic' else 'translation']
+        if pattern is None:
+            return text
+        if language != 'arabic':
+            return pattern.sub(lambda match: self.paint(match.group()), text)
+
+        return paint_normalized_matches(self.load_normalized(), index, text, pattern, self.paint)
+
+    def wrap(self, label, text):
+        indent = len(label) + 4
+        wrapper = self.wrappers.get(indent)
+        if wrapper is None:
+            wrapper = textwrap.TextWrapper(width=self.width, initial_indent='', subsequent_indent=' ' * indent)
+            self.wrappers[indent] = wrapper
+        return wrapper.fill(f"{label}    {text}")
+
+    def layout(self, index, chapter_num, verse_num, language):
+        key = (index + 1, self.width, language, self.highlights, self.color)
+        layout = _layouts.get(key)
+        if layout is None:
+            layout = self.wrap(f"{chapter_num}:{verse_num}", self.highlighted(index, language))
+            _layouts.put(key, layout)
+        return layout
+
+    def verse_lines(self, index, chapter_num, verse_num):
+        for language in self.languages:
+            yield self.layout(index, chapter_num, verse_num, language)
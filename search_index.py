@@ -0,0 +1,186 @@
+import re
+from array import array
+from bisect import bisect_left
+
+import cache
+from corpus import language_sources
+from fuzzy import TrigramIndex, build_trigram_payload
+
+INDEX_VERSION = 3
+
+# BM25 parameters; the per-term score bounds in the index depend on them.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN = re.compile(r'\w+')
+DOC_ITEMSIZE = array('I').itemsize
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+def bm25_weight(tf, length, avg_length):
+    # The term-frequency part of a BM25 score, without the idf.
+    return tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+
+def build_index_payload(text_of, verse_count):
+    postings = {}
+    lengths = array('I')
+    for index in range(verse_count):
+        tokens = tokenize(text_of(index))
+        lengths.append(len(tokens))
+        for position, term in enumerate(tokens):
+            entry = postings.get(term)
+            if entry is None:
+                entry = postings[term] = ([], [])
+            docs, positions = entry
+            if not docs or docs[-1] != index:
+                docs.append(index)
+                positions.append([])
+            positions[-1].append(position)
+
+    # Ranking statistics: every verse's length in tokens, and for every
+    # term the highest BM25 weight it reaches in any verse, the bound that
+    # lets ranked search skip verses that cannot make the top k.
+    avg_length = sum(lengths) / max(len(lengths), 1)
+    packed = {}
+    max_weights = {}
+    for term, (docs, positions) in postings.items():
+        offsets = array('I', [0])
+        flat = array('H')
+        for verse_positions in positions:
+            flat.extend(verse_positions)
+            offsets.append(len(flat))
+        packed[term] = (array('I', docs).tobytes(), offsets.tobytes(), flat.tobytes())
+        max_weights[term] = max(bm25_weight(len(verse_positions), lengths[doc], avg_length)
+                                for doc, verse_positions in zip(docs, positions))
+
+    vocabulary = sorted(packed)
+    return {'postings': packed, 'vocabulary': vocabulary, 'trigrams': build_trigram_payload(vocabulary),
+            'lengths': lengths.tobytes(), 'max_weights': max_weights}
+
+class Postings:
+    __slots__ = ('docs', 'offsets', 'positions')
+
+    def __init__(self, packed):
+        docs, offsets, positions = packed
+        self.docs = array('I')
+        self.docs.frombytes(docs)
+        self.offsets = array('I')
+        self.offsets.frombytes(offsets)
+        self.positions = array('H')
+        self.positions.frombytes(positions)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def slot(self, index):
+        slot = bisect_left(self.docs, index)
+        if slot < len(self.docs) and self.docs[slot] == index:
+            return slot
+        return None
+
+    def positions_at(self, slot):
+        return self.positions[self.offsets[slot]:self.offsets[slot + 1]]
+
+    def docs_between(self, lo, hi):
+        return self.docs[bisect_left(self.docs, lo):bisect_left(self.docs, hi)]
+
+class InvertedIndex:
+    __slots__ = ('packed', 'decoded', 'vocabulary', 'trigrams', 'lengths', 'avg_length', 'max_weights')
+
+    def __init__(self, payload):
+        self.packed = payload['postings']
+        self.decoded = {}
+        self.vocabulary = payload['vocabulary']
+        self.trigrams = TrigramIndex(self.vocabulary, payload['trigrams'])
+        self.lengths = array('I')
+        self.lengths.frombytes(payload['lengths'])
+        self.avg_length = sum(self.lengths) / max(len(self.lengths), 1)
+        self.max_weights = payload['max_weights']
+
+    def __contains__(self, term):
+        return term in self.packed
+
+    def terms(self):
+        return self.packed.keys()
+
+    def terms_with_prefix(self, prefix):
+        start = bisect_left(self.vocabulary, prefix)
+        end = start
+        while end < len(self.vocabulary) and self.vocabulary[end].startswith(prefix):
+            end += 1
+        return self.vocabulary[start:end]
+
+    def similar_terms(self, word, max_distance=None):
+        # (distance, term) pairs, closest first and commoner terms first
+        # among equally close ones.
+        matches = self.trigrams.lookup(word, max_distance)
+        return sorted(matches, key=lambda match: (match[0], -self.doc_frequency(match[1])))
+
+    def postings(self, term):
+        postings = self.decoded.get(term)
+        if postings is None:
+            packed = self.packed.get(term)
+            if packed is None:
+                return None
+            postings = self.decoded[term] = Postings(packed)
+        return postings
+
+    def doc_frequency(self, term):
+        packed = self.packed.get(term)
+        return len(packed[0]) // DOC_ITEMSIZE if packed else 0
+
+    def docs_between(self, term, lo, hi):
+        postings = self.postings(term)
+        if postings is None:
+            return array('I')
+        return postings.docs_between(lo, hi)
+
+def intersect(doc_lists):
+    # Walk the shortest list and binary-search the others, so the cost
+    # follows the rarest term rather than the most common one.
+    doc_lists = sorted(doc_lists, key=len)
+    if not doc_lists:
+        return []
+    result = list(doc_lists[0])
+    for docs in doc_lists[1:]:
+        if not result:
+            break
+        kept = []
+        start = 0
+        for doc in result:
+            start = bisect_left(docs, doc, start)
+            if start == len(docs):
+                break
+            if docs[start] == doc:
+                kept.append(doc)
+        result = kept
+    return result
+
+def find_verses(text_of, index, keyword, lo, hi):
+    # Verse indexes in [lo, hi) whose text matches \bkeyword\b, ignoring case.
+    keyword_regex = re.compile(r'\b' + re.escape(keyword) + r'\b', re.IGNORECASE)
+    terms = tokenize(keyword)
+
+    if len(terms) == 1 and TOKEN.fullmatch(keyword):
+        return list(index.docs_between(terms[0], lo, hi))
+
+    if terms:
+        # Every word of the keyword must appear as a whole token in a
+        # matching verse, so the postings narrow the regex to a few verses.
+        candidates = intersect([index.docs_between(term, lo, hi) for term in set(terms)])
+    else:
+        candidates = range(lo, hi)
+    return [i for i in candidates if keyword_regex.search(text_of(i))]
+
+def searchable_text(corpus, lang):
+    # Arabic is indexed and matched in its normalized form; see arabic.py.
+    if lang == 'arabic':
+        from arabic import load_normalized_text
+        return load_normalized_text(corpus).text
+    return lambda index: corpus.text(lang, index)
+
+def load_search_index(corpus, lang='english'):
+    text_of = searchable_text(corpus, lang)
+    return InvertedIndex(cache.cached(f'index-{lang}.bin', INDEX_VERSION, language_sources(lang),
+                                      lambda: build_index_payload(text_of, len(corpus))))
@@ -0,0 +1,95 @@
+import mmap
+import re
+from array import array
+from bisect import bisect_right
+
+import cache
+from corpus import VerseTable, check_verse_count, discover_translations
+
+SEEK_CACHE = 'seek.bin'
+SEEK_VERSION = 2
+
+# Reads spanning more verses than this are cheaper through the full corpus.
+SEEK_MAX_VERSES = 32
+
+SURA_TAG = re.compile(rb'<sura\b([^>]*)>')
+AYA_TAG = re.compile(rb'<aya\b[^>]*?\btext="([^"]*)"[^>]*>')
+ATTRIBUTE = re.compile(rb'(\w+)="([^"]*)"')
+ENTITY = re.compile(r'&(#x[0-9a-fA-F]+|#[0-9]+|quot|apos|lt|gt|amp);')
+NAMED_ENTITIES = {'quot': '"', 'apos': "'", 'lt': '<', 'gt': '>', 'amp': '&'}
+
+def unescape_attribute(value):
+    def replace(match):
+        name = match.group(1)
+        if name.startswith('#x'):
+            return chr(int(name[2:], 16))
+        if name.startswith('#'):
+            return chr(int(name[1:]))
+        return NAMED_ENTITIES[name]
+
+    if '&' in value:
+        value = ENTITY.sub(replace, value)
+    return value
+
+def scan_offsets(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    suras = []
+    sura_positions = []
+    for match in SURA_TAG.finditer(data):
+        attributes = {key.decode(): unescape_attribute(value.decode('utf-8'))
+                      for key, value in ATTRIBUTE.findall(match.group(1))}
+        suras.append(attributes)
+        sura_positions.append(match.start())
+
+    starts = array('I', [0] * (len(suras) + 1))
+    spans = array('I')
+    for match in AYA_TAG.finditer(data):
+        spans.append(match.start(1))
+        spans.append(match.end(1))
+        starts[bisect_right(sura_positions, match.start())] += 1
+    for i in range(1, len(starts)):
+        starts[i] += starts[i - 1]
+    return suras, starts, spans
+
+def build_seek_payload(arabic_path):
+    suras, starts, _ = scan_offsets(arabic_path)
+    return {'suras': suras, 'starts': starts.tobytes()}
+
+def load_spans(lang, path):
+    return cache.cached(f'seek-{lang}.bin', SEEK_VERSION, [path], lambda: scan_offsets(path)[2].tobytes())
+
+class SeekIndex(VerseTable):
+    # Verse spans are scanned per language, the first time a language is
+    # read, so a single-language command never touches the other files.
+    __slots__ = ('spans', 'paths', 'maps')
+
+    def __init__(self, payload, paths):
+        self.suras = payload['suras']
+        self.starts = array('I')
+        self.starts.frombytes(payload['starts'])
+        self.spans = {}
+        self.paths = paths
+        self.maps = {}
+
+    def open_language(self, lang):
+        path = self.paths[lang]
+        spans = array('I')
+        spans.frombytes(load_spans(lang, path))
+        check_verse_count(path, len(spans) // 2, len(self))
+        with open(path, 'rb') as f:
+            self.maps[lang] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.spans[lang] = spans
+        return spans
+
+    def text(self, lang, index):
+        spans = self.spans.get(lang) or self.open_language(lang)
+        raw = self.maps[lang][spans[2 * index]:spans[2 * index + 1]]
+        return unescape_attribute(raw.decode('utf-8'))
+
+def load_seek_index():
+    paths = discover_translations()
+    payload = cache.cached(SEEK_CACHE, SEEK_VERSION, [paths['arabic']],
+                           lambda: build_seek_payload(paths['arabic']))
+    return SeekIndex(payload, paths)
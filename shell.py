@@ -0,0 +1,301 @@
+import os
+import shlex
+import sys
+import time
+from collections import OrderedDict
+
+from batch import CapturedOutput, execute
+
+PROMPT = 'quran> '
+HISTORY_FILE = os.path.join(os.path.expanduser('~'), '.quran_history')
+HISTORY_LENGTH = 1000
+PREFIX_CACHE_SIZE = 256
+# A keystroke in incremental search should find and redraw its results
+# well within a frame of typing; the status line flags the ones that don't.
+KEYSTROKE_BUDGET_MS = 16
+
+# Commands that make no sense inside the shell.
+BLOCKED = {'shell', 'serve', 'batch'}
+
+class PrefixCache:
+    # Matches (verse indexes) per query. Every verse containing a query also
+    # contains each of its prefixes, so a query is answered by filtering the
+    # results of its longest cached prefix: typing narrows the last result,
+    # backspacing finds the earlier one still in the cache.
+    def __init__(self, texts, size=PREFIX_CACHE_SIZE):
+        self.texts = texts
+        self.size = size
+        self.entries = OrderedDict()
+
+    def lookup(self, query):
+        matches = self.entries.get(query)
+        if matches is not None:
+            self.entries.move_to_end(query)
+            return matches
+        candidates = range(len(self.texts))
+        for end in range(len(query) - 1, 0, -1):
+            parent = self.entries.get(query[:end])
+            if parent is not None:
+                candidates = parent
+                break
+        texts = self.texts
+        matches = [index for index in candidates if query in texts[index]]
+        self.entries[query] = matches
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return matches
+
+class IncrementalSearch:
+    # Search-as-you-type over one language at a time: case-insensitive
+    # substring matches against the translation, or against the normalized
+    # Arabic text when the query is Arabic.
+    def __init__(self, corpus, translation='english'):
+        self.corpus = corpus
+        self.translation = translation
+        self.caches = {}
+
+    def cache(self, lang):
+        if lang not in self.caches:
+            from search_index import searchable_text
+            text_of = searchable_text(self.corpus, lang)
+            self.caches[lang] = PrefixCache([text_of(index).lower() for index in range(len(self.corpus))])
+        return self.caches[lang]
+
+    def find(self, query):
+        # Returns the language searched, the normalized query and the
+        # matching verse indexes.
+        from arabic import is_arabic, normalize
+
+        if is_arabic(query):
+            lang, query = 'arabic', normalize(query)[0]
+        else:
+            lang, query = self.translation, query.lower()
+        if not query.strip():
+            return lang, query, []
+        return lang, query, self.cache(lang).lookup(query)
+
+class Terminal:
+    # Single keystrokes from a terminal in cbreak mode.
+    def __init__(self):
+        import codecs
+
+        self.fd = sys.stdin.fileno()
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+
+    def __enter__(self):
+        import termios
+        import tty
+
+        self.saved = termios.tcgetattr(self.fd)
+        tty.setcbreak(self.fd)
+        return self
+
+    def __exit__(self, *exc_info):
+        import termios
+
+        termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved)
+
+    def pending(self):
+        import select
+
+        return bool(select.select([self.fd], [], [], 0.02)[0])
+
+    def key(self):
+        # One key: a character, or 'escape' for Esc and any escape sequence
+        # (arrow keys and the like, which are ignored).
+        while True:
+            data = os.read(self.fd, 1)
+            if not data:
+                return None
+            if data == b'\x1b':
+                while self.pending():
+                    os.read(self.fd, 16)
+                return 'escape'
+            char = self.decoder.decode(data)
+            if char:
+                return char
+
+def screen_size():
+    from render import terminal_width
+
+    try:
+        lines = os.get_terminal_size(sys.__stdout__.fileno()).lines
+    except (AttributeError, ValueError, OSError):
+        lines = 24
+    return terminal_width(), lines
+
+def page(text, interactive):
+    # Shows text a screenful at a time: space for the next page, enter for
+    # the next line, q to stop.
+    lines = text.splitlines()
+    _, height = screen_size()
+    if not interactive or len(lines) < height:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        return
+    shown = 0
+    step = height - 1
+    with Terminal() as terminal:
+        while shown < len(lines):
+            sys.stdout.write(''.join(line + '\n' for line in lines[shown:shown + step]))
+            shown += step
+            if shown >= len(lines):
+                break
+            sys.stdout.write(f"-- {shown}/{len(lines)} lines (space: page, enter: line, q: quit) --")
+            sys.stdout.flush()
+            key = terminal.key()
+            sys.stdout.write('\r\x1b[K')
+            if key in (None, 'q', 'Q', 'escape'):
+                break
+            step = 1 if key in ('\n', '\r') else height - 1
+    sys.stdout.flush()
+
+def result_line(corpus, lang, query, index, width, color):
+    chapter_num, verse_num = corpus.locate(index)
+    line = f"{chapter_num}:{verse_num}    {corpus.text(lang, index)}"[:width]
+    if not color or lang == 'arabic':
+        return line
+    # Highlight the matches that are still on screen after truncation.
+    from termcolor import colored
+
+    lowered = line.lower()
+    pieces = []
+    last = 0
+    start = lowered.find(query)
+    while start != -1:
+        pieces.append(line[last:start])
+        pieces.append(colored(line[start:start + len(query)], 'cyan', force_color=True))
+        last = start + len(query)
+        start = lowered.find(query, last)
+    pieces.append(line[last:])
+    return ''.join(pieces)
+
+def draw(corpus, query, lang, normalized, matches, elapsed, color):
+    width, height = screen_size()
+    budget = '' if elapsed <= KEYSTROKE_BUDGET_MS else ', over budget'
+    frame = ['\x1b[H\x1b[2J', f"search: {query}\n",
+             f"{len(matches)} verses ({elapsed:.1f} ms{budget})  enter: show all  esc: back\n"]
+    for index in matches[:height - 3]:
+        frame.append(result_line(corpus, lang, normalized, index, width, color) + '\n')
+    sys.stdout.write(''.join(frame))
+    sys.stdout.flush()
+
+def incremental_search(searcher, query=''):
+    # Redraws the matches on every keystroke. Returns the final lines to
+    # page through when enter is pressed, or None when the search is left.
+    from render import wants_color
+
+    color = wants_color()
+    corpus = searcher.corpus
+    with Terminal() as terminal:
+        while True:
+            start = time.perf_counter()
+            lang, normalized, matches = searcher.find(query)
+            elapsed = (time.perf_counter() - start) * 1000
+            draw(corpus, query, lang, normalized, matches, elapsed, color)
+            key = terminal.key()
+            if key in (None, 'escape', '\x03', '\x04'):
+                sys.stdout.write('\x1b[H\x1b[2J')
+                return None
+            if key in ('\n', '\r'):
+                sys.stdout.write('\x1b[H\x1b[2J')
+                header = f"There were '{len(matches)}' verses containing '{query}'\n"
+                return header + ''.join(result_line(corpus, lang, normalized, index, sys.maxsize, color) + '\n'
+                                        for index in matches)
+            if key in ('\x7f', '\x08'):
+                query = query[:-1]
+            elif key == '\x15':  # Ctrl-U
+                query = ''
+            elif key.isprintable():
+                query += key
+
+def load_history():
+    try:
+        import readline
+    except ImportError:
+        return None
+    readline.set_history_length(HISTORY_LENGTH)
+    try:
+        readline.read_history_file(HISTORY_FILE)
+    except OSError:
+        pass
+    return readline
+
+def save_history(readline):
+    if readline is None:
+        return
+    try:
+        readline.write_history_file(HISTORY_FILE)
+    except OSError:
+        pass
+
+def print_help():
+    print("Type any quran command without the leading 'quran', e.g. 2:255, search mercy, info 2.")
+    print("  find [<text>]     Search as you type (enter shows every match, esc goes back)")
+    print("  commands          List every command")
+    print("  exit              Leave the shell (or press Ctrl-D)")
+
+def run_command(run, args, interactive):
+    from render import terminal_width, wants_color
+
+    real_stdout = sys.stdout
+    sys.stdout = captured = CapturedOutput(terminal_width(), wants_color())
+    try:
+        execute(run, args)
+    finally:
+        sys.stdout = real_stdout
+    page(captured.getvalue(), interactive)
+
+def run_shell(run, preload, load_corpus, translation='english', is_stale=None, reload=None):
+    preload()
+    interactive = sys.stdin.isatty() and sys.stdout.isatty()
+    readline = load_history() if interactive else None
+    searcher = IncrementalSearch(load_corpus(), translation)
+    if interactive:
+        print("The Terminal Quran shell. Type 'help' for help, 'exit' to leave.")
+
+    try:
+        while True:
+            try:
+                line = input(PROMPT if interactive else '')
+            except EOFError:
+                break
+            except KeyboardInterrupt:
+                print()
+                continue
+            try:
+                args = shlex.split(line)
+            except ValueError as e:
+                print(f"Error: {e}.")
+                continue
+            if not args:
+                continue
+            if args[0] == 'quran':
+                args = args[1:] or ['commands']
+
+            if is_stale and is_stale():
+                reload()
+                searcher = IncrementalSearch(load_corpus(), translation)
+            if args[0] in ('exit', 'quit'):
+                break
+            try:
+                if args[0] == 'help':
+                    print_help()
+                elif args[0] == 'find':
+                    if not interactive:
+                        print("Error: find needs a terminal.")
+                        continue
+                    found = incremental_search(searcher, ' '.join(args[1:]))
+                    if found is not None:
+                        page(found, interactive)
+                elif args[0] in BLOCKED:
+                    print(f"Error: '{args[0]}' is not available inside the shell.")
+                else:
+                    run_command(run, args, interactive)
+            except KeyboardInterrupt:
+                print()
+            except Exception as e:
+                # A command that breaks is reported; the shell carries on.
+                print(f"Error: {e}.")
+    finally:
+        save_history(readline)
@@ -0,0 +1,162 @@
+import heapq
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from operator import mul
+
+import cache
+from corpus import language_sources
+from search_index import searchable_text, tokenize
+from stats import STOPWORDS
+
+SIMILAR_VERSION = 1
+
+# MinHash signature length, split into BANDS bands of ROWS values each. A
+# pair of verses becomes a candidate when one whole band matches, which
+# for Jaccard similarity j happens with probability 1 - (1 - j^ROWS)^BANDS.
+BANDS = 64
+ROWS = 1
+# At most this many candidates are scored exactly.
+CANDIDATES = 1000
+PRIME = (1 << 61) - 1
+MASK = (1 << 32) - 1
+
+def hash_functions(count, seed=0x51A):
+    # (a, b) pairs for the universal hashes (a * x + b) mod PRIME, from a
+    # fixed linear congruential sequence so every build agrees.
+    state = seed
+    functions = []
+    for _ in range(count):
+        pair = []
+        for _ in range(2):
+            state = (state * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+            pair.append(state % (PRIME - 1) + 1)
+        functions.append(tuple(pair))
+    return functions
+
+def band_key(band, values):
+    # One 64-bit key per (band, values), so every bucket lives in a single
+    # sorted array.
+    key = band
+    for value in values:
+        key = (key * 1000003 ^ value) & ((1 << 64) - 1)
+    return key
+
+def build_similar_payload(text_of, verse_count):
+    token_lists = [tokenize(text_of(index)) for index in range(verse_count)]
+    vocabulary = sorted({term for tokens in token_lists for term in tokens})
+    term_ids = {term: term_id for term_id, term in enumerate(vocabulary)}
+
+    document_frequency = [0] * len(vocabulary)
+    rows = []
+    for tokens in token_lists:
+        counts = {}
+        for term in tokens:
+            term_id = term_ids[term]
+            counts[term_id] = counts.get(term_id, 0) + 1
+        for term_id in counts:
+            document_frequency[term_id] += 1
+        rows.append(counts)
+
+    # TF-IDF with sublinear term frequency, each row scaled to unit length
+    # so the cosine of two verses is the dot product of their rows.
+    idf = [math.log(verse_count / df) for df in document_frequency]
+    row_ptr = array('I', [0])
+    row_terms = array('I')
+    row_weights = array('f')
+    for counts in rows:
+        weights = {term_id: (1 + math.log(count)) * idf[term_id] for term_id, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        for term_id in sorted(weights):
+            row_terms.append(term_id)
+            row_weights.append(weights[term_id] / norm)
+        row_ptr.append(len(row_terms))
+
+    # MinHash over each verse's content words: stopwords and words found in
+    # most verses would make every verse look alike.
+    functions = hash_functions(BANDS * ROWS)
+    common = verse_count // 10
+    term_hashes = [tuple((a * term_id + b) % PRIME & MASK for a, b in functions)
+                   for term_id in range(len(vocabulary))]
+    verse_keys = array('Q')
+    buckets = []
+    for index, counts in enumerate(rows):
+        content = [term_id for term_id in counts
+                   if vocabulary[term_id] not in STOPWORDS and document_frequency[term_id] <= common]
+        if not content:
+            # No content words: the verse is in no bucket, and its zero keys
+            # find none.
+            verse_keys.extend([0] * BANDS)
+            continue
+        signature = list(map(min, zip(*(term_hashes[term_id] for term_id in content))))
+        keys = [band_key(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+        verse_keys.extend(keys)
+        buckets.extend((key, index) for key in keys)
+    buckets.sort()
+
+    return {
+        'vocabulary': vocabulary,
+        'rows': (row_ptr.tobytes(), row_terms.tobytes(), row_weights.tobytes()),
+        'buckets': (array('Q', [key for key, _ in buckets]).tobytes(),
+                    array('I', [index for _, index in buckets]).tobytes()),
+        'verse_keys': verse_keys.tobytes(),
+    }
+
+class SimilarityIndex:
+    def __init__(self, payload):
+        self.vocabulary = payload['vocabulary']
+        row_ptr, row_terms, row_weights = payload['rows']
+        self.row_ptr = array('I')
+        self.row_ptr.frombytes(row_ptr)
+        self.row_terms = array('I')
+        self.row_terms.frombytes(row_terms)
+        self.row_weights = array('f')
+        self.row_weights.frombytes(row_weights)
+        keys, verses = payload['buckets']
+        self.bucket_keys = array('Q')
+        self.bucket_keys.frombytes(keys)
+        self.bucket_verses = array('I')
+        self.bucket_verses.frombytes(verses)
+        self.verse_keys = array('Q')
+        self.verse_keys.frombytes(payload['verse_keys'])
+
+    def row(self, index):
+        start, end = self.row_ptr[index], self.row_ptr[index + 1]
+        return zip(self.row_terms[start:end], self.row_weights[start:end])
+
+    def candidates(self, index, limit):
+        # Verses sharing at least one bucket with index. The number of
+        # buckets shared estimates their Jaccard similarity, so only the
+        # `limit` verses sharing the most go on to be scored exactly.
+        shared = {}
+        keys, verses = self.bucket_keys, self.bucket_verses
+        for key in self.verse_keys[index * BANDS:(index + 1) * BANDS]:
+            for verse in verses[bisect_left(keys, key):bisect_right(keys, key)]:
+                shared[verse] = shared.get(verse, 0) + 1
+        shared.pop(index, None)
+        if len(shared) <= limit:
+            return shared
+        return heapq.nlargest(limit, shared, key=shared.get)
+
+    def similar(self, index, limit=10):
+        # (score, verse index) for the verses most similar to index, best
+        # first. Only the strongest LSH candidates are scored.
+        # The query row is spread into a dense vector so each dot product
+        # is a couple of C-level maps over the candidate's row.
+        query = [0.0] * len(self.vocabulary)
+        for term_id, weight in self.row(index):
+            query[term_id] = weight
+        lookup = query.__getitem__
+        row_ptr, row_terms, row_weights = self.row_ptr, self.row_terms, self.row_weights
+        scored = []
+        for candidate in self.candidates(index, max(CANDIDATES, limit * 4)):
+            start, end = row_ptr[candidate], row_ptr[candidate + 1]
+            score = sum(map(mul, map(lookup, row_terms[start:end]), row_weights[start:end]))
+            if score > 0:
+                scored.append((score, candidate))
+        return heapq.nlargest(limit, scored)
+
+def load_similarity_index(corpus, lang='english'):
+    text_of = searchable_text(corpus, lang)
+    return SimilarityIndex(cache.cached(f'similar-{lang}.bin', SIMILAR_VERSION, language_sources(lang),
+                                        lambda: build_similar_payload(text_of, len(corpus))))
@@ -0,0 +1,237 @@
+import heapq
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+
+import cache
+from corpus import language_sources
+from search_index import searchable_text, tokenize
+
+STATS_VERSION = 1
+
+# Left out of top-term lists and collocations unless --all is given. The
+# Arabic words are in their normalized form (see arabic.py).
+STOPWORDS = {
+    'a', 'all', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'did', 'do', 'for', 'from', 'had',
+    'has', 'have', 'he', 'her', 'him', 'his', 'i', 'if', 'in', 'indeed', 'is', 'it', 'its', 'me',
+    'my', 'not', 'o', 'of', 'on', 'or', 'our', 'over', 'said', 'say', 'shall', 'she', 'so', 'that',
+    'the', 'their', 'them', 'then', 'there', 'these', 'they', 'this', 'those', 'to', 'upon', 'us',
+    'was', 'we', 'were', 'what', 'when', 'which', 'who', 'whom', 'will', 'with', 'would', 'you',
+    'your', 'no', 'any', 'one', 'than', 'into', 'about', 'been', 'after', 'before',
+    'ان', 'الا', 'الذي', 'الذين', 'الي', 'التي', 'انا', 'انه', 'او', 'اذا', 'به', 'بما', 'ثم', 'ذلك',
+    'عن', 'علي', 'عليهم', 'عليكم', 'فيها', 'في', 'قال', 'قد', 'كان', 'كل', 'لا', 'لقد', 'لكم', 'لم',
+    'لهم', 'ما', 'من', 'منهم', 'هذا', 'هم', 'هو', 'وما', 'ولا', 'يا',
+}
+
+def build_stats_payload(text_of, starts):
+    # Three views of the same term-by-verse matrix, all as flat arrays:
+    #   tokens     every token of the range as a term id, verse by verse
+    #              (token_ptr[i] is where verse i starts); for collocations
+    #   verse rows one (term id, count) row per verse, CSR style
+    #   sura rows  the verse rows summed per sura, plus the number of
+    #              verses each term appears in, so whole-sura ranges are
+    #              a handful of row reads instead of hundreds
+    verse_count = starts[-1]
+    token_lists = [tokenize(text_of(index)) for index in range(verse_count)]
+    vocabulary = sorted({term for tokens in token_lists for term in tokens})
+    term_ids = {term: term_id for term_id, term in enumerate(vocabulary)}
+
+    tokens = array('I')
+    token_ptr = array('I', [0])
+    row_ptr = array('I', [0])
+    row_terms = array('I')
+    row_counts = array('I')
+    for verse_tokens in token_lists:
+        ids = [term_ids[term] for term in verse_tokens]
+        tokens.extend(ids)
+        token_ptr.append(len(tokens))
+        counts = {}
+        for term_id in ids:
+            counts[term_id] = counts.get(term_id, 0) + 1
+        for term_id in sorted(counts):
+            row_terms.append(term_id)
+            row_counts.append(counts[term_id])
+        row_ptr.append(len(row_terms))
+
+    sura_ptr = array('I', [0])
+    sura_terms = array('I')
+    sura_counts = array('I')
+    sura_verses = array('I')
+    for sura in range(len(starts) - 1):
+        counts = {}
+        verses = {}
+        for row in range(row_ptr[starts[sura]], row_ptr[starts[sura + 1]]):
+            term_id = row_terms[row]
+            counts[term_id] = counts.get(term_id, 0) + row_counts[row]
+            verses[term_id] = verses.get(term_id, 0) + 1
+        for term_id in sorted(counts):
+            sura_terms.append(term_id)
+            sura_counts.append(counts[term_id])
+            sura_verses.append(verses[term_id])
+        sura_ptr.append(len(sura_terms))
+
+    return {
+        'vocabulary': vocabulary,
+        'tokens': (tokens.tobytes(), token_ptr.tobytes()),
+        'verses': (row_ptr.tobytes(), row_terms.tobytes(), row_counts.tobytes()),
+        'suras': (sura_ptr.tobytes(), sura_terms.tobytes(), sura_counts.tobytes(), sura_verses.tobytes()),
+    }
+
+def unpack(packed):
+    arrays = []
+    for data in packed:
+        values = array('I')
+        values.frombytes(data)
+        arrays.append(values)
+    return arrays
+
+class TermStats:
+    def __init__(self, payload, starts):
+        self.vocabulary = payload['vocabulary']
+        self.term_ids = {term: term_id for term_id, term in enumerate(self.vocabulary)}
+        self.starts = starts
+        self.tokens, self.token_ptr = unpack(payload['tokens'])
+        self.row_ptr, self.row_terms, self.row_counts = unpack(payload['verses'])
+        self.sura_ptr, self.sura_terms, self.sura_counts, self.sura_verses = unpack(payload['suras'])
+        self.totals = None
+
+    def token_count(self, lo, hi):
+        return self.token_ptr[hi] - self.token_ptr[lo]
+
+    def sura_token_count(self, sura):
+        return self.token_count(self.starts[sura - 1], self.starts[sura])
+
+    def add_verse_rows(self, counts, verses, lo, hi):
+        row_terms, row_counts = self.row_terms, self.row_counts
+        for row in range(self.row_ptr[lo], self.row_ptr[hi]):
+            term_id = row_terms[row]
+            counts[term_id] += row_counts[row]
+            verses[term_id] += 1
+
+    def add_sura_row(self, counts, verses, sura):
+        sura_terms, sura_counts, sura_verses = self.sura_terms, self.sura_counts, self.sura_verses
+        for row in range(self.sura_ptr[sura - 1], self.sura_ptr[sura]):
+            term_id = sura_terms[row]
+            counts[term_id] += sura_counts[row]
+            verses[term_id] += sura_verses[row]
+
+    def aggregate_suras(self, suras):
+        counts = [0] * len(self.vocabulary)
+        verses = [0] * len(self.vocabulary)
+        for sura in suras:
+            self.add_sura_row(counts, verses, sura)
+        return counts, verses
+
+    def aggregate(self, lo, hi):
+        # Term counts and verse counts (dense, indexed by term id) over
+        # verses [lo, hi). Whole suras come from the sura rows, and only
+        # the partial suras at either end are summed verse by verse. The
+        # whole-corpus totals are kept once computed.
+        if lo == 0 and hi == self.starts[-1]:
+            if self.totals is None:
+                self.totals = self.aggregate_suras(range(1, len(self.starts)))
+            return self.totals
+        counts = [0] * len(self.vocabulary)
+        verses = [0] * len(self.vocabulary)
+        starts = self.starts
+        # Suras first + 1 .. last lie wholly inside the range.
+        first = bisect_left(starts, lo)
+        last = bisect_right(starts, hi) - 1
+        if first >= last:
+            self.add_verse_rows(counts, verses, lo, hi)
+            return counts, verses
+        self.add_verse_rows(counts, verses, lo, starts[first])
+        for sura in range(first + 1, last + 1):
+            self.add_sura_row(counts, verses, sura)
+        self.add_verse_rows(counts, verses, starts[last], hi)
+        return counts, verses
+
+    def keep(self, term_id, include_stopwords):
+        return include_stopwords or self.vocabulary[term_id] not in STOPWORDS
+
+    def top_terms(self, lo, hi, limit, include_stopwords=False):
+        counts, verses = self.aggregate(lo, hi)
+        ranked = heapq.nsmallest(limit, (term_id for term_id, count in enumerate(counts)
+                                         if count and self.keep(term_id, include_stopwords)),
+                                 key=lambda term_id: (-counts[term_id], self.vocabulary[term_id]))
+        return [(self.vocabulary[term_id], counts[term_id], verses[term_id]) for term_id in ranked]
+
+    def distribution(self, term):
+        # (sura, count, verses) for every sura the term occurs in.
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return []
+        rows = []
+        for sura in range(1, len(self.starts)):
+            start, end = self.sura_ptr[sura - 1], self.sura_ptr[sura]
+            row = bisect_left(self.sura_terms, term_id, start, end)
+            if row < end and self.sura_terms[row] == term_id:
+                rows.append((sura, self.sura_counts[row], self.sura_verses[row]))
+        return rows
+
+    def verses_with(self, term, lo, hi):
+        # Verses in [lo, hi) containing term; only the suras it occurs in
+        # are scanned.
+        term_id = self.term_ids[term]
+        for sura, _, _ in self.distribution(term):
+            start = max(lo, self.starts[sura - 1])
+            end = min(hi, self.starts[sura])
+            for index in range(start, end):
+                row = bisect_left(self.row_terms, term_id, self.row_ptr[index], self.row_ptr[index + 1])
+                if row < self.row_ptr[index + 1] and self.row_terms[row] == term_id:
+                    yield index
+
+    def compare(self, left_suras, right_suras, limit, include_stopwords=False, min_count=5):
+        # Terms most characteristic of each side: log ratio of their rates
+        # per token, with add-one smoothing so terms absent on one side do
+        # not divide by zero.
+        left, _ = self.aggregate_suras(left_suras)
+        right, _ = self.aggregate_suras(right_suras)
+        left_total = sum(left) + len(left)
+        right_total = sum(right) + len(right)
+        scored = []
+        for term_id in range(len(self.vocabulary)):
+            if left[term_id] + right[term_id] < min_count or not self.keep(term_id, include_stopwords):
+                continue
+            ratio = math.log2(((left[term_id] + 1) / left_total) / ((right[term_id] + 1) / right_total))
+            scored.append((ratio, self.vocabulary[term_id], left[term_id], right[term_id]))
+        scored.sort()
+        left_side = [(term, l, r, ratio) for ratio, term, l, r in reversed(scored[-limit:])]
+        right_side = [(term, l, r, ratio) for ratio, term, l, r in scored[:limit]]
+        return left_side, right_side
+
+    def collocations(self, term, lo, hi, window, limit, include_stopwords=False, min_count=3):
+        # Words within `window` tokens of term, ranked by count x PMI (local
+        # mutual information) so both frequent and specific neighbours rank.
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return []
+        tokens, token_ptr = self.tokens, self.token_ptr
+        near = {}
+        for index in self.verses_with(term, lo, hi):
+            verse = tokens[token_ptr[index]:token_ptr[index + 1]]
+            for position, token in enumerate(verse):
+                if token != term_id:
+                    continue
+                for neighbour in verse[max(0, position - window):position] + verse[position + 1:position + 1 + window]:
+                    if neighbour != term_id:
+                        near[neighbour] = near.get(neighbour, 0) + 1
+
+        counts, _ = self.aggregate(lo, hi)
+        total = self.token_count(lo, hi)
+        slots = sum(near.values())
+        scored = []
+        for neighbour, count in near.items():
+            if count < min_count or not self.keep(neighbour, include_stopwords):
+                continue
+            expected = slots * counts[neighbour] / total
+            pmi = math.log2(count / expected)
+            scored.append((count * pmi, self.vocabulary[neighbour], count, pmi))
+        scored.sort(reverse=True)
+        return [(word, count, pmi) for _, word, count, pmi in scored[:limit]]
+
+def load_term_stats(corpus, lang='english'):
+    text_of = searchable_text(corpus, lang)
+    payload = cache.cached(f'stats-{lang}.bin', STATS_VERSION, language_sources(lang),
+                           lambda: build_stats_payload(text_of, corpus.starts))
+    return TermStats(payload, corpus.starts)
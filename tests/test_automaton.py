@@ -0,0 +1,44 @@
+import os
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from automaton import Automaton
+from render import keyword_pattern, words_pattern
+
+TEXTS = [
+    "Indeed, your Lord is the Lord of the worlds.",
+    "a a a a a",
+    "Peace, peace upon you, peacefully.",
+    "They went to İstanbul and istanbul again.",
+    "the_lord lord_ lords Lord",
+]
+
+KEYWORDS = ["lord", "your lord", "the lord", "a a", "peace", "istanbul", "İstanbul", "lord of the"]
+
+class AutomatonTest(unittest.TestCase):
+    def test_counts_match_the_regex(self):
+        automaton = Automaton(KEYWORDS)
+        for text in TEXTS:
+            found = Counter(automaton.occurrences(text))
+            for word_id, word in enumerate(automaton.words):
+                with self.subTest(text=text, word=word):
+                    self.assertEqual(found[word_id], len(keyword_pattern(word).findall(text)))
+
+    def test_matches_match_the_alternation(self):
+        automaton = Automaton(KEYWORDS)
+        pattern = words_pattern(KEYWORDS)
+        for text in TEXTS:
+            with self.subTest(text=text):
+                self.assertEqual([match.span() for match in pattern.finditer(text)],
+                                 [(match.start(), match.end()) for match in automaton.finditer(text)])
+
+    def test_positions_of_a_keyword_that_lower_cases_longer(self):
+        text = "to İstanbul."
+        self.assertEqual([(start, end) for start, end, _ in Automaton(["İstanbul"]).matches(text)], [(3, 11)])
+        self.assertEqual(Automaton(["x", "İstanbul"]).sub(lambda match: f"[{match.group()}]", text), "to [İstanbul].")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from chapter_names import ChapterNames, alias_keys, build_names_payload
+from corpus import ARABIC_FILE, get_data_path, parse_quran_xml
+
+class ChapterNamesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.names = ChapterNames(build_names_payload(parse_quran_xml(get_data_path(ARABIC_FILE))[0]))
+
+    def assertResolves(self, cases, fuzzy=True):
+        for name, chapter_num in cases:
+            with self.subTest(name=name):
+                self.assertEqual(self.names.resolve(name, fuzzy), chapter_num)
+
+    def test_transliteration_variants(self):
+        self.assertResolves([
+            ("Al-Baqara", 2), ("baqarah", 2), ("al baqarah", 2), ("Surah Al-Baqarah", 2),
+            ("yaseen", 36), ("Yasin", 36), ("Al-Faatihah", 1), ("fatiha", 1),
+            ("ash-shams", 91), ("Ad-Dukhaan", 44), ("an-naas", 114),
+        ], fuzzy=False)
+
+    def test_english_and_arabic_names(self):
+        self.assertResolves([
+            ("the cow", 2), ("cow", 2), ("البقرة", 2), ("الْبَقَرَةِ", 2), ("سورة البقرة", 2), ("بقرة", 2),
+        ], fuzzy=False)
+
+    def test_shared_name_goes_to_the_first_chapter(self):
+        self.assertResolves([("The Dawn", 89)], fuzzy=False)
+
+    def test_unique_prefix(self):
+        self.assertResolves([("baqa", 2), ("ikhl", 112)], fuzzy=False)
+
+    def test_ambiguous_prefix(self):
+        self.assertResolves([("an", None)])
+
+    def test_misspellings(self):
+        self.assertResolves([("baqrah", 2), ("bakara", 2), ("kahaf", 18)])
+        self.assertResolves([("baqrah", None), ("kahaf", None)], fuzzy=False)
+
+    def test_short_and_unknown_names(self):
+        self.assertResolves([("xy", None), ("zzzzzzzz", None), ("", None)])
+
+    def test_alias_keys(self):
+        self.assertEqual(alias_keys("Al-Baqarah"), {"albaqara", "baqara"})
+        self.assertEqual(alias_keys("Surat An-Naas"), {"anas", "nas"})
+        self.assertEqual(alias_keys("  "), set())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import unittest
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from corpus import HIZB_STARTS, JUZ_STARTS, Corpus
+
+# Three chapters of 3, 5 and 2 verses.
+PAYLOAD = {
+    'suras': [{'index': '1'}, {'index': '2'}, {'index': '3'}],
+    'starts': array('I', [0, 3, 8, 10]).tobytes(),
+    'boundaries': {},
+}
+
+def resolve(start_chap, start_verse, end_chap, end_verse):
+    return Corpus(PAYLOAD, {}).resolve_range(start_chap, start_verse, end_chap, end_verse)
+
+class ResolveRangeTest(unittest.TestCase):
+    def test_verses_within_a_chapter(self):
+        self.assertEqual(resolve(2, 2, 2, 4), (4, 7))
+        self.assertEqual(resolve(2, 3, 2, 3), (5, 6))
+
+    def test_across_chapters(self):
+        self.assertEqual(resolve(1, 3, 2, 1), (2, 4))
+
+    def test_missing_verses_cover_whole_chapters(self):
+        self.assertEqual(resolve(2, None, 2, None), (3, 8))
+        self.assertEqual(resolve(1, None, 3, None), (0, 10))
+
+    def test_end_past_chapter_stops_at_its_last_verse(self):
+        self.assertEqual(resolve(2, 4, 2, 99), (6, 8))
+
+    def test_verse_zero_is_rejected(self):
+        for args in ((2, 5, 2, 0), (1, 3, 2, 0), (3, 0, 3, 2), (2, 0, 2, 0)):
+            with self.subTest(args=args), self.assertRaises(ValueError):
+                resolve(*args)
+
+    def test_start_past_chapter_is_rejected(self):
+        with self.assertRaises(ValueError):
+            resolve(1, 4, 2, 2)
+
+    def test_backwards_range_is_rejected(self):
+        with self.assertRaises(ValueError):
+            resolve(2, 5, 2, 3)
+
+    def test_chapters_out_of_bounds_or_order(self):
+        self.assertIsNone(resolve(0, 1, 1, 1))
+        self.assertIsNone(resolve(3, 1, 4, 1))
+        self.assertIsNone(resolve(2, 1, 1, 1))
+
+class NavigationTest(unittest.TestCase):
+    def test_hizbs_split_every_juz_in_two(self):
+        self.assertEqual(len(HIZB_STARTS), 2 * len(JUZ_STARTS))
+        self.assertEqual(HIZB_STARTS[::2], JUZ_STARTS)
+        self.assertEqual(HIZB_STARTS, sorted(set(HIZB_STARTS)))
+
+if __name__ == "__main__":
+    unittest.main()
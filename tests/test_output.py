@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from output import Writer, format_records
+
+RECORDS = [
+    {'sura': 1, 'aya': 1, 'text': 'In the name of Allah, the Entirely Merciful'},
+    {'sura': 2, 'aya': 255, 'text': 'He says, "Be,"\tand\nit is.'},
+    {'sura': 112, 'aya': 1, 'text': 'قُلْ هُوَ اللَّهُ أَحَدٌ'},
+]
+
+class FormatRecordsTest(unittest.TestCase):
+    def test_jsonl(self):
+        lines = list(format_records(RECORDS, 'jsonl'))
+        self.assertEqual([json.loads(line) for line in lines], RECORDS)
+        self.assertIn('قُلْ', lines[2])
+
+    def test_csv_round_trips(self):
+        lines = list(format_records(RECORDS, 'csv'))
+        rows = list(csv.reader(io.StringIO('\n'.join(lines) + '\n')))
+        self.assertEqual(rows[0], ['sura', 'aya', 'text'])
+        self.assertEqual(rows[1:], [[str(value) for value in record.values()] for record in RECORDS])
+
+    def test_tsv_keeps_one_record_per_line(self):
+        lines = list(format_records(RECORDS, 'tsv'))
+        self.assertEqual(len(lines), len(RECORDS) + 1)
+        self.assertEqual(lines[0], 'sura\taya\ttext')
+        self.assertEqual(lines[2], '2\t255\tHe says, "Be," and it is.')
+        self.assertTrue(all(line.count('\t') == 2 for line in lines))
+
+    def test_columns_come_from_the_first_record(self):
+        records = [{'a': 1, 'b': 2}, {'b': 3, 'c': 4}]
+        self.assertEqual(list(format_records(records, 'tsv')), ['a\tb', '1\t2', '\t3'])
+
+    def test_no_records(self):
+        for fmt in ('jsonl', 'csv', 'tsv'):
+            self.assertEqual(list(format_records([], fmt)), [])
+
+class WriterTest(unittest.TestCase):
+    def test_writes_in_chunks(self):
+        stream = io.StringIO()
+        writer = Writer(stream)
+        writer.write_lines(['one', 'two'])
+        self.assertEqual(stream.getvalue(), '')
+        writer.close()
+        self.assertEqual(stream.getvalue(), 'one\ntwo\n')
+
+    def test_line_buffered(self):
+        stream = io.StringIO()
+        Writer(stream, line_buffered=True).write_line('one')
+        self.assertEqual(stream.getvalue(), 'one\n')
+
+class CommandFormatTest(unittest.TestCase):
+    def quran(self, *args):
+        env = dict(os.environ, QURAN_NO_DAEMON='1')
+        result = subprocess.run([sys.executable, os.path.join(ROOT, 'quran.py')] + list(args),
+                                env=env, capture_output=True, text=True, check=True)
+        return result.stdout.splitlines()
+
+    def test_verses_as_jsonl(self):
+        records = [json.loads(line) for line in self.quran('1:6-2:1', '--format', 'jsonl')]
+        self.assertEqual([(record['sura'], record['aya'], record['language']) for record in records],
+                         [(1, 6, 'arabic'), (1, 6, 'english'), (1, 7, 'arabic'), (1, 7, 'english'),
+                          (2, 1, 'arabic'), (2, 1, 'english')])
+        self.assertEqual(records[-2]['verse_id'], 8)
+
+    def test_verses_as_csv(self):
+        rows = list(csv.DictReader(self.quran('2:255', '-e', '--format', 'csv')))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['sura'], rows[0]['aya'], rows[0]['language']), ('2', '255', 'english'))
+        self.assertTrue(rows[0]['text'].startswith('Allah - there is no deity except Him'))
+
+if __name__ == "__main__":
+    unittest.main()
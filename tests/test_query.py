@@ -0,0 +1,34 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from query import parse_query, run_query
+from search_index import InvertedIndex, build_index_payload
+
+VERSES = [
+    "in the name of allah",
+    "the the",
+    "the lord of the worlds",
+    "your lord is the most merciful",
+]
+
+def search(query):
+    index = InvertedIndex(build_index_payload(lambda i: VERSES[i], len(VERSES)))
+    return run_query(parse_query(query), index, 0, len(VERSES))
+
+class NearTest(unittest.TestCase):
+    def test_term_does_not_pair_with_itself(self):
+        self.assertEqual(search('"the" NEAR/0 "the"'), [1])
+
+    def test_distance_counts_tokens_between(self):
+        self.assertEqual(search('the NEAR/2 the'), [1, 2])
+
+    def test_overlapping_phrase_does_not_pair(self):
+        self.assertEqual(search('"your lord" NEAR/0 lord'), [])
+        self.assertEqual(search('"your lord" NEAR/2 merciful'), [])
+        self.assertEqual(search('"your lord" NEAR/3 merciful'), [3])
+
+if __name__ == "__main__":
+    unittest.main()
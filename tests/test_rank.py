@@ -0,0 +1,73 @@
+import math
+import os
+import random
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from rank import rank_exhaustive, rank_verses
+from search_index import BM25_B, BM25_K1, InvertedIndex, build_index_payload
+
+# A skewed vocabulary, so some terms are common and some rare, with a few
+# duplicate verses to make ties.
+WORDS = ["the", "the", "the", "of", "of", "lord", "lord", "mercy", "day", "fire", "garden", "camel", "patience"]
+
+def make_verses(count, seed=22):
+    generator = random.Random(seed)
+    verses = [' '.join(generator.choices(WORDS, k=generator.randint(2, 20))) for _ in range(count)]
+    return verses + verses[:25]
+
+VERSES = make_verses(500)
+
+def bm25(keyword, doc):
+    # BM25 straight from its definition, for the verses that have a word.
+    documents = [re.findall(r'\w+', verse) for verse in VERSES]
+    avg_length = sum(map(len, documents)) / len(documents)
+    score = 0.0
+    for term in dict.fromkeys(re.findall(r'\w+', keyword.lower())):
+        frequency = sum(term in tokens for tokens in documents)
+        tf = documents[doc].count(term)
+        if tf:
+            idf = math.log(1 + (len(documents) - frequency + 0.5) / (frequency + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(documents[doc]) / avg_length))
+    return score
+
+class RankTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.index = InvertedIndex(build_index_payload(lambda i: VERSES[i], len(VERSES)))
+
+    def test_wand_agrees_with_exhaustive(self):
+        for keyword in ("lord mercy", "the lord of the day", "camel patience fire", "mercy garden the", "the of", "camel unknown"):
+            for lo, hi in ((0, len(VERSES)), (100, 380), (490, 525)):
+                for top in (1, 5, 40, 10000):
+                    with self.subTest(keyword=keyword, lo=lo, hi=hi, top=top):
+                        self.assertEqual(rank_verses(self.index, keyword, lo, hi, top),
+                                         rank_exhaustive(self.index, keyword, lo, hi, top))
+
+    def test_ties_at_the_cut_go_to_the_earlier_verse(self):
+        # Verses 500 on repeat the first 25, so some of these cut-offs
+        # fall between two verses with the same score.
+        for keyword in ("camel patience fire", "mercy garden"):
+            for top in range(1, 80):
+                with self.subTest(keyword=keyword, top=top):
+                    self.assertEqual(rank_verses(self.index, keyword, 0, len(VERSES), top),
+                                     rank_exhaustive(self.index, keyword, 0, len(VERSES), top))
+
+    def test_scores_are_bm25(self):
+        for score, doc in rank_verses(self.index, "camel lord", 0, len(VERSES), 20):
+            self.assertAlmostEqual(score, bm25("camel lord", doc))
+
+    def test_order_and_ties(self):
+        results = rank_verses(self.index, "patience day", 0, len(VERSES), len(VERSES))
+        self.assertEqual(results, sorted(results, key=lambda item: (-item[0], item[1])))
+        self.assertEqual({doc for _, doc in results},
+                         {i for i, verse in enumerate(VERSES) if re.search(r'\b(patience|day)\b', verse)})
+
+    def test_no_matching_words(self):
+        self.assertEqual(rank_verses(self.index, "unknown words", 0, len(VERSES)), [])
+
+if __name__ == "__main__":
+    unittest.main()
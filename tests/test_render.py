@@ -0,0 +1,68 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from render import Renderer, clear_layout_cache
+
+CYAN = '\x1b[36m'
+RESET = '\x1b[0m'
+
+class Verses:
+    # Just the text() a Renderer reads.
+    def __init__(self, texts):
+        self.texts = texts
+
+    def text(self, lang, index):
+        return self.texts[lang][index]
+
+CORPUS = Verses({
+    'english': ["Praise be to the Lord of the worlds, the Lord of the heavens and the Lord of the earth.",
+                "Your lord is the Most Merciful."],
+    'arabic': ["الحمد لله رب العالمين", "ربكم"],
+})
+
+def render(languages=('english',), highlight_words=(), columns='40', color=False, index=0):
+    environment = {'COLUMNS': columns}
+    environment.update({'FORCE_COLOR': '1'} if color else {'NO_COLOR': '1'})
+    with mock.patch.dict(os.environ, environment):
+        renderer = Renderer(CORPUS, languages, highlight_words)
+    return list(renderer.verse_lines(index, 1, index + 1))
+
+class RendererTest(unittest.TestCase):
+    def setUp(self):
+        clear_layout_cache()
+
+    def test_wraps_to_the_width_under_the_label(self):
+        lines = render()[0].split('\n')
+        self.assertEqual(lines[0], "1:1    Praise be to the Lord of the")
+        self.assertTrue(all(len(line) <= 40 for line in lines))
+        self.assertTrue(all(line.startswith(' ' * 7) and line[7] != ' ' for line in lines[1:]))
+        self.assertEqual(' '.join(line.strip() for line in lines), "1:1    " + CORPUS.texts['english'][0])
+
+    def test_one_layout_per_language(self):
+        self.assertEqual(render(('arabic', 'english'), columns='200'),
+                         ["1:1    الحمد لله رب العالمين", "1:1    " + CORPUS.texts['english'][0]])
+
+    def test_highlights_every_word_in_one_pass(self):
+        text = render(highlight_words=('lord', 'the lord of'), columns='200', color=True)[0]
+        self.assertEqual(text.count(CYAN), 3)
+        self.assertIn(f"{CYAN}the Lord of{RESET} the worlds", text)
+        self.assertNotIn(CYAN, render(highlight_words=('lord',), columns='200', color=False)[0])
+
+    def test_highlight_is_case_insensitive_and_whole_word(self):
+        text = render(highlight_words=('lord',), columns='200', color=True, index=1)[0]
+        self.assertEqual(text, f"1:2    Your {CYAN}lord{RESET} is the Most Merciful.")
+        self.assertNotIn(CYAN, render(highlight_words=('merci',), columns='200', color=True, index=1)[0])
+
+    def test_cached_layouts_depend_on_width_and_highlights(self):
+        wide = render(columns='200')
+        narrow = render(columns='40')
+        self.assertNotEqual(wide, narrow)
+        self.assertEqual(render(columns='200'), wide)
+        self.assertNotEqual(render(highlight_words=('lord',), columns='200', color=True), wide)
+
+if __name__ == "__main__":
+    unittest.main()
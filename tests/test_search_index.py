@@ -0,0 +1,56 @@
+import os
+import random
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from search_index import InvertedIndex, build_index_payload, find_verses, intersect
+
+WORDS = ["lord", "mercy", "day", "the", "of", "judgement", "merciful", "lords", "o", "you"]
+
+def make_verses(count, seed=5):
+    generator = random.Random(seed)
+    verses = []
+    for _ in range(count):
+        words = generator.choices(WORDS, k=generator.randint(1, 12))
+        verses.append(' '.join(word.capitalize() if generator.random() < 0.2 else word for word in words) + '.')
+    return verses
+
+VERSES = make_verses(300)
+
+def scan(keyword, lo, hi):
+    # What the index has to agree with: a regex over every verse.
+    pattern = re.compile(r'\b' + re.escape(keyword) + r'\b', re.IGNORECASE)
+    return [i for i in range(lo, hi) if pattern.search(VERSES[i])]
+
+class InvertedIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.index = InvertedIndex(build_index_payload(lambda i: VERSES[i], len(VERSES)))
+
+    def test_find_verses_matches_a_scan(self):
+        for keyword in ("lord", "Mercy", "the day", "day of judgement", "of the", "lords", "o lord", "absent", "merci"):
+            for lo, hi in ((0, len(VERSES)), (17, 140), (250, 251), (40, 40)):
+                with self.subTest(keyword=keyword, lo=lo, hi=hi):
+                    self.assertEqual(find_verses(lambda i: VERSES[i], self.index, keyword, lo, hi), scan(keyword, lo, hi))
+
+    def test_postings_hold_positions(self):
+        postings = self.index.postings("mercy")
+        for slot, doc in enumerate(postings.docs):
+            tokens = re.findall(r'\w+', VERSES[doc].lower())
+            self.assertEqual(list(postings.positions_at(slot)), [i for i, token in enumerate(tokens) if token == "mercy"])
+
+    def test_lengths_and_frequencies(self):
+        self.assertEqual(list(self.index.lengths), [len(re.findall(r'\w+', verse)) for verse in VERSES])
+        self.assertEqual(self.index.doc_frequency("lord"), len(scan("lord", 0, len(VERSES))))
+        self.assertEqual(self.index.doc_frequency("absent"), 0)
+
+    def test_intersect(self):
+        self.assertEqual(intersect([[1, 3, 5, 7], [3, 4, 5], [0, 3, 5, 9]]), [3, 5])
+        self.assertEqual(intersect([[1, 2], []]), [])
+        self.assertEqual(intersect([]), [])
+
+if __name__ == "__main__":
+    unittest.main()